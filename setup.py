@@ -7,6 +7,7 @@ setup(
     name='weatherkit-python',
     version='1.0.1',
     packages=['weatherkit'],
+    package_data={'weatherkit': ['data/*.json']},
     license='MIT',
     description='A Python interface for Apple\'s WeatherKit APIs',
     url='https://github.com/greencoder/weatherkit-python',
@@ -15,9 +16,8 @@ setup(
     long_description=long_description,
     long_description_content_type = "text/markdown",
     package_dir = {"": "src"},
-    python_requires = ">=3.6",
+    python_requires = ">=3.7",
     install_requires=[
-        'jsonpickle>=1.4.3',
         'cryptography>=38',
         'pyjwt>=2.6.0',
         'requests>=2.28.1',
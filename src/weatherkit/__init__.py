@@ -1 +1,12 @@
 from .weatherkit import WeatherKit
+from .weatherkit import WeatherKitError
+from .cache import MemoryCache
+from .cache import SQLiteCache
+
+
+def __getattr__(name):
+    # AsyncWeatherKit pulls in asyncio, so it is only imported when first asked for
+    if name == 'AsyncWeatherKit':
+        from .aio import AsyncWeatherKit
+        return AsyncWeatherKit
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,6 @@
+import sys
+
+from .bulk import main
+
+
+sys.exit(main())
@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import cache_key
+from .coalesce import AsyncSingleFlight
+from .ranges import DEFAULT_CHUNK
+from .ranges import check_range_models
+from .ranges import range_windows
+from .ranges import stitch
+from .ranges import time_window
+from .weatherkit import WeatherKit
+
+
+class AsyncWeatherKit(WeatherKit):
+    """ An awaitable WeatherKit client
+
+    Requests run on a thread pool sized to ``max_workers`` that shares the
+    client's pooled session, so results are parsed by the same code path
+    as the synchronous client. fetch_stream is inherited unchanged: it is a
+    plain generator that blocks while it reads the body, so iterate it in a
+    thread (e.g. with loop.run_in_executor) rather than on the event loop.
+    """
+
+    def __init__(self, team_id, service_id, private_key, key_id, max_workers=10, **kwargs):
+        kwargs.setdefault('pool_maxsize', max_workers)
+        super().__init__(team_id, service_id, private_key, key_id, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Coalesce on the event loop so waiting callers don't hold a worker thread
+        self.async_flight = AsyncSingleFlight() if self.flight is not None else None
+        # Seconds the current worker thread's fetch already waited for its first token on the event loop
+        self._reserved = threading.local()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        super().close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def _throttle(self, stats, waited=None):
+        if waited is None:
+            # A fetch's first token is taken on the event loop; retries and fetch_stream wait for theirs here
+            waited, self._reserved.waited = getattr(self._reserved, 'waited', None), None
+        super()._throttle(stats, waited)
+
+    def _fetch_reserved(self, waited, build, *args, stats=None, locate=None):
+        """ Runs _fetch_and_build on a worker thread for a fetch whose first token has been taken """
+        self._reserved.waited = waited
+        try:
+            return self._fetch_and_build(build, *args, stats=stats, locate=locate)
+        finally:
+            self._reserved.waited = None
+
+    async def _fetch_in_executor(self, forecast_datasets, latitude, longitude, country_code, timezone, window=(), build=None):
+        """ Fetches on the thread pool and builds the result with build(data, timezone), by default a response """
+        loop = asyncio.get_running_loop()
+        if build is None:
+            build = self._parse_response
+        args = (forecast_datasets, latitude, longitude, country_code, timezone, window)
+
+        if self.rate_limiter is None:
+            return await loop.run_in_executor(self.executor, self._fetch_and_build, build, *args)
+
+        # Only requests that go upstream take a token, so look in the spatial index and cache first
+        stats = self._start_stats()
+        located = await loop.run_in_executor(
+            self.executor, self._lookup, forecast_datasets, latitude, longitude, country_code, timezone, stats, window,
+        )
+        if located is not None:
+            locate = lambda *args: located
+            return await loop.run_in_executor(
+                self.executor, functools.partial(self._fetch_and_build, build, *args, stats=stats, locate=locate),
+            )
+
+        # Wait for the rate limiter on the event loop rather than in a worker thread
+        waited = await self.rate_limiter.acquire_async()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self._fetch_reserved, waited, build, *args, stats=stats, locate=self._fetch_remote),
+        )
+
+    async def fetch(self, forecast_datasets, latitude, longitude, country_code, timezone,
+                    hourly_start=None, hourly_end=None, daily_start=None, daily_end=None):
+        """ Fetches and parses the weather from the WeatherKit API; see WeatherKit.fetch for the time range """
+        window = time_window(hourly_start, hourly_end, daily_start, daily_end)
+        if self.async_flight is None:
+            return await self._fetch_in_executor(forecast_datasets, latitude, longitude, country_code, timezone, window)
+
+        if self.snapping is not None:
+            key = cache_key(forecast_datasets, *self.snapping.snap(latitude, longitude), country_code, timezone, window)
+        else:
+            key = cache_key(forecast_datasets, latitude, longitude, country_code, timezone, window)
+        return await self.async_flight.do(
+            key, self._fetch_in_executor,
+            forecast_datasets, latitude, longitude, country_code, timezone, window,
+        )
+
+    async def refresh(self, previous, forecast_datasets, latitude, longitude, country_code, timezone):
+        """ Re-fetches only the datasets of a previous response that have expired; see WeatherKit.refresh """
+        expired_datasets = self._expired_datasets(previous, forecast_datasets)
+        if not expired_datasets:
+            return previous
+
+        fresh = await self.fetch(expired_datasets, latitude, longitude, country_code, timezone)
+        return self._merge_refresh(previous, fresh, forecast_datasets, expired_datasets, timezone)
+
+    async def fetch_columnar(self, forecast_datasets, latitude, longitude, country_code, timezone,
+                             hourly_start=None, hourly_end=None, daily_start=None, daily_end=None):
+        """ Fetches the weather as column arrays on the thread pool; see WeatherKit.fetch_columnar """
+        from .columnar import ColumnarResponse
+
+        window = time_window(hourly_start, hourly_end, daily_start, daily_end)
+        return await self._fetch_in_executor(
+            forecast_datasets, latitude, longitude, country_code, timezone, window, build=ColumnarResponse,
+        )
+
+    async def fetch_range(self, forecast_datasets, latitude, longitude, country_code, timezone, start, end,
+                          chunk=DEFAULT_CHUNK, concurrency=4):
+        """ Fetches a time range in chunks, at most concurrency at a time; see WeatherKit.fetch_range """
+        windows = range_windows(forecast_datasets, start, end, chunk)
+        check_range_models(self.models, forecast_datasets)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_window(window):
+            async with semaphore:
+                return await self.fetch(forecast_datasets, latitude, longitude, country_code, timezone, **window)
+
+        responses = await asyncio.gather(*[fetch_window(window) for window in windows])
+        return stitch(responses, forecast_datasets)
+
+    async def fetch_many(self, locations, forecast_datasets, concurrency=10):
+        """ Fetches many locations concurrently, yielding (location, response) pairs as they complete
+
+        Each location is a (latitude, longitude, country_code, timezone) tuple. At most
+        ``concurrency`` requests are in flight at once, and locations are only read
+        from the iterable as slots free up.
+        """
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+
+        async def fetch_location(location):
+            return location, await self.fetch(forecast_datasets, *location)
+
+        locations = iter(locations)
+        pending = set()
+
+        try:
+            while True:
+                for location in locations:
+                    pending.add(asyncio.ensure_future(fetch_location(location)))
+                    if len(pending) >= concurrency:
+                        break
+
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,274 @@
+import array
+import json
+import math
+import mmap
+import os
+import pathlib
+import threading
+
+from .models import BOOL
+from .models import DAILY_FORECAST_SOURCES
+from .models import END_TIME
+from .models import HOURLY_FORECAST_SOURCES
+from .models import MINUTE_FORECAST_SOURCES
+from .models import TEXT
+from .models import TIME
+from .models import lookup
+from .timestamps import localizer
+
+
+# Each kind of record: (dataset, array key, stored attributes)
+KINDS = {
+    'hourly': ('forecastHourly', 'hours', HOURLY_FORECAST_SOURCES),
+    'daily': ('forecastDaily', 'days', DAILY_FORECAST_SOURCES),
+    'minute': ('forecastNextHour', 'minutes', MINUTE_FORECAST_SOURCES),
+}
+
+# Every record starts with where and when the forecast was issued
+RECORD_PREFIX = ('latitude', 'longitude', 'issue_time')
+
+INDEX_COLUMNS = ('latitude', 'longitude', 'issue_time', 'kind', 'first', 'count')
+
+FORMAT_VERSION = 1
+
+NAN = float('nan')
+
+
+def _timestamp(value, hours=0):
+    if value is None:
+        return NAN
+    return localizer('UTC').parse(value).timestamp() + hours * 3600
+
+
+class ForecastArchive():
+    """ An append-only archive of hourly, daily and minute forecasts in fixed-width binary files
+
+    The archive is a directory holding one file of float64 records per kind
+    ('hourly', 'daily' and 'minute') and an index with one entry per appended
+    dataset, keyed by location and issue time (the dataset's readTime). Each
+    record holds the latitude, longitude and issue time followed by the
+    model's stored attributes: times as UNIX timestamps, booleans as 0 or 1,
+    text as codes into a shared vocabulary and missing values as NaN. The
+    layout and vocabulary are kept in schema.json.
+
+    Readers memory-map the files, so column() scans one attribute across
+    every record without decoding anything else. There should only be one
+    writer at a time.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._load_schema()
+
+    def _load_schema(self):
+        schema_path = self.path / 'schema.json'
+        if schema_path.exists():
+            schema = json.loads(schema_path.read_text())
+            if schema['version'] != FORMAT_VERSION:
+                raise ValueError(f'Unsupported archive version {schema["version"]}')
+        else:
+            schema = {
+                'version': FORMAT_VERSION,
+                'kinds': {
+                    kind: {
+                        'columns': list(RECORD_PREFIX) + [name for name, _, _ in sources],
+                        'text': [name for name, _, value_kind in sources if value_kind == TEXT],
+                    }
+                    for kind, (_, _, sources) in KINDS.items()
+                },
+                'vocabulary': [],
+            }
+            self._write_schema(schema)
+
+        self.schema = schema
+        self.vocabulary = schema['vocabulary']
+        self._codes = {text: code for code, text in enumerate(self.vocabulary)}
+
+    def _write_schema(self, schema):
+        # Replace the file in one step so readers never see a partial schema
+        temporary = self.path / 'schema.json.tmp'
+        temporary.write_text(json.dumps(schema, indent=2))
+        os.replace(temporary, self.path / 'schema.json')
+
+    def columns(self, kind):
+        return self.schema['kinds'][kind]['columns']
+
+    def _file(self, kind):
+        return self.path / f'{kind}.f64'
+
+    # Writing
+
+    def _code(self, text, new_texts):
+        if text is None:
+            return NAN
+        code = self._codes.get(text)
+        if code is None:
+            code = self._codes[text] = len(self.vocabulary)
+            self.vocabulary.append(text)
+            new_texts.append(text)
+        return float(code)
+
+    def _encode(self, item, prefix, sources, new_texts):
+        values = list(prefix)
+        for name, path, value_kind in sources:
+            value = lookup(item, path)
+            if value_kind == TIME:
+                values.append(_timestamp(value))
+            elif value_kind == END_TIME:
+                values.append(_timestamp(value, hours=1))
+            elif value_kind == TEXT:
+                values.append(self._code(value, new_texts))
+            elif value_kind == BOOL:
+                values.append(NAN if value is None else float(bool(value)))
+            else:
+                values.append(NAN if value is None else float(value))
+        return values
+
+    def append(self, data, latitude, longitude):
+        """ Appends the hourly, daily and minute forecasts of a decoded API payload
+
+        Returns the number of records appended per kind.
+        """
+        counts = {}
+
+        with self._lock:
+            new_texts = []
+            batches = []
+
+            for kind_code, (kind, (dataset, key, sources)) in enumerate(KINDS.items()):
+                section = data.get(dataset)
+                if not isinstance(section, dict) or not section.get(key):
+                    continue
+
+                issue_time = _timestamp(section.get('metadata', {}).get('readTime'))
+                prefix = (float(latitude), float(longitude), issue_time)
+                records = array.array('d')
+                for item in section[key]:
+                    records.extend(self._encode(item, prefix, sources, new_texts))
+
+                batches.append((kind, kind_code, issue_time, records, len(section[key])))
+                counts[kind] = len(section[key])
+
+            if new_texts:
+                self._write_schema(self.schema)
+
+            # Records are written before the index entries that point at them
+            index = array.array('d')
+            for kind, kind_code, issue_time, records, count in batches:
+                first = self._append_records(self._file(kind), records, len(self.columns(kind)))
+                index.extend((float(latitude), float(longitude), issue_time, kind_code, first, count))
+
+            if index:
+                self._append_records(self.path / 'index.f64', index, len(INDEX_COLUMNS))
+
+        return counts
+
+    def _append_records(self, path, records, width):
+        """ Appends whole records to a file and returns the number of records before them
+
+        A partial record left at the end by an interrupted write is cut off
+        first, so the new records start on a record boundary.
+        """
+        with open(path, 'a+b') as fp:
+            size = fp.seek(0, os.SEEK_END)
+            first = size // (8 * width)
+            if size % (8 * width):
+                fp.truncate(first * width * 8)
+            fp.write(records.tobytes())
+        return first
+
+    def _record_count(self, kind):
+        path = self._file(kind)
+        size = path.stat().st_size if path.exists() else 0
+        return size // (8 * len(self.columns(kind)))
+
+    # Reading
+
+    def _view(self, name, width):
+        """ Returns a flat float64 memoryview over the complete records of a file """
+        path = self.path / f'{name}.f64'
+        size = path.stat().st_size if path.exists() else 0
+        size -= size % (8 * width)
+
+        if not size:
+            return memoryview(b'').cast('d')
+
+        cached = self._maps.get(name)
+        if cached is None or cached[0] != size:
+            with open(path, 'rb') as fp:
+                mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            cached = self._maps[name] = (size, mapped)
+
+        return memoryview(cached[1])[:size].cast('d')
+
+    def __len__(self):
+        return sum(self._record_count(kind) for kind in KINDS)
+
+    def column(self, kind, name):
+        """ Returns one attribute of every record of a kind as a strided float64 memoryview
+
+        Nothing is copied: the view reads straight from the mapped file. Use
+        text() to decode text codes; numpy.asarray() also accepts the view.
+        """
+        columns = self.columns(kind)
+        return self._view(kind, len(columns))[columns.index(name)::len(columns)]
+
+    def text(self, code):
+        """ Returns the text for a code from a text column (None for NaN) """
+        if math.isnan(code):
+            return None
+        return self.vocabulary[int(code)]
+
+    def find(self, latitude=None, longitude=None, issue_time=None, kind=None):
+        """ Returns (kind, issue_time, first record, count) for each indexed dataset that matches """
+        view = self._view('index', len(INDEX_COLUMNS))
+        kinds = list(KINDS)
+        matches = []
+
+        for offset in range(0, len(view), len(INDEX_COLUMNS)):
+            entry_latitude, entry_longitude, entry_issue_time, kind_code, first, count = view[offset:offset + len(INDEX_COLUMNS)]
+            if latitude is not None and entry_latitude != latitude:
+                continue
+            if longitude is not None and entry_longitude != longitude:
+                continue
+            if issue_time is not None and entry_issue_time != issue_time:
+                continue
+            if kind is not None and kinds[int(kind_code)] != kind:
+                continue
+            matches.append((kinds[int(kind_code)], entry_issue_time, int(first), int(count)))
+
+        return matches
+
+    def records(self, kind, first=0, count=None):
+        """ Decodes records into dicts, with text decoded and missing values as None """
+        columns = self.columns(kind)
+        text_columns = set(self.schema['kinds'][kind]['text'])
+        view = self._view(kind, len(columns))
+        total = len(view) // len(columns)
+        last = total if count is None else min(first + count, total)
+
+        decoded = []
+        for index in range(first, last):
+            values = view[index * len(columns):(index + 1) * len(columns)]
+            record = {}
+            for name, value in zip(columns, values):
+                if name in text_columns:
+                    record[name] = self.text(value)
+                else:
+                    record[name] = None if math.isnan(value) else value
+            decoded.append(record)
+
+        return decoded
+
+    def close(self):
+        """ Drops the file mappings; they are unmapped once no views of them remain """
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
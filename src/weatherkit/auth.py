@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class TokenManager():
+
+    def __init__(self, team_id, service_id, private_key, key_id, lifetime=3600, refresh_margin=300):
+        if refresh_margin >= lifetime:
+            raise ValueError('refresh_margin must be shorter than the token lifetime')
+
+        self.team_id = team_id
+        self.service_id = service_id
+        self.private_key = private_key
+        self.key_id = key_id
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._state = self._sign()
+
+    def _sign(self):
+        """ Signs a new JWT and returns it along with its expiration timestamp """
+        init_at = int(time.time())
+        expire_at = init_at + self.lifetime
+
+        # PyJWT and cryptography are slow to import, so they wait until the first token is signed
+        import jwt
+
+        token = jwt.encode(
+            payload = {
+                'iss': self.team_id,
+                'sub': self.service_id,
+                'iat': init_at,
+                'exp': expire_at,
+            },
+            key = self.private_key,
+            headers = {
+                'alg': 'ES256',
+                'kid': self.key_id,
+                'typ': 'JWT',
+                'id': f'{self.team_id}.{self.service_id}'
+            }
+        )
+
+        return token, expire_at
+
+    def _background_refresh(self):
+        """ Re-signs the token off the request path """
+        try:
+            state = self._sign()
+            with self._lock:
+                self._state = state
+        finally:
+            self._refreshing = False
+
+    @property
+    def expire_at(self):
+        return self._state[1]
+
+    @property
+    def token(self):
+        """ Returns the cached JWT, re-signing it once it is close to expiring """
+        token, expire_at = self._state
+        now = time.time()
+
+        if now >= expire_at:
+            # The token is unusable, so the caller has to wait for a new one
+            with self._lock:
+                if time.time() >= self._state[1]:
+                    self._state = self._sign()
+                return self._state[0]
+
+        if now >= expire_at - self.refresh_margin:
+            with self._lock:
+                start_refresh = not self._refreshing and now >= self._state[1] - self.refresh_margin
+                if start_refresh:
+                    self._refreshing = True
+            if start_refresh:
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+
+        return token
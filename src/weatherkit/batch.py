@@ -0,0 +1,212 @@
+"""
+Parses many raw WeatherKit payloads across a pool of processes.
+
+Workers decode and parse the payloads and send back plain tuples or NumPy
+columns of the stored values only. The imperial and text values the models
+derive are left out of rows unless asked for, and are added to columns in
+this process after stacking, so less is pickled between processes. Pass the
+payloads as the raw JSON bytes or strings the API returned, so the decoding
+happens in the workers too.
+"""
+import collections
+import itertools
+import json
+import operator
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .models import CURRENT_CONDITIONS_SOURCES
+from .models import CurrentConditions
+from .models import DailyForecast
+from .models import HourlyForecast
+from .models import MinuteForecast
+from .models import project
+from .models import stored_fields
+
+
+# Each section: (dataset, array key or None for a single item, model class)
+SECTIONS = {
+    'current_weather': ('currentWeather', None, CurrentConditions),
+    'forecast_next_hour': ('forecastNextHour', 'minutes', MinuteForecast),
+    'forecast_hourly': ('forecastHourly', 'hours', HourlyForecast),
+    'forecast_daily': ('forecastDaily', 'days', DailyForecast),
+}
+
+
+def row_classes(fields=None, units=None):
+    """ Returns the model class each section's rows are built with; fields and units are as in model_classes """
+    fields = fields or {}
+    unknown = [section for section in fields if section not in SECTIONS]
+    if unknown:
+        raise ValueError(f'Unknown sections: {", ".join(unknown)}')
+
+    return {
+        section: project(model_class, fields.get(section), units)
+        for section, (_, _, model_class) in SECTIONS.items()
+    }
+
+
+def row_fields(fields=None, units=None):
+    """ Returns the names of the values in each section's row tuples
+
+    Sections without fields hold the stored values, leaving out the imperial
+    and text fields derived from them, unless units picks a unit system.
+    """
+    classes = row_classes(fields, units)
+    fields = fields or {}
+    return {
+        section: model_class.fields if section in fields or units is not None
+        else stored_fields(model_class.fields, model_class.derived)
+        for section, model_class in classes.items()
+    }
+
+
+def _decode(payload):
+    if isinstance(payload, (bytes, bytearray, str)):
+        return json.loads(payload)
+    return payload
+
+
+def _row_getter(names):
+    """ Returns a function that reads the names off a model as one tuple """
+    getter = operator.attrgetter(*names)
+    if len(names) == 1:
+        return lambda item: (getter(item),)
+    return getter
+
+
+def _parse_rows(chunk, fields, units):
+    # The projected classes are rebuilt here: they are made at runtime, so they cannot be pickled
+    classes = row_classes(fields, units)
+    getters = {section: _row_getter(names) for section, names in row_fields(fields, units).items()}
+    parsed = []
+
+    for payload, timezone in chunk:
+        data = _decode(payload)
+        rows = {}
+
+        for section, (dataset, key, _) in SECTIONS.items():
+            if dataset not in data:
+                continue
+            model_class, row = classes[section], getters[section]
+
+            if key is None:
+                rows[section] = row(model_class(data[dataset], timezone))
+            else:
+                rows[section] = [row(model_class(value, timezone)) for value in data[dataset].get(key) or []]
+
+        parsed.append(rows)
+
+    return parsed
+
+
+def _parse_columnar(chunk):
+    from .columnar import ForecastTable
+
+    parsed = []
+
+    for payload, timezone in chunk:
+        data = _decode(payload)
+        tables = {}
+
+        for section, (dataset, key, model_class) in SECTIONS.items():
+            if dataset not in data:
+                continue
+            if key is None:
+                items = [data[dataset]]
+                schema = CURRENT_CONDITIONS_SOURCES
+            else:
+                items = data[dataset].get(key) or []
+                schema = model_class.sources
+            # The derived columns are added after stacking, so they are not pickled
+            tables[section] = ForecastTable.from_items(items, schema, (), timezone)
+
+        parsed.append(tables)
+
+    return parsed
+
+
+def _chunks(payloads, timezone, chunksize):
+    timezones = itertools.repeat(timezone) if isinstance(timezone, str) else timezone
+    chunk = []
+
+    for payload, payload_timezone in zip(payloads, timezones):
+        chunk.append((payload, payload_timezone))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _map_chunks(function, chunks, processes, *args):
+    """ Yields function(chunk, *args) for each chunk, in order, keeping a few chunks per process in flight """
+    if processes == 1:
+        for chunk in chunks:
+            yield function(chunk, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(function, chunk, *args))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def parse_rows(payloads, timezone, fields=None, units=None, processes=None, chunksize=16):
+    """ Yields a dict of row tuples per payload, in the order of the payloads
+
+    Each dict maps the sections a payload has to a list of tuples, one per
+    minute, hour or day ('forecast_next_hour' holds the minutes), or to a
+    single tuple for 'current_weather'. The values are the ones the models
+    would have, in the order row_fields returns. timezone is one timezone
+    name or an iterable with one per payload. processes=1 parses in this
+    process; None uses every CPU. Payloads are read lazily.
+    """
+    processes = processes or os.cpu_count()
+    fields = {section: tuple(names) for section, names in (fields or {}).items()}
+    row_classes(fields, units)
+
+    for parsed in _map_chunks(_parse_rows, _chunks(payloads, timezone, chunksize), processes, fields, units):
+        yield from parsed
+
+
+def parse_columnar(payloads, timezone, processes=None, chunksize=16):
+    """ Returns one ForecastTable per section, stacking every payload's rows
+
+    A location column holds each row's index into payloads; 'current_weather'
+    has one row per payload that has it. Requires numpy; see parse_rows for
+    the other arguments.
+    """
+    from .columnar import np
+    from .columnar import stack
+
+    processes = processes or os.cpu_count()
+    tables = {section: [] for section in SECTIONS}
+    indices = {section: [] for section in SECTIONS}
+    index = 0
+
+    for parsed in _map_chunks(_parse_columnar, _chunks(payloads, timezone, chunksize), processes):
+        for payload_tables in parsed:
+            for section, table in payload_tables.items():
+                tables[section].append(table)
+                indices[section].append(index)
+            index += 1
+
+    stacked = {}
+    for section, section_tables in tables.items():
+        if not section_tables:
+            continue
+        table = stack(section_tables)
+        # Payloads without the section have no table, so number rows by payload instead
+        table.columns['location'] = np.repeat(indices[section], [len(section_table) for section_table in section_tables])
+        table.derive(SECTIONS[section][2].derived)
+        stacked[section] = table
+
+    return stacked
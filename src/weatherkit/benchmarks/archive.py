@@ -0,0 +1,88 @@
+"""
+Compares scanning one field across many archived responses in a
+ForecastArchive with re-parsing the same responses stored as JSON lines.
+
+From the `/weatherkit` directory:
+$ python benchmarks/archive.py --responses 500
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit.archive import ForecastArchive
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--responses', type=int, default=500)
+    parser.add_argument('--scale', type=int, default=1, help='repeat the sample arrays this many times')
+    args = parser.parse_args(argv)
+
+    payload = fixtures.scaled_payload(args.scale)
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        archive = ForecastArchive(directory / 'archive')
+        blob_path = directory / 'responses.jsonl'
+
+        def write_archive():
+            for index in range(args.responses):
+                archive.append(payload, 39.0 + index / 1000, -104.72)
+
+        def write_blobs():
+            with open(blob_path, 'w') as fp:
+                for index in range(args.responses):
+                    fp.write(json.dumps(payload) + '\n')
+
+        _, archive_write = timed(write_archive)
+        _, blob_write = timed(write_blobs)
+
+        def scan_blobs():
+            total = count = 0
+            with open(blob_path) as fp:
+                for line in fp:
+                    for hour in json.loads(line)['forecastHourly']['hours']:
+                        total += hour['temperature']
+                        count += 1
+            return total / count
+
+        def scan_archive():
+            column = archive.column('hourly', 'temperature_c')
+            return sum(column) / len(column)
+
+        blob_mean, blob_scan = timed(scan_blobs)
+        archive_mean, archive_scan = timed(scan_archive)
+        assert abs(blob_mean - archive_mean) < 1e-9
+
+        archive_bytes = sum(path.stat().st_size for path in (directory / 'archive').iterdir())
+        print(f'{len(archive.column("hourly", "temperature_c"))} hourly records from {args.responses} responses')
+        print(f'{"storage":<14}{"MiB":>8}{"write s":>10}{"scan s":>10}')
+        print(f'{"JSON lines":<14}{blob_path.stat().st_size / 2 ** 20:>8.1f}{blob_write:>10.3f}{blob_scan:>10.3f}')
+        print(f'{"archive":<14}{archive_bytes / 2 ** 20:>8.1f}{archive_write:>10.3f}{archive_scan:>10.3f}')
+
+        try:
+            import numpy
+        except ImportError:
+            pass
+        else:
+            _, numpy_scan = timed(lambda: numpy.nanmean(numpy.asarray(archive.column('hourly', 'temperature_c'))))
+            print(f'{"archive+numpy":<14}{"":>8}{"":>10}{numpy_scan:>10.3f}')
+
+        archive.close()
+
+
+if __name__ == '__main__':
+    main()
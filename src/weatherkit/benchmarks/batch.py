@@ -0,0 +1,102 @@
+"""
+Measures how batch parsing scales with the number of processes, and how much
+returning row tuples or columns saves over sending forecast models back.
+"KiB sent" is the pickled result for one payload.
+
+From the `/weatherkit` directory:
+$ python benchmarks/batch.py --payloads 400 --processes 1,2,4,8
+"""
+import argparse
+import json
+import os
+import pathlib
+import pickle
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit import batch
+from weatherkit.models import CurrentConditions
+from weatherkit.models import DailyForecast
+from weatherkit.models import HourlyForecast
+from weatherkit.models import MinuteForecast
+
+
+def _parse_models(chunk):
+    """ The baseline: workers build the models and pickle them back """
+    parsed = []
+    for payload, timezone in chunk:
+        data = json.loads(payload)
+        parsed.append((
+            CurrentConditions(data['currentWeather'], timezone),
+            [MinuteForecast(minute, timezone) for minute in data['forecastNextHour']['minutes']],
+            [HourlyForecast(hour, timezone) for hour in data['forecastHourly']['hours']],
+            [DailyForecast(day, timezone) for day in data['forecastDaily']['days']],
+        ))
+    return parsed
+
+
+def parse_models(payloads, timezone, processes, chunksize):
+    chunks = batch._chunks(payloads, timezone, chunksize)
+    return [response for parsed in batch._map_chunks(_parse_models, chunks, processes) for response in parsed]
+
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--payloads', type=int, default=400)
+    parser.add_argument('--scale', type=int, default=1, help='repeat the sample arrays this many times')
+    parser.add_argument('--processes', default=None, help=f'comma-separated process counts (default: 1 to {os.cpu_count()})')
+    parser.add_argument('--chunksize', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.processes:
+        counts = [int(count) for count in args.processes.split(',')]
+    else:
+        counts = sorted({1, *[2 ** power for power in range(8) if 2 ** power <= os.cpu_count()], os.cpu_count()})
+
+    body = json.dumps(fixtures.scaled_payload(args.scale)).encode()
+    payloads = [body] * args.payloads
+    timezone = 'US/Mountain'
+
+    modes = {
+        'models': lambda processes: parse_models(payloads, timezone, processes, args.chunksize),
+        'rows': lambda processes: list(batch.parse_rows(payloads, timezone, processes=processes, chunksize=args.chunksize)),
+    }
+    try:
+        import numpy
+    except ImportError:
+        pass
+    else:
+        modes['columnar'] = lambda processes: batch.parse_columnar(payloads, timezone, processes=processes, chunksize=args.chunksize)
+
+    print(f'{args.payloads} payloads of {len(body) / 1024:.0f} KiB on {os.cpu_count()} CPUs')
+    sizes = {
+        'models': len(pickle.dumps(_parse_models([(body, timezone)]))),
+        'rows': len(pickle.dumps(batch._parse_rows([(body, timezone)], {}, None))),
+    }
+    if 'columnar' in modes:
+        sizes['columnar'] = len(pickle.dumps(batch._parse_columnar([(body, timezone)])))
+
+    print(f'{"mode":<10}{"KiB sent":>10}{"processes":>10}{"seconds":>10}{"payloads/s":>12}{"speedup":>10}')
+    for mode, run in modes.items():
+        baseline = None
+        for processes in counts:
+            seconds = timed(lambda: run(processes))
+            baseline = baseline or seconds
+            print(
+                f'{mode:<10}{sizes[mode] / 1024:>10.0f}{processes:>10}{seconds:>10.2f}'
+                f'{args.payloads / seconds:>12.0f}{baseline / seconds:>10.2f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
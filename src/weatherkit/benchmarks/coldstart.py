@@ -0,0 +1,168 @@
+"""
+Measures cold start: how long a fresh interpreter takes to import weatherkit,
+create a client (which signs the first token) and make its first fetch
+against a stubbed session, and how many modules that loads. Each run is a
+new process, as in a serverless function; medians are reported.
+
+Results can be appended to a history file so cold start is tracked across
+changes, and --source points at another checkout's src directory to measure
+it instead. From the `/weatherkit` directory:
+
+$ python benchmarks/coldstart.py --runs 15 --record benchmarks/results/coldstart.jsonl
+$ python benchmarks/coldstart.py --history benchmarks/results/coldstart.jsonl
+"""
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+
+SOURCE = pathlib.Path(__file__).resolve().parents[2]
+
+HEAVY_MODULES = ('arrow', 'asyncio', 'cryptography', 'dateutil', 'jwt', 'requests', 'sqlite3')
+
+# Runs in a fresh interpreter: argv is the variant, the private key and the sample payload path
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+modules = len(sys.modules)
+
+import weatherkit
+
+imported = time.perf_counter()
+variant, private_key, sample_path = sys.argv[1:4]
+result = {'import_ms': (imported - started) * 1000}
+
+if variant != 'import':
+    class Response():
+        ok = True
+        status_code = 200
+
+        def __init__(self, body):
+            self.content = body
+
+        def json(self):
+            return json.loads(self.content)
+
+    class Session():
+        def __init__(self):
+            with open(sample_path, 'rb') as fp:
+                self.body = fp.read()
+
+        def get(self, url, **kwargs):
+            return Response(self.body)
+
+    client = weatherkit.WeatherKit('TEAM', 'com.example.weather', private_key, 'KEY', session=Session())
+    created = time.perf_counter()
+    client.fetch(['currentWeather', 'forecastHourly', 'forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')
+    fetched = time.perf_counter()
+    result.update(client_ms=(created - imported) * 1000, fetch_ms=(fetched - created) * 1000)
+
+result['total_ms'] = (time.perf_counter() - started) * 1000
+result['modules'] = len(sys.modules) - modules
+result['heavy'] = sorted(name for name in HEAVY if name in sys.modules)
+print(json.dumps(result))
+'''
+
+VARIANTS = {
+    'import': 'import weatherkit only',
+    'fetch': 'import, create a client and make the first fetch',
+}
+
+
+def run_once(variant, source, private_key):
+    code = f'HEAVY = {HEAVY_MODULES!r}\n' + CHILD
+    completed = subprocess.run(
+        [sys.executable, '-c', code, variant, private_key, str(fixtures.SAMPLE_PATH)],
+        cwd=source, capture_output=True, text=True,
+    )
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    return json.loads(completed.stdout)
+
+
+def measure(variant, source, private_key, runs):
+    samples = [run_once(variant, source, private_key) for _ in range(runs)]
+    result = {
+        name: statistics.median(sample[name] for sample in samples)
+        for name in ('import_ms', 'client_ms', 'fetch_ms', 'total_ms')
+        if name in samples[0]
+    }
+    result['modules'] = samples[0]['modules']
+    result['heavy'] = samples[0]['heavy']
+    return result
+
+
+def report(results):
+    print(f'{"variant":<10}{"import ms":>11}{"client ms":>11}{"fetch ms":>10}{"total ms":>10}{"modules":>9}  heavy modules loaded')
+    for variant, result in results.items():
+        if 'error' in result:
+            print(f'{variant:<10}  {result["error"]}')
+            continue
+        print(
+            f'{variant:<10}{result["import_ms"]:>11.1f}{result.get("client_ms", 0):>11.1f}{result.get("fetch_ms", 0):>10.1f}'
+            f'{result["total_ms"]:>10.1f}{result["modules"]:>9}  {", ".join(result["heavy"]) or "-"}'
+        )
+
+
+def git_commit(source):
+    completed = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=source, capture_output=True, text=True)
+    return completed.stdout.strip() or None
+
+
+def history(path):
+    print(f'{"date":<22}{"commit":<16}{"python":<9}{"import ms":>11}{"fetch ms":>10}')
+    for line in pathlib.Path(path).read_text().splitlines():
+        entry = json.loads(line)
+        totals = [entry['results'].get(variant, {}).get('total_ms') for variant in VARIANTS]
+        cells = [f'{total:.1f}' if total is not None else '-' for total in totals]
+        print(f'{entry["date"]:<22}{entry["commit"] or "-":<16}{entry["python"]:<9}{cells[0]:>11}{cells[1]:>10}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes per variant')
+    parser.add_argument('--source', default=str(SOURCE), help='the src directory to import weatherkit from')
+    parser.add_argument('--variants', nargs='*', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--record', help='append the results to this JSON lines history file')
+    parser.add_argument('--history', help='print the results recorded in this file and exit')
+    args = parser.parse_args(argv)
+
+    if args.history:
+        history(args.history)
+        return
+
+    private_key = fixtures.make_private_key()
+    results = {}
+    for variant in args.variants:
+        try:
+            results[variant] = measure(variant, args.source, private_key, args.runs)
+        except RuntimeError as error:
+            results[variant] = {'error': str(error)}
+
+    report(results)
+
+    if args.record:
+        entry = {
+            'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': git_commit(args.source),
+            'python': platform.python_version(),
+            'runs': args.runs,
+            'results': {variant: result for variant, result in results.items() if 'error' not in result},
+        }
+        path = pathlib.Path(args.record)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as fp:
+            fp.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
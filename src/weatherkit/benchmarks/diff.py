@@ -0,0 +1,83 @@
+"""
+Compares sending a full as_json payload on every poll with sending the patch
+from weatherkit.diff, for successive forecasts where a fraction of the hours
+and days change a little each time.
+
+From the `/weatherkit` directory:
+$ python benchmarks/diff.py --polls 20 --changed 0.1 --scale 2
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit.diff import ChangeTracker
+from weatherkit.diff import apply
+
+
+DATASETS = ['currentWeather', 'forecastHourly', 'forecastDaily']
+
+TOLERANCES = {
+    'temperature_c': 0.2, 'temperature_f': 0.36,
+    'temperature_feels_like_c': 0.2, 'temperature_feels_like_f': 0.36,
+    'precip_chance': 0.05,
+}
+
+
+def perturb(payload, fraction, rng):
+    """ Nudges the temperature and precipitation chance of a fraction of the hours and days """
+    for key, items in (('forecastHourly', 'hours'), ('forecastDaily', 'days')):
+        for item in payload[key][items]:
+            if rng.random() < fraction:
+                for name in ('temperature', 'temperatureApparent', 'temperatureMax', 'temperatureMin'):
+                    if item.get(name) is not None:
+                        item[name] = round(item[name] + rng.uniform(-1, 1), 2)
+                if item.get('precipitationChance') is not None:
+                    item['precipitationChance'] = round(min(1, max(0, item['precipitationChance'] + rng.uniform(-0.1, 0.1))), 2)
+    payload['currentWeather']['temperature'] += rng.uniform(-0.5, 0.5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=20)
+    parser.add_argument('--changed', type=float, default=0.1, help='fraction of hours and days that change per poll')
+    parser.add_argument('--scale', type=int, default=1, help='repeat the sample arrays this many times')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    payload = fixtures.scaled_payload(args.scale)
+    tracker = ChangeTracker(tolerances=TOLERANCES)
+    consumer = None
+    full_bytes = patch_bytes = 0
+    diff_seconds = apply_seconds = 0.0
+
+    for poll in range(args.polls):
+        if poll:
+            perturb(payload, args.changed, rng)
+        response = fixtures.make_client(payload).fetch(DATASETS, 39.59, -104.72, 'US', 'US/Mountain')
+        full_bytes += len(response.as_json())
+
+        started = time.perf_counter()
+        patch = tracker.update('den', response)
+        diff_seconds += time.perf_counter() - started
+        patch_bytes += len(json.dumps(patch))
+
+        started = time.perf_counter()
+        consumer = apply(consumer, patch)
+        apply_seconds += time.perf_counter() - started
+
+    assert consumer == tracker.states['den']
+    print(f'{args.polls} polls, {args.changed:.0%} of hours and days changing per poll')
+    print(f'{"full JSON":<12}{full_bytes / 2 ** 10:>10.0f} KiB')
+    print(f'{"patches":<12}{patch_bytes / 2 ** 10:>10.0f} KiB ({patch_bytes / full_bytes:.1%}, the first poll is sent in full)')
+    print(f'diff {diff_seconds / args.polls * 1000:.2f} ms and apply {apply_seconds / args.polls * 1000:.2f} ms per poll')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Shared fixtures for the benchmarks: synthetic payloads scaled up from
+data/sample_data.json and a client that fetches them without a network.
+"""
+import copy
+import datetime
+import json
+import pathlib
+import re
+import sys
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+
+from weatherkit.weatherkit import WeatherKit
+
+
+SAMPLE_PATH = pathlib.Path(__file__).resolve().parents[1] / 'data' / 'sample_data.json'
+
+TIMESTAMP = re.compile(r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ$')
+
+DATASETS = ['currentWeather', 'forecastNextHour', 'forecastHourly', 'forecastDaily']
+
+# How far apart consecutive items are in each scaled array
+SCALED_ARRAYS = [
+    ('forecastNextHour', 'minutes', datetime.timedelta(minutes=1)),
+    ('forecastHourly', 'hours', datetime.timedelta(hours=1)),
+    ('forecastDaily', 'days', datetime.timedelta(days=1)),
+]
+
+
+def load_sample():
+    return json.loads(SAMPLE_PATH.read_text())
+
+
+def _shift(value, delta):
+    """ Shifts every WeatherKit timestamp inside a value by delta """
+    if isinstance(value, dict):
+        return {key: _shift(item, delta) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shift(item, delta) for item in value]
+    if isinstance(value, str) and TIMESTAMP.match(value):
+        shifted = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ') + delta
+        return shifted.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return value
+
+
+def scaled_payload(scale=1):
+    """ Returns the sample payload with its minute, hourly and daily arrays repeated scale times
+
+    Each copy is shifted past the previous one, so timestamps stay unique and
+    parsing costs what it would for a genuinely longer forecast.
+    """
+    payload = load_sample()
+
+    for dataset, key, step in SCALED_ARRAYS:
+        items = payload[dataset][key]
+        span = step * len(items)
+        payload[dataset][key] = [
+            _shift(item, span * repeat) if repeat else copy.deepcopy(item)
+            for repeat in range(scale) for item in items
+        ]
+
+    return payload
+
+
+class StubResponse():
+
+    ok = True
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    @property
+    def content(self):
+        return self.body
+
+    def json(self):
+        return json.loads(self.body)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class StubSession():
+    """ Stands in for requests.Session, serving one payload from memory """
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload).encode()
+
+    def get(self, url, **kwargs):
+        return StubResponse(self.body)
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_private_key():
+    key = ec.generate_private_key(ec.SECP256R1())
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def make_client(payload=None, client_class=WeatherKit, **kwargs):
+    """ Returns a client whose requests are served by a StubSession """
+    if payload is None:
+        payload = load_sample()
+    kwargs.setdefault('session', StubSession(payload))
+    return client_class('TEAM', 'com.example.weather', make_private_key(), 'KEY', **kwargs)
@@ -0,0 +1,36 @@
+"""
+Compares eager and lazy response parsing for full and partial access.
+
+From the `/weatherkit` directory:
+$ python benchmarks/lazy.py
+"""
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+
+WORKLOADS = {
+    'current weather only': lambda r: r.current_weather.temperature_c,
+    'first 6 hours': lambda r: [h.temperature_c for h in r.forecast_hourly[:6]],
+    'first day': lambda r: r.forecast_daily[0].temperature_max_c,
+    'everything': lambda r: ([h.temperature_c for h in r.forecast_hourly], [d.temperature_max_c for d in r.forecast_daily]),
+}
+
+
+def main(number=20):
+    api_data = fixtures.load_sample()
+    eager, lazy = fixtures.make_client(lazy=False), fixtures.make_client(lazy=True)
+
+    print(f'{"workload":<24}{"eager ms":>12}{"lazy ms":>12}{"speedup":>10}')
+    for name, workload in WORKLOADS.items():
+        eager_time = timeit.timeit(lambda: workload(eager._parse_response(api_data, 'US/Mountain')), number=number)
+        lazy_time = timeit.timeit(lambda: workload(lazy._parse_response(api_data, 'US/Mountain')), number=number)
+        print(f'{name:<24}{eager_time / number * 1000:>12.2f}{lazy_time / number * 1000:>12.2f}{eager_time / lazy_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
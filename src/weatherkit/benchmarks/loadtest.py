@@ -0,0 +1,191 @@
+"""
+Drives the client against the local mock WeatherKit server and reports
+requests per second and latency percentiles for each way of fetching:
+one request at a time, a thread pool, and AsyncWeatherKit.fetch_many.
+
+From the `/weatherkit` directory:
+$ python benchmarks/loadtest.py --requests 500 --concurrency 20 --latency 0.01
+$ python benchmarks/loadtest.py --rate-limit-rate 0.05 --error-rate 0.01 --modes sync async
+$ python benchmarks/loadtest.py --rate-limit-rate 0.05 --retries 3 --client-rate 200 --retry-after 0.1
+"""
+import argparse
+import asyncio
+import pathlib
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit.aio import AsyncWeatherKit
+from weatherkit.mockserver import MockWeatherKitServer
+from weatherkit.ratelimit import RetryPolicy
+from weatherkit.ratelimit import TokenBucket
+from weatherkit.weatherkit import WeatherKit
+from weatherkit.weatherkit import WeatherKitError
+
+
+TEAM_ID = 'TEAM'
+SERVICE_ID = 'com.example.weather'
+KEY_ID = 'KEY'
+
+LOCATION = (39.59, -104.72, 'US', 'US/Mountain')
+
+
+class Results():
+    """ Keeps the time and outcome of every fetch, as seen by its caller """
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, ok):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.errors += not ok
+
+
+class TimedWeatherKit(WeatherKit):
+
+    def timed_fetch(self):
+        started = time.perf_counter()
+        try:
+            self.fetch(fixtures.DATASETS, *LOCATION)
+            ok = True
+        except WeatherKitError:
+            ok = False
+        self.results.add(time.perf_counter() - started, ok)
+
+
+class TimedAsyncWeatherKit(AsyncWeatherKit):
+    """ Times each fetch and returns None for failed requests so one injected error doesn't end fetch_many """
+
+    async def fetch(self, *args):
+        started = time.perf_counter()
+        try:
+            response = await super().fetch(*args)
+        except WeatherKitError:
+            response = None
+        self.results.add(time.perf_counter() - started, response is not None)
+        return response
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_sync(client, requests, concurrency):
+    for _ in range(requests):
+        client.timed_fetch()
+
+
+def run_threads(client, requests, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda _: client.timed_fetch(), range(requests)))
+
+
+def run_async(client, requests, concurrency):
+    async def drain():
+        async for _ in client.fetch_many([LOCATION] * requests, fixtures.DATASETS, concurrency=concurrency):
+            pass
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(drain())
+    finally:
+        loop.close()
+
+
+MODES = {
+    'sync': (TimedWeatherKit, run_sync),
+    'threads': (TimedWeatherKit, run_threads),
+    'async': (TimedAsyncWeatherKit, run_async),
+}
+
+
+def run_mode(mode, server, private_key, requests, concurrency, coalesce=False, client_rate=None, retries=0):
+    client_class, drive = MODES[mode]
+    kwargs = {'max_workers': concurrency} if client_class is TimedAsyncWeatherKit else {'pool_maxsize': concurrency}
+    rate_limiter = TokenBucket(client_rate) if client_rate else None
+    retry = RetryPolicy(retries=retries, backoff=0.01) if retries else None
+    client = client_class(
+        TEAM_ID, SERVICE_ID, private_key, KEY_ID, base_url=server.url, coalesce=coalesce,
+        rate_limiter=rate_limiter, retry=retry, **kwargs
+    )
+    client.results = results = Results()
+    upstream = server.requests
+
+    started = time.perf_counter()
+    with client:
+        drive(client, requests, concurrency)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(results.latencies),
+        'upstream': server.requests - upstream,
+        'errors': results.errors,
+        'rps': len(results.latencies) / elapsed,
+        'p50': percentile(results.latencies, 0.5),
+        'p90': percentile(results.latencies, 0.9),
+        'p99': percentile(results.latencies, 0.99),
+        'throttled': rate_limiter.waited if rate_limiter is not None else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10, help='worker threads or requests in flight')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the server waits before answering')
+    parser.add_argument('--rate-limit-rate', type=float, default=0, help='fraction of requests answered with 429')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with 503')
+    parser.add_argument('--scale', type=int, default=1, help='repeat the sample arrays this many times')
+    parser.add_argument('--retry-after', type=float, default=1, help='seconds the server asks clients to wait after a 429')
+    parser.add_argument('--coalesce', action='store_true', help='share concurrent identical requests')
+    parser.add_argument('--client-rate', type=float, help='limit the client to this many requests per second')
+    parser.add_argument('--retries', type=int, default=0, help='retry 429s and 5xx errors this many times')
+    parser.add_argument('--modes', nargs='*', choices=list(MODES), default=list(MODES))
+    args = parser.parse_args(argv)
+
+    private_key = fixtures.make_private_key()
+    public_key = serialization.load_pem_private_key(private_key.encode(), None).public_key()
+
+    server = MockWeatherKitServer(
+        fixtures.scaled_payload(args.scale),
+        latency=args.latency,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        team_id=TEAM_ID,
+        service_id=SERVICE_ID,
+        key_id=KEY_ID,
+        public_key=public_key,
+        seed=0,
+    )
+
+    print(
+        f'{"mode":<10}{"requests":>10}{"upstream":>10}{"errors":>8}{"req/s":>10}'
+        f'{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"throttled s":>13}'
+    )
+    with server:
+        for mode in args.modes:
+            result = run_mode(
+                mode, server, private_key, args.requests, args.concurrency, args.coalesce, args.client_rate, args.retries,
+            )
+            print(
+                f'{mode:<10}{result["requests"]:>10}{result["upstream"]:>10}{result["errors"]:>8}{result["rps"]:>10.1f}'
+                f'{result["p50"] * 1000:>10.2f}{result["p90"] * 1000:>10.2f}{result["p99"] * 1000:>10.2f}'
+                f'{result["throttled"]:>13.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Compares the memory used by the regular and compact (__slots__) model classes.
+
+From the `/weatherkit` directory:
+$ python benchmarks/memory.py
+"""
+import gc
+import pathlib
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit.models import CompactDailyForecast
+from weatherkit.models import CompactHourlyForecast
+from weatherkit.models import CompactMinuteForecast
+from weatherkit.models import DailyForecast
+from weatherkit.models import HourlyForecast
+from weatherkit.models import MinuteForecast
+
+
+def measure(model_class, items, copies):
+    """ Returns the bytes allocated per instance when building copies of every item """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [model_class(item, 'US/Mountain') for _ in range(copies) for item in items]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(instances)
+
+
+def main(copies=20):
+    api_data = fixtures.load_sample()
+
+    cases = [
+        ('MinuteForecast', MinuteForecast, CompactMinuteForecast, api_data['forecastNextHour']['minutes']),
+        ('HourlyForecast', HourlyForecast, CompactHourlyForecast, api_data['forecastHourly']['hours']),
+        ('DailyForecast', DailyForecast, CompactDailyForecast, api_data['forecastDaily']['days']),
+    ]
+
+    print(f'{"class":<16}{"regular B/obj":>16}{"compact B/obj":>16}{"saved":>10}')
+    for name, regular_class, compact_class, items in cases:
+        regular = measure(regular_class, items, copies)
+        compact = measure(compact_class, items, copies)
+        print(f'{name:<16}{regular:>16.0f}{compact:>16.0f}{1 - compact / regular:>10.0%}')
+
+
+if __name__ == '__main__':
+    main()
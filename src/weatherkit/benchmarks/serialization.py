@@ -0,0 +1,46 @@
+"""
+Compares the throughput of the response serializers with jsonpickle.
+
+From the `/weatherkit` directory:
+$ python benchmarks/serialization.py
+"""
+import io
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit import serializers
+
+
+def main(number=20):
+    response = fixtures.make_client().fetch(fixtures.DATASETS, 39.59, -104.72, 'US', 'US/Mountain')
+    cases = {
+        'as_json': lambda: response.as_json(),
+        'as_json (3 hourly fields)': lambda: response.as_json({'forecast_hourly': ['start_datetime', 'temperature_c', 'precip_chance']}),
+        'dump to file': lambda: serializers.dump(response, io.StringIO()),
+    }
+
+    try:
+        import msgpack
+        cases['msgpack'] = lambda: serializers.dumps(response, format='msgpack')
+    except ImportError:
+        pass
+
+    try:
+        import jsonpickle
+        cases['jsonpickle.encode'] = lambda: jsonpickle.encode(response)
+    except ImportError:
+        pass
+
+    print(f'{"serializer":<28}{"ms/response":>12}{"responses/s":>14}')
+    for name, case in cases.items():
+        seconds = timeit.timeit(case, number=number) / number
+        print(f'{name:<28}{seconds * 1000:>12.2f}{1 / seconds:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
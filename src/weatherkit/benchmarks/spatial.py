@@ -0,0 +1,80 @@
+"""
+Shows the trade-off between coordinate snapping and accuracy: for random
+users scattered around a city, how many requests reach the API and how far
+the forecasts they get are from where they asked.
+
+From the `/weatherkit` directory:
+$ python benchmarks/spatial.py --users 2000 --spread-km 20
+"""
+import argparse
+import pathlib
+import random
+import statistics
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit.cache import MemoryCache
+from weatherkit.spatial import KM_PER_DEGREE
+from weatherkit.spatial import GeohashSnapping
+from weatherkit.spatial import GridSnapping
+from weatherkit.spatial import SpatialIndex
+
+
+class CountingSession(fixtures.StubSession):
+
+    def __init__(self, payload):
+        super().__init__(payload)
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        return super().get(url, **kwargs)
+
+
+POLICIES = {
+    'exact': {},
+    'grid 0.01': {'snapping': GridSnapping(0.01)},
+    'grid 0.05': {'snapping': GridSnapping(0.05)},
+    'geohash 6': {'snapping': GeohashSnapping(6)},
+    'geohash 5': {'snapping': GeohashSnapping(5)},
+    'index 2 km': {'spatial_index': lambda: SpatialIndex(radius_km=2.0)},
+    'grid + index 5 km': {'snapping': GridSnapping(0.01), 'spatial_index': lambda: SpatialIndex(radius_km=5.0)},
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--spread-km', type=float, default=20.0, help='users are this far from the centre at most')
+    args = parser.parse_args(argv)
+
+    payload = fixtures.load_sample()
+    for section in payload.values():
+        section['metadata']['expireTime'] = '2999-01-01T00:00:00Z'
+
+    rng = random.Random(0)
+    spread = args.spread_km / KM_PER_DEGREE
+    users = [(39.59 + rng.uniform(-spread, spread), -104.72 + rng.uniform(-spread, spread)) for _ in range(args.users)]
+
+    print(f'{"policy":<20}{"API calls":>10}{"hit rate":>10}{"mean km":>10}{"max km":>10}')
+    for name, options in POLICIES.items():
+        options = {key: value() if callable(value) else value for key, value in options.items()}
+        session = CountingSession(payload)
+        client = fixtures.make_client(payload, session=session, cache=MemoryCache(maxsize=100000), **options)
+
+        distances = [
+            client.fetch(['currentWeather'], latitude, longitude, 'US', 'US/Mountain').distance_km
+            for latitude, longitude in users
+        ]
+
+        print(
+            f'{name:<20}{session.requests:>10}{1 - session.requests / len(users):>10.1%}'
+            f'{statistics.mean(distances):>10.2f}{max(distances):>10.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Times and measures the memory of the parsing, fetch, serialization and
+unit conversion paths on synthetic payloads scaled up from the sample data.
+
+From the `/weatherkit` directory:
+$ python benchmarks/suite.py --scale 4 --save benchmarks/results/baseline.json
+$ python benchmarks/suite.py --scale 4 --compare benchmarks/results/baseline.json
+"""
+import argparse
+import gc
+import json
+import pathlib
+import platform
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import fixtures
+
+from weatherkit.instrumentation import HistogramInstrumentation
+from weatherkit.models import CurrentConditions
+from weatherkit.models import DailyForecast
+from weatherkit.models import HourlyForecast
+from weatherkit.models import NextHourForecast
+from weatherkit.models import Weather
+
+
+def conversion_case(method_name, values):
+    weather = Weather()
+    convert = getattr(weather, method_name)
+    return lambda: [convert(value) for value in values]
+
+
+def build_cases(scale):
+    """ Returns {name: callable} for every benchmark, with fixtures prepared up front """
+    payload = fixtures.scaled_payload(scale)
+    hours = payload['forecastHourly']['hours']
+    days = payload['forecastDaily']['days']
+    client = fixtures.make_client(payload)
+    instrumented_client = fixtures.make_client(payload, instrumentation=HistogramInstrumentation())
+    response = client.fetch(fixtures.DATASETS, 39.59, -104.72, 'US', 'US/Mountain')
+
+    temperatures = [hour['temperature'] for hour in hours]
+    degrees = [hour['windDirection'] for hour in hours]
+    codes = [hour['conditionCode'] for hour in hours]
+
+    return {
+        'CurrentConditions': lambda: CurrentConditions(payload['currentWeather'], 'US/Mountain'),
+        'NextHourForecast': lambda: NextHourForecast(payload['forecastNextHour'], 'US/Mountain'),
+        'HourlyForecast': lambda: [HourlyForecast(hour, 'US/Mountain') for hour in hours],
+        'DailyForecast': lambda: [DailyForecast(day, 'US/Mountain') for day in days],
+        'fetch': lambda: client.fetch(fixtures.DATASETS, 39.59, -104.72, 'US', 'US/Mountain'),
+        'fetch (instrumented)': lambda: instrumented_client.fetch(fixtures.DATASETS, 39.59, -104.72, 'US', 'US/Mountain'),
+        'as_json': lambda: response.as_json(),
+        'celsius_to_fahrenheit': conversion_case('celsius_to_fahrenheit', temperatures),
+        'kmh_to_mph': conversion_case('kmh_to_mph', temperatures),
+        'millimeters_to_inches': conversion_case('millimeters_to_inches', temperatures),
+        'meters_to_miles': conversion_case('meters_to_miles', temperatures),
+        'degrees_to_cardinal': conversion_case('degrees_to_cardinal', degrees),
+        'conditions_for_code': conversion_case('conditions_for_code', codes),
+        'icon_for_condition_code': conversion_case('icon_for_condition_code', codes),
+    }
+
+
+def measure(case, repeat, number):
+    """ Returns the best time per call in seconds and the peak memory allocated by one call """
+    seconds = min(timeit.repeat(case, repeat=repeat, number=number)) / number
+
+    gc.collect()
+    tracemalloc.start()
+    case()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': seconds, 'peak_bytes': peak_bytes}
+
+
+def run(scale=1, repeat=5, number=10, only=None):
+    results = {}
+    for name, case in build_cases(scale).items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = measure(case, repeat, number)
+    return results
+
+
+def report(results, baseline=None):
+    header = f'{"benchmark":<26}{"ms":>10}{"peak KiB":>12}'
+    if baseline:
+        header += f'{"time vs base":>14}{"mem vs base":>13}'
+    print(header)
+
+    for name, result in results.items():
+        line = f'{name:<26}{result["seconds"] * 1000:>10.3f}{result["peak_bytes"] / 1024:>12.1f}'
+        base = (baseline or {}).get(name)
+        if base:
+            line += f'{result["seconds"] / base["seconds"]:>13.2f}x'
+            line += f'{result["peak_bytes"] / max(base["peak_bytes"], 1):>12.2f}x'
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1, help='repeat the sample arrays this many times')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=10)
+    parser.add_argument('--only', nargs='*', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare against results saved with --save')
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.repeat, args.number, args.only)
+
+    baseline = None
+    if args.compare:
+        saved = json.loads(pathlib.Path(args.compare).read_text())
+        if saved['scale'] != args.scale:
+            print(f'Warning: the baseline was recorded with --scale {saved["scale"]}')
+        baseline = saved['results']
+
+    report(results, baseline)
+
+    if args.save:
+        path = pathlib.Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            'scale': args.scale,
+            'python': platform.python_version(),
+            'results': results,
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
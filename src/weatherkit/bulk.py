@@ -0,0 +1,214 @@
+"""
+Fetches the weather for a CSV of locations and writes one JSON line per location.
+
+The CSV has latitude, longitude, country_code and timezone columns, in that
+order or named in a header row; an id column (or any other column) is
+passed through to the output. Credentials are read from the APPLE_TEAM_ID,
+APPLE_SERVICE_ID, APPLE_KEY_ID and APPLE_PRIVATE_KEY environment variables.
+
+$ python -m weatherkit sites.csv --output forecasts.ndjson --checkpoint done.txt --concurrency 20 --rate-limit 50
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from .ratelimit import RetryPolicy
+from .ratelimit import TokenBucket
+from .serializers import to_dict
+from .weatherkit import DEFAULT_BASE_URL
+from .weatherkit import WeatherKit
+
+
+ALL_DATASETS = ['currentWeather', 'forecastNextHour', 'forecastHourly', 'forecastDaily']
+
+LOCATION_COLUMNS = ('latitude', 'longitude', 'country_code', 'timezone')
+
+
+def read_locations(lines, country_code=None, timezone=None, errors='raise'):
+    """ Yields a dict per CSV row with at least the LOCATION_COLUMNS and an id
+
+    Rows are read lazily, so a large file is never held in memory. A row
+    without a location raises ValueError, or with errors='yield' is yielded
+    as its columns plus an 'error' message so the caller can carry on.
+    """
+    rows = csv.reader(lines)
+    header = None
+
+    for row in rows:
+        if not row or not ''.join(row).strip():
+            continue
+
+        if header is None:
+            if 'latitude' in [column.strip() for column in row]:
+                header = [column.strip() for column in row]
+                continue
+            header = list(LOCATION_COLUMNS[:len(row)]) + [f'column_{i}' for i in range(len(LOCATION_COLUMNS), len(row))]
+
+        location = dict(zip(header, [value.strip() for value in row]))
+        location['country_code'] = location.get('country_code') or country_code
+        location['timezone'] = location.get('timezone') or timezone
+
+        try:
+            missing = [column for column in LOCATION_COLUMNS if not location.get(column)]
+            if missing:
+                raise ValueError(f'Row {row} has no {", ".join(missing)}')
+            latitude, longitude = float(location['latitude']), float(location['longitude'])
+        except ValueError as error:
+            if errors != 'yield':
+                raise
+            location['error'] = f'{type(error).__name__}: {error}'
+            yield location
+            continue
+
+        location['latitude'] = latitude
+        location['longitude'] = longitude
+        location.setdefault('id', f'{location["latitude"]},{location["longitude"]}')
+        yield location
+
+
+class Checkpoint():
+    """ An append-only file of the ids of locations that are done """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+
+        if os.path.exists(path):
+            with open(path) as fp:
+                self.done = {line.rstrip('\n') for line in fp if line.strip()}
+
+        self._fp = open(path, 'a')
+
+    def __contains__(self, location_id):
+        return location_id in self.done
+
+    def add(self, location_id):
+        self.done.add(location_id)
+        self._fp.write(location_id + '\n')
+        self._fp.flush()
+
+    def close(self):
+        self._fp.close()
+
+
+def run(client, locations, output, datasets=ALL_DATASETS, checkpoint=None, concurrency=10):
+    """ Fetches each location and writes a JSON line to output as each one completes
+
+    Successful lines hold the location and the response; failed ones the
+    location and the error. Locations that already have an 'error', such as
+    bad rows from read_locations(errors='yield'), are written as failures
+    without a fetch. Only successes are added to the checkpoint, after their
+    line is flushed, so a rerun retries failures and skips the rest (a
+    location can be written twice if the run stops between the two). If
+    reading the locations raises, the fetches already started are still
+    written before the error propagates. Rate limiting and retries are up to
+    the client. Returns (succeeded, skipped, failed) counts.
+    """
+    def fetch(location):
+        return client.fetch(
+            datasets, location['latitude'], location['longitude'], location['country_code'], location['timezone'],
+        )
+
+    succeeded = skipped = failed = 0
+    pending = {}
+
+    def write_line(line):
+        nonlocal succeeded, failed
+        output.write(json.dumps(line) + '\n')
+        output.flush()
+
+        if 'error' in line:
+            failed += 1
+        else:
+            succeeded += 1
+            if checkpoint is not None:
+                checkpoint.add(line['location']['id'])
+
+    def write(done):
+        for future in done:
+            location = pending.pop(future)
+            try:
+                line = {'location': location, 'response': to_dict(future.result())}
+            except Exception as error:
+                line = {'location': location, 'error': f'{type(error).__name__}: {error}'}
+            write_line(line)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for location in locations:
+                if 'error' in location:
+                    location = dict(location)
+                    write_line({'location': location, 'error': location.pop('error')})
+                    continue
+
+                if checkpoint is not None and location['id'] in checkpoint:
+                    skipped += 1
+                    continue
+
+                pending[executor.submit(fetch, location)] = location
+                if len(pending) >= concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    write(done)
+        finally:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                write(done)
+
+    return succeeded, skipped, failed
+
+
+def main(argv=None, client=None):
+    parser = argparse.ArgumentParser(prog='python -m weatherkit', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', default='-', help='CSV of locations (default: stdin)')
+    parser.add_argument('--output', default='-', help='NDJSON output file (default: stdout)')
+    parser.add_argument('--checkpoint', help='file of finished location ids; rerunning with it skips them')
+    parser.add_argument('--datasets', default=','.join(ALL_DATASETS), help='comma-separated WeatherKit datasets')
+    parser.add_argument('--concurrency', type=int, default=10, help='requests in flight at once')
+    parser.add_argument('--rate-limit', type=float, help='maximum requests per second, on average')
+    parser.add_argument('--burst', type=int, help='requests allowed at once under --rate-limit (default: one second\'s worth)')
+    parser.add_argument('--retries', type=int, default=3, help='retries per location after a 429 or 5xx, with backoff')
+    parser.add_argument('--country-code', help='for rows without a country_code column')
+    parser.add_argument('--timezone', help='for rows without a timezone column')
+    parser.add_argument('--units', choices=['metric', 'imperial'], help='only write this unit system')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    args = parser.parse_args(argv)
+
+    if client is None:
+        missing = [name for name in ('APPLE_TEAM_ID', 'APPLE_SERVICE_ID', 'APPLE_KEY_ID', 'APPLE_PRIVATE_KEY') if not os.environ.get(name)]
+        if missing:
+            parser.error(f'Set the {", ".join(missing)} environment variables')
+        client = WeatherKit(
+            os.environ['APPLE_TEAM_ID'], os.environ['APPLE_SERVICE_ID'], os.environ['APPLE_PRIVATE_KEY'], os.environ['APPLE_KEY_ID'],
+            pool_maxsize=args.concurrency, units=args.units, base_url=args.base_url,
+            rate_limiter=TokenBucket(args.rate_limit, args.burst) if args.rate_limit else None,
+            retry=RetryPolicy(retries=args.retries) if args.retries else None,
+        )
+
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+
+    # Resumed runs add to the output instead of replacing it
+    mode = 'a' if checkpoint is not None and checkpoint.done else 'w'
+    input_fp = sys.stdin if args.input == '-' else open(args.input, newline='')
+    output_fp = sys.stdout if args.output == '-' else open(args.output, mode)
+
+    try:
+        locations = read_locations(input_fp, args.country_code, args.timezone, errors='yield')
+        succeeded, skipped, failed = run(
+            client, locations, output_fp, args.datasets.split(','), checkpoint, args.concurrency,
+        )
+    finally:
+        for fp in (input_fp, output_fp):
+            if fp not in (sys.stdin, sys.stdout):
+                fp.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        client.close()
+
+    print(f'{succeeded} fetched, {skipped} skipped, {failed} failed', file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,162 @@
+import collections
+import json
+import threading
+import time
+
+from .timestamps import localizer
+
+
+def cache_key(forecast_datasets, latitude, longitude, country_code, timezone, window=()):
+    """ Builds the cache key for a request; dataset order does not matter """
+    datasets = ','.join(sorted(forecast_datasets))
+    key = f'{latitude}/{longitude}/{datasets}/{country_code}/{timezone}'
+    if window:
+        key += '?' + '&'.join(f'{name}={value}' for name, value in window)
+    return key
+
+
+def expire_timestamp(value):
+    """ Converts a metadata.expireTime value to a UNIX timestamp """
+    return localizer('UTC').parse(value).timestamp()
+
+
+def expire_time(data):
+    """ Returns the earliest metadata.expireTime across the payload's datasets as a UNIX timestamp """
+    expire_times = []
+
+    for section in data.values():
+        if not isinstance(section, dict):
+            continue
+        value = section.get('metadata', {}).get('expireTime')
+        if value:
+            expire_times.append(expire_timestamp(value))
+
+    return min(expire_times) if expire_times else None
+
+
+class ResponseCache():
+    """ Base class for caches of decoded WeatherKit payloads
+
+    Subclasses implement _get, _set and _len. Entries are only stored with an
+    expiration time, after which they are dropped and counted as a miss.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Returns the cached payload for the key, or None """
+        with self._lock:
+            data = self._get(key, time.time())
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    def set(self, key, data, expire_at):
+        """ Stores a payload until expire_at (a UNIX timestamp) """
+        if expire_at is None or expire_at <= time.time():
+            return
+        with self._lock:
+            self._set(key, data, expire_at)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': self._len(),
+            }
+
+
+class MemoryCache(ResponseCache):
+    """ An in-process LRU cache holding at most maxsize payloads """
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        data, expire_at = entry
+        if expire_at <= now:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return data
+
+    def _set(self, key, data, expire_at):
+        self._entries[key] = (data, expire_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _len(self):
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """ An on-disk cache that survives restarts """
+
+    def __init__(self, path):
+        # Imported here so that clients that only use MemoryCache never load it
+        import sqlite3
+
+        super().__init__()
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expire_at REAL, data TEXT)'
+        )
+        self._connection.commit()
+
+    def _get(self, key, now):
+        row = self._connection.execute(
+            'SELECT data, expire_at FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        data, expire_at = row
+        if expire_at <= now:
+            self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._connection.commit()
+            self.expirations += 1
+            return None
+
+        return json.loads(data)
+
+    def _set(self, key, data, expire_at):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO responses (key, expire_at, data) VALUES (?, ?, ?)',
+            (key, expire_at, json.dumps(data)),
+        )
+        self._connection.commit()
+
+    def _len(self):
+        return self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def purge(self):
+        """ Deletes every expired entry """
+        with self._lock:
+            cursor = self._connection.execute('DELETE FROM responses WHERE expire_at <= ?', (time.time(),))
+            self._connection.commit()
+            self.expirations += cursor.rowcount
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+from concurrent.futures import Future
+
+
+class SingleFlight():
+    """ Runs one call per key at a time across threads; callers arriving while it runs share its result """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, function, *args):
+        """ Returns function(*args), or waits for the call already in flight for key and returns its result
+
+        Exceptions raised by the call are raised in every caller that shared it.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args)
+        except BaseException as error:
+            self._finish(key)
+            future.set_exception(error)
+            raise
+
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        with self._lock:
+            del self._calls[key]
+
+
+class AsyncSingleFlight():
+    """ The asyncio counterpart of SingleFlight: concurrent awaiters of one key share one task """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, function, *args):
+        """ Awaits function(*args), or the task already in flight for key
+
+        The shared task is shielded, so cancelling one caller does not cancel
+        it for the others.
+        """
+        task = self._calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(function(*args))
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self._calls[key] = task
+            self.calls += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
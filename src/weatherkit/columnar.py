@@ -0,0 +1,165 @@
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError('Columnar forecasts require numpy (pip install numpy)') from error
+
+from . import models
+from .models import BOOL
+from .models import END_TIME
+from .models import FLOAT
+from .models import TIME
+from .models import CurrentConditions
+from .models import Weather
+from .models import lookup
+from .timestamps import localizer
+
+
+WEATHER = Weather()
+
+CARDINAL_DIRECTIONS = np.array(models.CARDINAL_DIRECTIONS, dtype=object)
+
+# Each column is (attribute name, key path in the API item, kind) and each
+# derived column (attribute name, source column, Weather conversion method),
+# the same schemas the model classes are built from
+MINUTE_COLUMNS = models.MINUTE_FORECAST_SOURCES
+HOURLY_COLUMNS = models.HOURLY_FORECAST_SOURCES
+HOURLY_DERIVED = models.HOURLY_FORECAST_DERIVED
+DAILY_COLUMNS = models.DAILY_FORECAST_SOURCES
+DAILY_DERIVED = models.DAILY_FORECAST_DERIVED
+
+
+def _cardinal_directions(degrees):
+    """ Vectorized Weather.degrees_to_cardinal; NaN degrees become None """
+    valid = ~np.isnan(degrees)
+    index = np.round(np.where(valid, degrees, 0) / 22.5).astype(int) % len(CARDINAL_DIRECTIONS)
+    directions = CARDINAL_DIRECTIONS[index]
+    directions[~valid] = None
+    return directions
+
+
+def _map_text(values, convert):
+    """ Applies a conversion once per distinct value of a text column """
+    lookup = {value: convert(value) for value in set(values.tolist())}
+    return np.array([lookup[value] for value in values], dtype=object)
+
+
+def _derive(values, method_name):
+    if method_name == 'degrees_to_cardinal':
+        return _cardinal_directions(values)
+    if values.dtype == object:
+        return _map_text(values, getattr(WEATHER, method_name))
+    # The numeric Weather conversions work on whole arrays as they are
+    return getattr(WEATHER, method_name)(values)
+
+
+class ForecastTable():
+    """ A struct-of-arrays forecast: one array per attribute, one row per hour, day or minute
+
+    Missing numbers are NaN, missing booleans are masked, and missing text is None.
+    A start_time column holds the UTC start times as datetime64 values.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_items(cls, items, schema, derived, timezone):
+        timezone = localizer(timezone)
+        columns = {}
+
+        for name, path, kind in schema:
+            values = [lookup(item, path) for item in items]
+
+            if kind == FLOAT:
+                columns[name] = np.array(values, dtype=float)
+            elif kind == BOOL:
+                mask = [value is None for value in values]
+                columns[name] = np.ma.masked_array([bool(value) for value in values], mask=mask, dtype=bool)
+            elif kind == TIME:
+                columns[name] = np.array([timezone.localize(value) for value in values], dtype=object)
+            elif kind == END_TIME:
+                columns[name] = np.array([timezone.localize(value, hours=1) for value in values], dtype=object)
+            else:
+                columns[name] = np.array(values, dtype=object)
+
+            if name == 'start_datetime':
+                start_times = [timezone.parse(value).replace(tzinfo=None) for value in values]
+                columns['start_time'] = np.array(start_times, dtype='datetime64[s]')
+
+        table = cls(columns)
+        table.derive(derived)
+        return table
+
+    def derive(self, derived):
+        """ Adds the derived columns, each (attribute name, source column, Weather conversion method) """
+        for name, source, method_name in derived:
+            self.columns[name] = _derive(self.columns[source], method_name)
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+
+def stack(tables, locations=None):
+    """ Stacks tables for many locations into one table
+
+    A location column holds each row's index into tables. If locations is a
+    list of (latitude, longitude, ...) tuples, latitude and longitude columns
+    are added too.
+    """
+    tables = list(tables)
+    counts = [len(table) for table in tables]
+    columns = {}
+
+    for name in tables[0].columns:
+        arrays = [table[name] for table in tables]
+        if isinstance(arrays[0], np.ma.MaskedArray):
+            columns[name] = np.ma.concatenate(arrays)
+        else:
+            columns[name] = np.concatenate(arrays)
+
+    columns['location'] = np.repeat(np.arange(len(tables)), counts)
+
+    if locations is not None:
+        columns['latitude'] = np.repeat([float(location[0]) for location in locations], counts)
+        columns['longitude'] = np.repeat([float(location[1]) for location in locations], counts)
+
+    return ForecastTable(columns)
+
+
+class ColumnarResponse():
+    """ The columnar counterpart of WeatherKitResponse """
+
+    def __init__(self, data, timezone):
+        timezone = localizer(timezone)
+        self.current_weather = None
+        self.forecast_next_hour_minutes = None
+        self.forecast_hourly = None
+        self.forecast_daily = None
+        self.latitude = None
+        self.longitude = None
+        self.distance_km = None
+
+        if 'currentWeather' in data:
+            self.current_weather = CurrentConditions(data['currentWeather'], timezone)
+
+        if 'forecastNextHour' in data:
+            minutes = data['forecastNextHour'].get('minutes') or []
+            self.forecast_next_hour_minutes = ForecastTable.from_items(minutes, MINUTE_COLUMNS, (), timezone)
+
+        if 'forecastHourly' in data:
+            hours = data['forecastHourly'].get('hours', [])
+            self.forecast_hourly = ForecastTable.from_items(hours, HOURLY_COLUMNS, HOURLY_DERIVED, timezone)
+
+        if 'forecastDaily' in data:
+            days = data['forecastDaily'].get('days', [])
+            self.forecast_daily = ForecastTable.from_items(days, DAILY_COLUMNS, DAILY_DERIVED, timezone)
@@ -0,0 +1,178 @@
+"""
+Patches between successive responses for the same location.
+
+A patch is plain JSON that holds only what changed. Sections and objects
+list only the attributes that changed, and hourly, daily and minute lists
+are matched item by item on start_datetime:
+
+    {
+        'current_weather': {'current_datetime': '...', 'temperature_c': -8.1},
+        'forecast_hourly': {
+            'changed': {'2022-11-18T10:00:00-07:00': {'precip_chance': 0.3}},
+            'added': [{...a full hour...}],
+            'removed': ['2022-11-17T22:00:00-07:00'],
+        },
+    }
+
+An empty patch means nothing changed. A section that was missing before is
+sent in full, and a section or key that went away is sent as None.
+"""
+import copy
+import datetime
+
+from .serializers import to_dict
+
+
+NUMBER_TYPES = (int, float)
+
+ITEM_KEY = 'start_datetime'
+
+
+def _state(response, fields=None):
+    """ Returns a response as plain JSON state; plain dicts and None pass through """
+    if response is None or isinstance(response, dict):
+        return response
+    return to_dict(response, fields)
+
+
+def _is_number(value):
+    return isinstance(value, NUMBER_TYPES) and not isinstance(value, bool)
+
+
+def _is_keyed(value):
+    return isinstance(value, list) and all(isinstance(item, dict) and ITEM_KEY in item for item in value)
+
+
+def _changed(name, old, new, tolerances):
+    if _is_number(old) and _is_number(new):
+        return abs(new - old) > tolerances.get(name, 0)
+    return old != new
+
+
+def _diff_value(name, old, new, tolerances):
+    """ Returns the patch for one value, or None when it has not changed """
+    if isinstance(old, dict) and isinstance(new, dict):
+        return _diff_dict(old, new, tolerances) or None
+    if old and new and _is_keyed(old) and _is_keyed(new):
+        return _diff_items(old, new, tolerances) or None
+    if _changed(name, old, new, tolerances):
+        # Wrapped so that a change to None can be told apart from no change
+        return [new]
+    return None
+
+
+def _diff_dict(old, new, tolerances):
+    patch = {}
+    for name, value in new.items():
+        change = _diff_value(name, old.get(name), value, tolerances)
+        if isinstance(change, list):
+            patch[name] = change[0]
+        elif change is not None:
+            patch[name] = change
+    for name in old:
+        if name not in new and old[name] is not None:
+            patch[name] = None
+    return patch
+
+
+def _diff_items(old, new, tolerances):
+    old_items = {item[ITEM_KEY]: item for item in old}
+    new_items = {item[ITEM_KEY]: item for item in new}
+    patch = {}
+
+    changed = {}
+    for key, item in new_items.items():
+        if key in old_items:
+            item_patch = _diff_dict(old_items[key], item, tolerances)
+            if item_patch:
+                changed[key] = item_patch
+
+    added = [item for key, item in new_items.items() if key not in old_items]
+    removed = [key for key in old_items if key not in new_items]
+
+    if changed:
+        patch['changed'] = changed
+    if added:
+        patch['added'] = added
+    if removed:
+        patch['removed'] = removed
+    return patch
+
+
+def diff(previous, current, tolerances=None, fields=None):
+    """ Returns the patch that turns previous into current
+
+    Both are WeatherKitResponses, plain dicts from serializers.to_dict (e.g. a
+    state rebuilt with apply), or None for no previous state. tolerances maps
+    attribute names to the absolute change below which a number counts as
+    unchanged, e.g. {'temperature_c': 0.2, 'precip_chance': 0.05}. fields
+    limits which attributes are compared, as in serializers.to_dict.
+    """
+    previous, current = _state(previous, fields), _state(current, fields)
+    if previous is None:
+        return copy.deepcopy(current)
+    return copy.deepcopy(_diff_dict(previous, current, tolerances or {}))
+
+
+def _instant(item):
+    return datetime.datetime.fromisoformat(item[ITEM_KEY])
+
+
+def _apply_value(old, patch):
+    if isinstance(old, dict) and isinstance(patch, dict):
+        return _apply_dict(old, patch)
+    if old and _is_keyed(old) and isinstance(patch, dict):
+        return _apply_items(old, patch)
+    return copy.deepcopy(patch)
+
+
+def _apply_dict(state, patch):
+    result = dict(state)
+    for name, value in patch.items():
+        result[name] = _apply_value(state.get(name), value)
+    return result
+
+
+def _apply_items(items, patch):
+    by_key = {item[ITEM_KEY]: item for item in items}
+
+    for key in patch.get('removed', ()):
+        by_key.pop(key, None)
+    for key, item_patch in patch.get('changed', {}).items():
+        by_key[key] = _apply_dict(by_key[key], item_patch)
+    for item in patch.get('added', ()):
+        by_key[item[ITEM_KEY]] = copy.deepcopy(item)
+
+    return sorted(by_key.values(), key=_instant)
+
+
+def apply(state, patch):
+    """ Returns the state a patch leads to, leaving state and patch unchanged
+
+    state is plain JSON state as returned by serializers.to_dict or a previous
+    apply, or None before the first patch.
+    """
+    if state is None:
+        return copy.deepcopy(patch)
+    return _apply_dict(state, patch)
+
+
+class ChangeTracker():
+    """ Keeps the state consumers have for each location and returns the patches to send them
+
+    Each new response is compared with the state rebuilt from the patches
+    already sent rather than with the previous response, so changes held
+    back by a tolerance still go out once they add up to more than it.
+    """
+
+    def __init__(self, tolerances=None, fields=None):
+        self.tolerances = tolerances
+        self.fields = fields
+        self.states = {}
+
+    def update(self, key, response):
+        """ Returns the patch from the last state sent for key to the response, and records it as sent """
+        previous = self.states.get(key)
+        patch = diff(previous, response, self.tolerances, self.fields)
+        self.states[key] = apply(previous, patch)
+        return patch
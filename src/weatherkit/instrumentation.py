@@ -0,0 +1,165 @@
+import bisect
+import collections
+import contextlib
+import threading
+import time
+
+
+class FetchStats():
+    """ Measurements for one call: seconds per phase, body size, HTTP status and items per dataset
+
+    The phases are 'sign' (getting the JWT), 'throttle' (waiting for the rate
+    limiter), 'http' (the requests and response body), 'backoff' (sleeping
+    before retries), 'decode' (JSON decoding), 'parse' (building the models)
+    and, for fetch_stream, 'stream' (decoding and parsing while downloading).
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.payload_bytes = None
+        self.status = None
+        self.retries = 0
+        self.item_counts = {}
+        self.cache_hit = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def count_items(data):
+    """ Returns the number of forecast items per dataset in a decoded payload """
+    counts = {}
+
+    for name, section in data.items():
+        if not isinstance(section, dict):
+            continue
+        if name == 'forecastHourly':
+            counts[name] = len(section.get('hours', []))
+        elif name == 'forecastDaily':
+            counts[name] = len(section.get('days', []))
+        elif name == 'forecastNextHour':
+            counts[name] = len(section.get('minutes') or [])
+        else:
+            counts[name] = 1
+
+    return counts
+
+
+class Instrumentation():
+    """ The default, no-op instrumentation
+
+    Subclasses set enabled = True and override record(), which receives a
+    FetchStats after every call. While enabled is False the client does not
+    take any measurements.
+    """
+
+    enabled = False
+
+    def record(self, stats):
+        pass
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        """ Times a block outside of fetch, e.g. serialization, and records it as its own call """
+        if not self.enabled:
+            yield
+            return
+
+        stats = FetchStats()
+        with stats.phase(phase):
+            yield
+        self.record(stats)
+
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BOUNDS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram():
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """ Returns the upper bound of the bucket holding the q quantile (the max for the overflow bucket) """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class HistogramInstrumentation(Instrumentation):
+    """ Aggregates phase timings into in-process histograms """
+
+    enabled = True
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.phases = collections.defaultdict(lambda: Histogram(self.bounds))
+        self.statuses = collections.Counter()
+        self.item_counts = collections.Counter()
+        self.payload_bytes = 0
+        self.calls = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record(self, stats):
+        with self._lock:
+            self.calls += 1
+            for phase, seconds in stats.timings.items():
+                self.phases[phase].add(seconds)
+            if stats.status is not None:
+                self.statuses[stats.status] += 1
+            if stats.payload_bytes:
+                self.payload_bytes += stats.payload_bytes
+            if stats.cache_hit:
+                self.cache_hits += 1
+            self.retries += stats.retries
+            self.item_counts.update(stats.item_counts)
+
+    def summary(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'cache_hits': self.cache_hits,
+                'retries': self.retries,
+                'payload_bytes': self.payload_bytes,
+                'statuses': dict(self.statuses),
+                'item_counts': dict(self.item_counts),
+                'phases': {phase: histogram.summary() for phase, histogram in self.phases.items()},
+            }
@@ -0,0 +1,204 @@
+import collections
+import http.server
+import json
+import pathlib
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+
+import jwt
+
+
+SAMPLE_PATH = pathlib.Path(__file__).resolve().parent / 'data' / 'sample_data.json'
+
+
+def load_sample():
+    return json.loads(SAMPLE_PATH.read_text())
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+    daemon_threads = True
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.mock.handle(self)
+
+
+class MockWeatherKitServer():
+    """ A local stand-in for the WeatherKit API, for integration and load tests
+
+    It serves the payload (data/sample_data.json by default) at
+    /api/v1/weather/<language>/<latitude>/<longitude>, keeping only the
+    requested dataSets and the hours and days within any hourlyStart/End and
+    dailyStart/End range, and answers 401 when the Authorization header is not
+    a well-formed WeatherKit JWT. When a public key is given the signature is
+    verified too. Requests can be slowed down by latency seconds, and a
+    fraction of them can fail with 429 (rate_limit_rate) or a 5xx status
+    (error_rate).
+
+        with MockWeatherKitServer(latency=0.01, rate_limit_rate=0.05) as server:
+            client = WeatherKit(..., base_url=server.url)
+    """
+
+    def __init__(self, payload=None, host='127.0.0.1', port=0, latency=0, rate_limit_rate=0, error_rate=0,
+                 error_status=503, retry_after=1, team_id=None, service_id=None, key_id=None, public_key=None,
+                 seed=None):
+        self.payload = payload if payload is not None else load_sample()
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.team_id = team_id
+        self.service_id = service_id
+        self.key_id = key_id
+        self.public_key = public_key
+
+        self.statuses = collections.Counter()
+        self._random = random.Random(seed)
+        self._queued = collections.deque()
+        self._lock = threading.Lock()
+
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self):
+        return sum(self.statuses.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def queue_status(self, status, count=1):
+        """ Answers the next count requests with this status, before any random failures """
+        with self._lock:
+            self._queued.extend([status] * count)
+
+    def validate_token(self, authorization):
+        """ Returns None if the Authorization header holds a valid token, otherwise the reason it is not """
+        if not authorization or not authorization.startswith('Bearer '):
+            return 'Missing bearer token'
+        token = authorization[len('Bearer '):]
+
+        try:
+            header = jwt.get_unverified_header(token)
+            if self.public_key is not None:
+                claims = jwt.decode(token, self.public_key, algorithms=['ES256'], options={'verify_aud': False})
+            else:
+                claims = jwt.decode(token, options={'verify_signature': False})
+        except jwt.PyJWTError as error:
+            return f'Invalid token: {error}'
+
+        if header.get('alg') != 'ES256':
+            return 'The token must be signed with ES256'
+        for name in ('kid', 'id'):
+            if not header.get(name):
+                return f'The token header has no {name}'
+        for name in ('iss', 'sub', 'iat', 'exp'):
+            if name not in claims:
+                return f'The token has no {name} claim'
+        if header['id'] != f'{claims["iss"]}.{claims["sub"]}':
+            return 'The token header id must be <team id>.<service id>'
+        if claims['exp'] <= time.time():
+            return 'The token has expired'
+
+        for value, expected in ((header['kid'], self.key_id), (claims['iss'], self.team_id), (claims['sub'], self.service_id)):
+            if expected is not None and value != expected:
+                return f'Unexpected token value {value!r}'
+
+        return None
+
+    def _choose_status(self):
+        with self._lock:
+            if self._queued:
+                return self._queued.popleft()
+            roll = self._random.random()
+
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return self.error_status
+        return 200
+
+    def _weather(self, query):
+        datasets = query.get('dataSets', [''])[0].split(',')
+        weather = {name: self.payload[name] for name in datasets if name in self.payload}
+
+        # Keep the hours and days that start in [start, end) of a requested range
+        for name, key, prefix in (('forecastHourly', 'hours', 'hourly'), ('forecastDaily', 'days', 'daily')):
+            start, end = query.get(f'{prefix}Start', [None])[0], query.get(f'{prefix}End', [None])[0]
+            if name in weather and (start or end):
+                items = [
+                    item for item in weather[name][key]
+                    if (not start or item['forecastStart'] >= start) and (not end or item['forecastStart'] < end)
+                ]
+                weather[name] = dict(weather[name], **{key: items})
+
+        return weather
+
+    def handle(self, request):
+        url = urllib.parse.urlsplit(request.path)
+        parts = url.path.strip('/').split('/')
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if len(parts) != 6 or parts[:3] != ['api', 'v1', 'weather']:
+            return self._respond(request, 404, {'reason': 'NOT_FOUND'})
+
+        reason = self.validate_token(request.headers.get('Authorization'))
+        if reason is not None:
+            return self._respond(request, 401, {'reason': reason})
+
+        status = self._choose_status()
+        if status == 429:
+            return self._respond(request, 429, {'reason': 'RATE_LIMITED'}, {'Retry-After': str(self.retry_after)})
+        if status != 200:
+            return self._respond(request, status, {'reason': 'SERVER_ERROR'})
+
+        self._respond(request, 200, self._weather(urllib.parse.parse_qs(url.query)))
+
+    def _respond(self, request, status, body, headers=None):
+        content = json.dumps(body).encode()
+
+        # Counted before answering, so a client that has its response sees it counted
+        with self._lock:
+            self.statuses[status] += 1
+
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(content)
@@ -1,9 +1,61 @@
-import arrow
-import jsonpickle
+import collections.abc
+
+from .serializers import dumps
+from .timestamps import localizer
+
+
+CARDINAL_DIRECTIONS = ['N','NNE','NE','ENE','E','ESE','SE','SSE','S','SSW','SW','WSW','W','WNW','NW','NNW']
+
+# Display names for the WeatherKit condition codes
+CONDITIONS = {
+    'Clear': 'Clear',
+    'Cloudy': 'Cloudy',
+    'Dust': 'Dust',
+    'Fog': 'Fog',
+    'Haze': 'Haze',
+    'MostlyClear': 'Mostly Clear',
+    'MostlyCloudy': 'Mostly Cloudy',
+    'PartlyCloudy': 'Partly Cloudy',
+    'ScatteredThunderstorms': 'Scattered Thunderstorms',
+    'Smoke': 'Smoke',
+    'Breezy': 'Breezy',
+    'Windy': 'Windy',
+    'Drizzle': 'Drizzle',
+    'HeavyRain': 'Heavy Rain',
+    'Rain': 'Rain',
+    'Showers': 'Showers',
+    'Flurries': 'Flurries',
+    'HeavySnow': 'Heavy Snow',
+    'MixedRainAndSleet': 'Mixed Rain and Sleet',
+    'MixedRainAndSnow': 'Mixed Rain and Snow',
+    'MixedRainfall': 'Mixed Rainfall',
+    'MixedSnowAndSleet': 'Mixed Snow and Sleet',
+    'ScatteredShowers': 'Scattered Showers',
+    'ScatteredSnowShowers': 'Scattered Snow Showers',
+    'Sleet': 'Sleet',
+    'Snow': 'Snow',
+    'SnowShowers': 'Snow Showers',
+    'Blizzard': 'Blizzard',
+    'BlowingSnow': 'Blowing Snow',
+    'FreezingDrizzle': 'Freezing Drizzle',
+    'FreezingRain': 'Freezing Rain',
+    'Frigid': 'Frigid',
+    'Hail': 'Hail',
+    'Hot': 'Hot',
+    'Hurricane': 'Hurricane',
+    'IsolatedThunderstorms': 'Isolated Thunderstorms',
+    'SevereThunderstorm': 'Severe Thunderstorm',
+    'Thunderstorm': 'Thunderstorm',
+    'Tornado': 'Tornado',
+    'TropicalStorm': 'Tropical Storm',
+}
 
 
 class Weather():
 
+    # Empty so the compact subclasses below can do without a per-instance __dict__
+    __slots__ = ()
+
     def millimeters_to_inches(self, mm_value):
         if mm_value is None: return None
         return mm_value / 25.4
@@ -14,9 +66,8 @@ class Weather():
 
     def degrees_to_cardinal(self, d_value):
         if d_value is None: return None
-        dirs = ['N','NNE','NE','ENE','E','ESE','SE','SSE','S','SSW','SW','WSW','W','WNW','NW','NNW']
-        ix = round(d_value / (360.0 / len(dirs)))
-        return dirs[ix % len(dirs)]
+        ix = round(d_value / (360.0 / len(CARDINAL_DIRECTIONS)))
+        return CARDINAL_DIRECTIONS[ix % len(CARDINAL_DIRECTIONS)]
 
     def kmh_to_mph(self, kmh_value):
         if kmh_value is None: return None
@@ -34,63 +85,344 @@ class Weather():
 
     def conditions_for_code(self, code):
         if not code or code == '': return None
-
-        codes = {
-            'Clear': 'Clear',
-            'Cloudy': 'Cloudy',
-            'Dust': 'Dust',
-            'Fog': 'Fog',
-            'Haze': 'Haze',
-            'MostlyClear': 'Mostly Clear',
-            'MostlyCloudy': 'Mostly Cloudy',
-            'PartlyCloudy': 'Partly Cloudy',
-            'ScatteredThunderstorms': 'Scattered Thunderstorms',
-            'Smoke': 'Smoke',
-            'Breezy': 'Breezy',
-            'Windy': 'Windy',
-            'Drizzle': 'Drizzle',
-            'HeavyRain': 'Heavy Rain',
-            'Rain': 'Rain',
-            'Showers': 'Showers',
-            'Flurries': 'Flurries',
-            'HeavySnow': 'Heavy Snow',
-            'MixedRainAndSleet': 'Mixed Rain and Sleet',
-            'MixedRainAndSnow': 'Mixed Rain and Snow',
-            'MixedRainfall': 'Mixed Rainfall',
-            'MixedSnowAndSleet': 'Mixed Snow and Sleet',
-            'ScatteredShowers': 'Scattered Showers',
-            'ScatteredSnowShowers': 'Scattered Snow Showers',
-            'Sleet': 'Sleet',
-            'Snow': 'Snow',
-            'SnowShowers': 'Snow Showers',
-            'Blizzard': 'Blizzard',
-            'BlowingSnow': 'Blowing Snow',
-            'FreezingDrizzle': 'Freezing Drizzle',
-            'FreezingRain': 'Freezing Rain',
-            'Frigid': 'Frigid',
-            'Hail': 'Hail',
-            'Hot': 'Hot',
-            'Hurricane': 'Hurricane',
-            'IsolatedThunderstorms': 'Isolated Thunderstorms',
-            'SevereThunderstorm': 'Severe Thunderstorm',
-            'Thunderstorm': 'Thunderstorm',
-            'Tornado': 'Tornado',
-            'TropicalStorm': 'Tropical Storm',
-        }
-
-        return codes.get(code, 'Unknown')
+        return CONDITIONS.get(code, 'Unknown')
+
+
+# The attributes of each model, in order. Serializers use them as the schema;
+# the stored ones (those not derived below) are the compact classes' __slots__.
+
+MINUTE_FORECAST_FIELDS = ('start_datetime', 'precip_chance', 'precip_intensity')
+
+CURRENT_CONDITIONS_FIELDS = (
+    'current_datetime',
+    'cloud_cover',
+    'condition_code',
+    'conditions',
+    'icon',
+    'is_daylight',
+    'humidity',
+    'precip_intensity',
+    'pressure_mb',
+    'pressure_trend',
+    'temperature_c',
+    'temperature_f',
+    'temperature_feels_like_c',
+    'temperature_feels_like_f',
+    'temperature_dew_point_c',
+    'temperature_dew_point_f',
+    'uv_index',
+    'visibility_meters',
+    'visibility_miles',
+    'wind_degrees',
+    'wind_direction',
+    'wind_gust_kmh',
+    'wind_gust_mph',
+    'wind_speed_kmh',
+    'wind_speed_mph',
+)
+
+NEXT_HOUR_FORECAST_FIELDS = ('start_datetime', 'precip_type', 'precip_chance', 'precip_intensity', 'minutes')
+
+HOURLY_FORECAST_FIELDS = (
+    'start_datetime',
+    'end_datetime',
+    'cloud_cover',
+    'condition_code',
+    'conditions',
+    'icon',
+    'is_daylight',
+    'humidity',
+    'precip_amount_mm',
+    'precip_amount_inches',
+    'precip_intensity',
+    'precip_chance',
+    'precip_type',
+    'pressure_mb',
+    'pressure_trend',
+    'snowfall_intensity',
+    'snowfall_amount_mm',
+    'snowfall_amount_inches',
+    'temperature_c',
+    'temperature_f',
+    'temperature_feels_like_c',
+    'temperature_feels_like_f',
+    'temperature_dew_point_c',
+    'temperature_dew_point_f',
+    'uv_index',
+    'visibility_meters',
+    'visibility_miles',
+    'wind_degrees',
+    'wind_direction',
+    'wind_gust_kmh',
+    'wind_gust_mph',
+    'wind_speed_kmh',
+    'wind_speed_mph',
+)
+
+DAILY_FORECAST_FIELDS = (
+    'start_datetime',
+    'end_datetime',
+    'condition_code',
+    'conditions',
+    'icon',
+    'max_uv_index',
+    'moon_phase',
+    'precip_amount_mm',
+    'precip_amount_in',
+    'precip_chance',
+    'precip_type',
+    'snowfall_amount_mm',
+    'snowfall_amount_in',
+    'sunrise',
+    'sunset',
+    'temperature_max_c',
+    'temperature_min_c',
+    'temperature_max_f',
+    'temperature_min_f',
+    'daytime_cloud_cover',
+    'daytime_condition_code',
+    'daytime_conditions',
+    'daytime_icon',
+    'daytime_humidity',
+    'daytime_precip_amount_mm',
+    'daytime_precip_amount_in',
+    'daytime_precip_chance',
+    'daytime_precip_type',
+    'daytime_snowfall_amount_mm',
+    'daytime_snowfall_amount_in',
+    'daytime_wind_degrees',
+    'daytime_wind_direction',
+    'daytime_wind_speed_avg_kmh',
+    'daytime_wind_speed_avg_mph',
+    'overnight_cloud_cover',
+    'overnight_condition_code',
+    'overnight_conditions',
+    'overnight_icon',
+    'overnight_humidity',
+    'overnight_precip_amount_mm',
+    'overnight_precip_amount_in',
+    'overnight_precip_chance',
+    'overnight_precip_type',
+    'overnight_snowfall_amount_mm',
+    'overnight_snowfall_amount_in',
+    'overnight_wind_degrees',
+    'overnight_wind_direction',
+    'overnight_wind_speed_avg_kmh',
+    'overnight_wind_speed_avg_mph',
+    'nighttime_cloud_cover',
+    'nighttime_condition_code',
+    'nighttime_conditions',
+    'nighttime_icon',
+    'nighttime_humidity',
+    'nighttime_precip_amount_mm',
+    'nighttime_precip_amount_in',
+    'nighttime_precip_chance',
+    'nighttime_precip_type',
+    'nighttime_snowfall_amount_mm',
+    'nighttime_snowfall_amount_in',
+    'nighttime_wind_degrees',
+    'nighttime_wind_direction',
+    'nighttime_wind_speed_avg_kmh',
+    'nighttime_wind_speed_avg_mph',
+)
+
+
+# Where each stored attribute comes from: (attribute name, key path in the API
+# item, kind). Projected models and the columnar tables are built from these.
+FLOAT = 'float'
+BOOL = 'bool'
+TEXT = 'text'
+TIME = 'time'
+END_TIME = 'end_time'
+
+MINUTE_FORECAST_SOURCES = (
+    ('start_datetime', ('startTime',), TIME),
+    ('precip_chance', ('precipitationChance',), FLOAT),
+    ('precip_intensity', ('precipitationIntensity',), FLOAT),
+)
+
+CURRENT_CONDITIONS_SOURCES = (
+    ('current_datetime', ('asOf',), TIME),
+    ('cloud_cover', ('cloudCover',), FLOAT),
+    ('condition_code', ('conditionCode',), TEXT),
+    ('is_daylight', ('daylight',), BOOL),
+    ('humidity', ('humidity',), FLOAT),
+    ('precip_intensity', ('precipitationIntensity',), FLOAT),
+    ('pressure_mb', ('pressure',), FLOAT),
+    ('pressure_trend', ('pressureTrend',), TEXT),
+    ('temperature_c', ('temperature',), FLOAT),
+    ('temperature_feels_like_c', ('temperatureApparent',), FLOAT),
+    ('temperature_dew_point_c', ('temperatureDewPoint',), FLOAT),
+    ('uv_index', ('uvIndex',), FLOAT),
+    ('visibility_meters', ('visibility',), FLOAT),
+    ('wind_degrees', ('windDirection',), FLOAT),
+    ('wind_gust_kmh', ('windGust',), FLOAT),
+    ('wind_speed_kmh', ('windSpeed',), FLOAT),
+)
+
+HOURLY_FORECAST_SOURCES = (
+    ('start_datetime', ('forecastStart',), TIME),
+    ('end_datetime', ('forecastStart',), END_TIME),
+    ('cloud_cover', ('cloudCover',), FLOAT),
+    ('condition_code', ('conditionCode',), TEXT),
+    ('is_daylight', ('daylight',), BOOL),
+    ('humidity', ('humidity',), FLOAT),
+    ('precip_amount_mm', ('precipitationAmount',), FLOAT),
+    ('precip_intensity', ('precipitationIntensity',), FLOAT),
+    ('precip_chance', ('precipitationChance',), FLOAT),
+    ('precip_type', ('precipitationType',), TEXT),
+    ('pressure_mb', ('pressure',), FLOAT),
+    ('pressure_trend', ('pressureTrend',), TEXT),
+    ('snowfall_intensity', ('snowfallIntensity',), FLOAT),
+    ('snowfall_amount_mm', ('snowfallAmount',), FLOAT),
+    ('temperature_c', ('temperature',), FLOAT),
+    ('temperature_feels_like_c', ('temperatureApparent',), FLOAT),
+    ('temperature_dew_point_c', ('temperatureDewPoint',), FLOAT),
+    ('uv_index', ('uvIndex',), FLOAT),
+    ('visibility_meters', ('visibility',), FLOAT),
+    ('wind_degrees', ('windDirection',), FLOAT),
+    ('wind_gust_kmh', ('windGust',), FLOAT),
+    ('wind_speed_kmh', ('windSpeed',), FLOAT),
+)
+
+DAILY_FORECAST_SOURCES = (
+    ('start_datetime', ('forecastStart',), TIME),
+    ('end_datetime', ('forecastEnd',), TIME),
+    ('condition_code', ('conditionCode',), TEXT),
+    ('max_uv_index', ('maxUvIndex',), FLOAT),
+    ('moon_phase', ('moonPhase',), TEXT),
+    ('precip_amount_mm', ('precipitationAmount',), FLOAT),
+    ('precip_chance', ('precipitationChance',), FLOAT),
+    ('precip_type', ('precipitationType',), TEXT),
+    ('snowfall_amount_mm', ('snowfallAmount',), FLOAT),
+    ('sunrise', ('sunrise',), TIME),
+    ('sunset', ('sunset',), TIME),
+    ('temperature_max_c', ('temperatureMax',), FLOAT),
+    ('temperature_min_c', ('temperatureMin',), FLOAT),
+)
+
+# The attributes computed on access from a stored one: (attribute name,
+# source attribute, Weather conversion method)
+CURRENT_CONDITIONS_DERIVED = (
+    ('conditions', 'condition_code', 'conditions_for_code'),
+    ('icon', 'condition_code', 'icon_for_condition_code'),
+    ('temperature_f', 'temperature_c', 'celsius_to_fahrenheit'),
+    ('temperature_feels_like_f', 'temperature_feels_like_c', 'celsius_to_fahrenheit'),
+    ('temperature_dew_point_f', 'temperature_dew_point_c', 'celsius_to_fahrenheit'),
+    ('visibility_miles', 'visibility_meters', 'meters_to_miles'),
+    ('wind_direction', 'wind_degrees', 'degrees_to_cardinal'),
+    ('wind_gust_mph', 'wind_gust_kmh', 'kmh_to_mph'),
+    ('wind_speed_mph', 'wind_speed_kmh', 'kmh_to_mph'),
+)
+
+HOURLY_FORECAST_DERIVED = (
+    ('conditions', 'condition_code', 'conditions_for_code'),
+    ('icon', 'condition_code', 'icon_for_condition_code'),
+    ('precip_amount_inches', 'precip_amount_mm', 'millimeters_to_inches'),
+    ('snowfall_amount_inches', 'snowfall_amount_mm', 'millimeters_to_inches'),
+    ('temperature_f', 'temperature_c', 'celsius_to_fahrenheit'),
+    ('temperature_feels_like_f', 'temperature_feels_like_c', 'celsius_to_fahrenheit'),
+    ('temperature_dew_point_f', 'temperature_dew_point_c', 'celsius_to_fahrenheit'),
+    ('visibility_miles', 'visibility_meters', 'meters_to_miles'),
+    ('wind_direction', 'wind_degrees', 'degrees_to_cardinal'),
+    ('wind_gust_mph', 'wind_gust_kmh', 'kmh_to_mph'),
+    ('wind_speed_mph', 'wind_speed_kmh', 'kmh_to_mph'),
+)
+
+DAILY_FORECAST_DERIVED = (
+    ('conditions', 'condition_code', 'conditions_for_code'),
+    ('icon', 'condition_code', 'icon_for_condition_code'),
+    ('precip_amount_in', 'precip_amount_mm', 'millimeters_to_inches'),
+    ('snowfall_amount_in', 'snowfall_amount_mm', 'millimeters_to_inches'),
+    ('temperature_max_f', 'temperature_max_c', 'celsius_to_fahrenheit'),
+    ('temperature_min_f', 'temperature_min_c', 'celsius_to_fahrenheit'),
+)
+
+
+def _part_of_day_schema(prefix, key):
+    sources = (
+        (f'{prefix}_cloud_cover', (key, 'cloudCover'), FLOAT),
+        (f'{prefix}_condition_code', (key, 'conditionCode'), TEXT),
+        (f'{prefix}_humidity', (key, 'humidity'), FLOAT),
+        (f'{prefix}_precip_amount_mm', (key, 'precipitationAmount'), FLOAT),
+        (f'{prefix}_precip_chance', (key, 'precipitationChance'), FLOAT),
+        (f'{prefix}_precip_type', (key, 'precipitationType'), TEXT),
+        (f'{prefix}_snowfall_amount_mm', (key, 'snowfallAmount'), FLOAT),
+        (f'{prefix}_wind_degrees', (key, 'windDirection'), FLOAT),
+        (f'{prefix}_wind_speed_avg_kmh', (key, 'windSpeed'), FLOAT),
+    )
+
+    derived = (
+        (f'{prefix}_conditions', f'{prefix}_condition_code', 'conditions_for_code'),
+        (f'{prefix}_icon', f'{prefix}_condition_code', 'icon_for_condition_code'),
+        (f'{prefix}_precip_amount_in', f'{prefix}_precip_amount_mm', 'millimeters_to_inches'),
+        (f'{prefix}_snowfall_amount_in', f'{prefix}_snowfall_amount_mm', 'millimeters_to_inches'),
+        (f'{prefix}_wind_direction', f'{prefix}_wind_degrees', 'degrees_to_cardinal'),
+        (f'{prefix}_wind_speed_avg_mph', f'{prefix}_wind_speed_avg_kmh', 'kmh_to_mph'),
+    )
+
+    return sources, derived
+
+
+for _prefix, _key in [('daytime', 'daytimeForecast'), ('overnight', 'overnightForecast'), ('nighttime', 'restOfDayForecast')]:
+    _sources, _derived = _part_of_day_schema(_prefix, _key)
+    DAILY_FORECAST_SOURCES += _sources
+    DAILY_FORECAST_DERIVED += _derived
+
+# The Weather conversions that produce imperial values
+IMPERIAL_CONVERSIONS = ('celsius_to_fahrenheit', 'kmh_to_mph', 'millimeters_to_inches', 'meters_to_miles')
+
+
+def stored_fields(fields, derived):
+    """ Returns the fields that are set by the constructor rather than derived """
+    derived_names = {name for name, _, _ in derived}
+    return tuple(name for name in fields if name not in derived_names)
+
+
+def lookup(item, path):
+    """ Reads a key path such as ('daytimeForecast', 'humidity') from an API item """
+    for key in path[:-1]:
+        item = item.get(key) or {}
+    return item.get(path[-1])
+
+
+class DerivedField():
+    """ An attribute computed on access from a stored one with a Weather conversion method """
+
+    def __init__(self, source, method_name):
+        self.source = source
+        self.method_name = method_name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return getattr(instance, self.method_name)(getattr(instance, self.source))
+
+
+def with_derived_fields(cls):
+    """ Class decorator adding a DerivedField for each entry of cls.derived """
+    for name, source, method_name in cls.derived:
+        setattr(cls, name, DerivedField(source, method_name))
+    return cls
 
 
 class MinuteForecast(Weather):
 
+    fields = MINUTE_FORECAST_FIELDS
+    sources = MINUTE_FORECAST_SOURCES
+    derived = ()
+
     def __init__(self, data, timezone):
-        self.start_datetime = arrow.get(data.get('startTime')).to(timezone).for_json()
+        self.start_datetime = localizer(timezone).localize(data.get('startTime'))
         self.precip_chance = data.get('precipitationChance')
         self.precip_intensity = data.get('precipitationIntensity')
 
 
 class NextHourForecast(Weather):
 
+    fields = NEXT_HOUR_FORECAST_FIELDS
+    minute_class = MinuteForecast
+
     def __init__(self, data, timezone):
         self.start_datetime = None
         self.precip_type = None
@@ -99,62 +431,62 @@ class NextHourForecast(Weather):
         self.minutes = []
 
         summaries = data.get('summary', [])
+        timezone = localizer(timezone)
 
         if len(summaries) > 0:
             summary = summaries[0]
-            self.start_datetime = arrow.get(summary.get('startTime')).to(timezone).for_json()
+            self.start_datetime = timezone.localize(summary.get('startTime'))
             self.precip_type = summary.get('condition') # Note this is called "condition" in the API
             self.precip_chance = summary.get('precipitationChance')
             self.precip_intensity = summary.get('precipitationIntensity')
-            self.minutes = [MinuteForecast(m, timezone) for m in data.get('minutes')]
+            self.minutes = [self.minute_class(m, timezone) for m in data.get('minutes')]
 
 
+@with_derived_fields
 class CurrentConditions(Weather):
 
+    fields = CURRENT_CONDITIONS_FIELDS
+    sources = CURRENT_CONDITIONS_SOURCES
+    derived = CURRENT_CONDITIONS_DERIVED
+
     def __init__(self, data, timezone):
-        self.current_datetime = arrow.get(data.get('asOf')).to(timezone).for_json()
+        self.current_datetime = localizer(timezone).localize(data.get('asOf'))
         self.cloud_cover = data.get('cloudCover')
         self.condition_code = data.get('conditionCode')
-        self.conditions = self.conditions_for_code(self.condition_code)
-        self.icon = self.icon_for_condition_code(self.condition_code)
         self.is_daylight = data.get('daylight')
         self.humidity = data.get('humidity')
         self.precip_intensity = data.get('precipitationIntensity')
         self.pressure_mb = data.get('pressure')
         self.pressure_trend = data.get('pressureTrend')
         self.temperature_c = data.get('temperature')
-        self.temperature_f = self.celsius_to_fahrenheit(self.temperature_c)
         self.temperature_feels_like_c = data.get('temperatureApparent')
-        self.temperature_feels_like_f = self.celsius_to_fahrenheit(self.temperature_feels_like_c)
         self.temperature_dew_point_c = data.get('temperatureDewPoint')
-        self.temperature_dew_point_f = self.celsius_to_fahrenheit(self.temperature_dew_point_c)
         self.uv_index = data.get('uvIndex')
         self.visibility_meters = data.get('visibility')
-        self.visibility_miles = self.meters_to_miles(self.visibility_meters)
         self.wind_degrees = data.get('windDirection')
-        self.wind_direction = self.degrees_to_cardinal(self.wind_degrees)
         self.wind_gust_kmh = data.get('windGust')
-        self.wind_gust_mph = self.kmh_to_mph(self.wind_gust_kmh)
         self.wind_speed_kmh = data.get('windSpeed')
-        self.wind_speed_mph = self.kmh_to_mph(self.wind_speed_kmh)
 
     def default(self, obj):
         return obj.__dict__
 
 
+@with_derived_fields
 class HourlyForecast(Weather):
 
+    fields = HOURLY_FORECAST_FIELDS
+    sources = HOURLY_FORECAST_SOURCES
+    derived = HOURLY_FORECAST_DERIVED
+
     def __init__(self, data, timezone):
-        self.start_datetime = arrow.get(data.get('forecastStart')).to(timezone).for_json()
-        self.end_datetime = arrow.get(data.get('forecastStart')).shift(hours=1).to(timezone).for_json()
+        timezone = localizer(timezone)
+        self.start_datetime = timezone.localize(data.get('forecastStart'))
+        self.end_datetime = timezone.localize(data.get('forecastStart'), hours=1)
         self.cloud_cover = data.get('cloudCover')
         self.condition_code = data.get('conditionCode')
-        self.conditions = self.conditions_for_code(self.condition_code)
-        self.icon = self.icon_for_condition_code(self.condition_code)
         self.is_daylight = data.get('daylight')
         self.humidity = data.get('humidity')
         self.precip_amount_mm = data.get('precipitationAmount')
-        self.precip_amount_inches = self.millimeters_to_inches(self.precip_amount_mm)
         self.precip_intensity = data.get('precipitationIntensity')
         self.precip_chance = data.get('precipitationChance')
         self.precip_type = data.get('precipitationType')
@@ -162,103 +494,420 @@ class HourlyForecast(Weather):
         self.pressure_trend = data.get('pressureTrend')
         self.snowfall_intensity = data.get('snowfallIntensity')
         self.snowfall_amount_mm = data.get('snowfallAmount')
-        self.snowfall_amount_inches = self.millimeters_to_inches(self.snowfall_amount_mm)
         self.temperature_c = data.get('temperature')
-        self.temperature_f = self.celsius_to_fahrenheit(self.temperature_c)
         self.temperature_feels_like_c = data.get('temperatureApparent')
-        self.temperature_feels_like_f = self.celsius_to_fahrenheit(self.temperature_feels_like_c)
         self.temperature_dew_point_c = data.get('temperatureDewPoint')
-        self.temperature_dew_point_f = self.celsius_to_fahrenheit(self.temperature_dew_point_c)
         self.uv_index = data.get('uvIndex')
         self.visibility_meters = data.get('visibility')
-        self.visibility_miles = self.meters_to_miles(self.visibility_meters)
         self.wind_degrees = data.get('windDirection')
-        self.wind_direction = self.degrees_to_cardinal(self.wind_degrees)
         self.wind_gust_kmh = data.get('windGust')
-        self.wind_gust_mph = self.kmh_to_mph(self.wind_gust_kmh)
         self.wind_speed_kmh = data.get('windSpeed')
-        self.wind_speed_mph = self.kmh_to_mph(self.wind_speed_kmh)
 
 
+@with_derived_fields
 class DailyForecast(Weather):
 
+    fields = DAILY_FORECAST_FIELDS
+    sources = DAILY_FORECAST_SOURCES
+    derived = DAILY_FORECAST_DERIVED
+
     def __init__(self, data, timezone):
-        self.start_datetime = arrow.get(data.get('forecastStart')).to(timezone).for_json()
-        self.end_datetime = arrow.get(data.get('forecastEnd')).to(timezone).for_json()
+        timezone = localizer(timezone)
+        self.start_datetime = timezone.localize(data.get('forecastStart'))
+        self.end_datetime = timezone.localize(data.get('forecastEnd'))
         self.condition_code = data.get('conditionCode')
-        self.conditions = self.conditions_for_code(self.condition_code)
-        self.icon = self.icon_for_condition_code(self.condition_code)
         self.max_uv_index = data.get('maxUvIndex')
         self.moon_phase = data.get('moonPhase')
         self.precip_amount_mm = data.get('precipitationAmount')
-        self.precip_amount_in = self.millimeters_to_inches(self.precip_amount_mm)
         self.precip_chance = data.get('precipitationChance')
         self.precip_type = data.get('precipitationType')
         self.snowfall_amount_mm = data.get('snowfallAmount')
-        self.snowfall_amount_in = self.millimeters_to_inches(self.snowfall_amount_mm)
-        self.sunrise = arrow.get(data.get('sunrise')).to(timezone).for_json()
-        self.sunset = arrow.get(data.get('sunset')).to(timezone).for_json()
+        self.sunrise = timezone.localize(data.get('sunrise'))
+        self.sunset = timezone.localize(data.get('sunset'))
         self.temperature_max_c = data.get('temperatureMax')
         self.temperature_min_c = data.get('temperatureMin')
-        self.temperature_max_f = self.celsius_to_fahrenheit(self.temperature_max_c)
-        self.temperature_min_f = self.celsius_to_fahrenheit(self.temperature_min_c)
-
-        self.daytime_cloud_cover = data.get('daytimeForecast', {}).get('cloudCover')
-        self.daytime_condition_code = data.get('daytimeForecast', {}).get('conditionCode')
-        self.daytime_conditions = self.conditions_for_code(self.daytime_condition_code)
-        self.daytime_icon = self.icon_for_condition_code(self.daytime_condition_code)
-        self.daytime_humidity = data.get('daytimeForecast', {}).get('humidity')
-        self.daytime_precip_amount_mm = data.get('daytimeForecast', {}).get('precipitationAmount')
-        self.daytime_precip_amount_in = self.millimeters_to_inches(self.daytime_precip_amount_mm)
-        self.daytime_precip_chance = data.get('daytimeForecast', {}).get('precipitationChance')
-        self.daytime_precip_type = data.get('daytimeForecast', {}).get('precipitationType')
-        self.daytime_snowfall_amount_mm = data.get('daytimeForecast', {}).get('snowfallAmount')
-        self.daytime_snowfall_amount_in = self.millimeters_to_inches(self.daytime_snowfall_amount_mm)
-        self.daytime_wind_degrees = data.get('daytimeForecast', {}).get('windDirection')
-        self.daytime_wind_direction = self.degrees_to_cardinal(self.daytime_wind_degrees)
-        self.daytime_wind_speed_avg_kmh = data.get('daytimeForecast', {}).get('windSpeed')
-        self.daytime_wind_speed_avg_mph = self.kmh_to_mph(self.daytime_wind_speed_avg_kmh)
-
-        self.overnight_cloud_cover = data.get('overnightForecast', {}).get('cloudCover')
-        self.overnight_condition_code = data.get('overnightForecast', {}).get('conditionCode')
-        self.overnight_conditions = self.conditions_for_code(self.overnight_condition_code)
-        self.overnight_icon = self.icon_for_condition_code(self.overnight_condition_code)
-        self.overnight_humidity = data.get('overnightForecast', {}).get('humidity')
-        self.overnight_precip_amount_mm = data.get('overnightForecast', {}).get('precipitationAmount')
-        self.overnight_precip_amount_in = self.millimeters_to_inches(self.overnight_precip_amount_mm)
-        self.overnight_precip_chance = data.get('overnightForecast', {}).get('precipitationChance')
-        self.overnight_precip_type = data.get('overnightForecast', {}).get('precipitationType')
-        self.overnight_snowfall_amount_mm = data.get('overnightForecast', {}).get('snowfallAmount')
-        self.overnight_snowfall_amount_in = self.millimeters_to_inches(self.overnight_snowfall_amount_mm)
-        self.overnight_wind_degrees = data.get('overnightForecast', {}).get('windDirection')
-        self.overnight_wind_direction = self.degrees_to_cardinal(self.overnight_wind_degrees)
-        self.overnight_wind_speed_avg_kmh = data.get('overnightForecast', {}).get('windSpeed')
-        self.overnight_wind_speed_avg_mph = self.kmh_to_mph(self.overnight_wind_speed_avg_kmh)
-
-        self.nighttime_cloud_cover = data.get('restOfDayForecast', {}).get('cloudCover')
-        self.nighttime_condition_code = data.get('restOfDayForecast', {}).get('conditionCode')
-        self.nighttime_conditions = self.conditions_for_code(self.nighttime_condition_code)
-        self.nighttime_icon = self.icon_for_condition_code(self.nighttime_condition_code)
-        self.nighttime_humidity = data.get('restOfDayForecast', {}).get('humidity')
-        self.nighttime_precip_amount_mm = data.get('restOfDayForecast', {}).get('precipitationAmount')
-        self.nighttime_precip_amount_in = self.millimeters_to_inches(self.nighttime_precip_amount_mm)
-        self.nighttime_precip_chance = data.get('restOfDayForecast', {}).get('precipitationChance')
-        self.nighttime_precip_type = data.get('restOfDayForecast', {}).get('precipitationType')
-        self.nighttime_snowfall_amount_mm = data.get('restOfDayForecast', {}).get('snowfallAmount')
-        self.nighttime_snowfall_amount_in = self.millimeters_to_inches(self.nighttime_snowfall_amount_mm)
-        self.nighttime_wind_degrees = data.get('restOfDayForecast', {}).get('windDirection')
-        self.nighttime_wind_direction = self.degrees_to_cardinal(self.nighttime_wind_degrees)
-        self.nighttime_wind_speed_avg_kmh = data.get('restOfDayForecast', {}).get('windSpeed')
-        self.nighttime_wind_speed_avg_mph = self.kmh_to_mph(self.nighttime_wind_speed_avg_kmh)
+
+        daytime = data.get('daytimeForecast') or {}
+        self.daytime_cloud_cover = daytime.get('cloudCover')
+        self.daytime_condition_code = daytime.get('conditionCode')
+        self.daytime_humidity = daytime.get('humidity')
+        self.daytime_precip_amount_mm = daytime.get('precipitationAmount')
+        self.daytime_precip_chance = daytime.get('precipitationChance')
+        self.daytime_precip_type = daytime.get('precipitationType')
+        self.daytime_snowfall_amount_mm = daytime.get('snowfallAmount')
+        self.daytime_wind_degrees = daytime.get('windDirection')
+        self.daytime_wind_speed_avg_kmh = daytime.get('windSpeed')
+
+        overnight = data.get('overnightForecast') or {}
+        self.overnight_cloud_cover = overnight.get('cloudCover')
+        self.overnight_condition_code = overnight.get('conditionCode')
+        self.overnight_humidity = overnight.get('humidity')
+        self.overnight_precip_amount_mm = overnight.get('precipitationAmount')
+        self.overnight_precip_chance = overnight.get('precipitationChance')
+        self.overnight_precip_type = overnight.get('precipitationType')
+        self.overnight_snowfall_amount_mm = overnight.get('snowfallAmount')
+        self.overnight_wind_degrees = overnight.get('windDirection')
+        self.overnight_wind_speed_avg_kmh = overnight.get('windSpeed')
+
+        nighttime = data.get('restOfDayForecast') or {}
+        self.nighttime_cloud_cover = nighttime.get('cloudCover')
+        self.nighttime_condition_code = nighttime.get('conditionCode')
+        self.nighttime_humidity = nighttime.get('humidity')
+        self.nighttime_precip_amount_mm = nighttime.get('precipitationAmount')
+        self.nighttime_precip_chance = nighttime.get('precipitationChance')
+        self.nighttime_precip_type = nighttime.get('precipitationType')
+        self.nighttime_snowfall_amount_mm = nighttime.get('snowfallAmount')
+        self.nighttime_wind_degrees = nighttime.get('windDirection')
+        self.nighttime_wind_speed_avg_kmh = nighttime.get('windSpeed')
+
+
+# Compact variants of the forecast classes. They share the constructors above
+# but store their attributes in __slots__ instead of a per-instance __dict__,
+# which matters when many hourly or daily forecasts are kept in memory.
+class CompactMinuteForecast(Weather):
+
+    __slots__ = fields = MINUTE_FORECAST_FIELDS
+    sources = MINUTE_FORECAST_SOURCES
+    derived = ()
+    __init__ = MinuteForecast.__init__
+
+
+class CompactNextHourForecast(Weather):
+
+    __slots__ = fields = NEXT_HOUR_FORECAST_FIELDS
+    __init__ = NextHourForecast.__init__
+    minute_class = CompactMinuteForecast
+
+
+@with_derived_fields
+class CompactHourlyForecast(Weather):
+
+    __slots__ = stored_fields(HOURLY_FORECAST_FIELDS, HOURLY_FORECAST_DERIVED)
+    fields = HOURLY_FORECAST_FIELDS
+    sources = HOURLY_FORECAST_SOURCES
+    derived = HOURLY_FORECAST_DERIVED
+    __init__ = HourlyForecast.__init__
+
+
+@with_derived_fields
+class CompactDailyForecast(Weather):
+
+    __slots__ = stored_fields(DAILY_FORECAST_FIELDS, DAILY_FORECAST_DERIVED)
+    fields = DAILY_FORECAST_FIELDS
+    sources = DAILY_FORECAST_SOURCES
+    derived = DAILY_FORECAST_DERIVED
+    __init__ = DailyForecast.__init__
+
+
+def unit_fields(model_class, units):
+    """ Returns the fields of a model to keep for a unit system: 'metric', 'imperial' or None for both """
+    if units is None:
+        return model_class.fields
+
+    imperial = {name: source for name, source, method_name in model_class.derived if method_name in IMPERIAL_CONVERSIONS}
+    if units == 'metric':
+        dropped = set(imperial)
+    elif units == 'imperial':
+        dropped = set(imperial.values())
+    else:
+        raise ValueError(f'Unknown unit system: {units}')
+
+    return tuple(name for name in model_class.fields if name not in dropped)
+
+
+_projections = {}
+
+
+def _projected_instance(model_class, names, units):
+    """ Creates an empty instance of a projected class when unpickling """
+    projected = project(model_class, names, units)
+    return projected.__new__(projected)
+
+
+def _instance_state(instance):
+    """ Returns an instance's attributes as pickle expects them: its __dict__, or (None, slot values) """
+    slots = {
+        name: getattr(instance, name)
+        for cls in type(instance).__mro__ for name in getattr(cls, '__slots__', ())
+        if hasattr(instance, name)
+    }
+    if not slots:
+        return instance.__dict__
+    return getattr(instance, '__dict__', None), slots
+
+
+def project(model_class, names=None, units=None):
+    """ Returns a subclass of a forecast model that only builds the given fields
+
+    The subclass only reads the stored attributes that the names need (a
+    derived name needs its source), and its `fields`, which serializers use
+    as the schema, are just the names left after dropping the other unit
+    system's fields. Attributes that were not built raise AttributeError.
+    """
+    if names is None and units is None:
+        return model_class
+
+    key = (model_class, None if names is None else tuple(names), units)
+    if key in _projections:
+        return _projections[key]
+
+    if not hasattr(model_class, 'sources'):
+        raise ValueError(f'{model_class.__name__} does not support field projection')
+
+    names = model_class.fields if names is None else tuple(names)
+    unknown = [name for name in names if name not in model_class.fields]
+    if unknown:
+        raise ValueError(f'Unknown {model_class.__name__} fields: {", ".join(unknown)}')
+
+    kept = unit_fields(model_class, units)
+    names = tuple(name for name in names if name in kept)
+
+    derived = {name: source for name, source, _ in model_class.derived}
+    needed = {derived.get(name, name) for name in names}
+    sources = [source for source in model_class.sources if source[0] in needed]
+
+    def __init__(self, data, timezone):
+        timezone = localizer(timezone)
+        for name, path, kind in sources:
+            value = lookup(data, path)
+            if kind == TIME:
+                value = timezone.localize(value)
+            elif kind == END_TIME:
+                value = timezone.localize(value, hours=1)
+            setattr(self, name, value)
+
+    # Projected classes can't be imported by name, so instances are pickled as the projection that rebuilds them
+    def __reduce__(self):
+        return _projected_instance, key, _instance_state(self)
+
+    projected = type(model_class.__name__, (model_class,), {
+        '__slots__': (),
+        '__init__': __init__,
+        '__reduce__': __reduce__,
+        'fields': names,
+        # The project() arguments that rebuild the class; see class_reference
+        '_projection': key,
+    })
+    _projections[key] = projected
+    return projected
+
+
+def class_reference(model_class):
+    """ Returns something picklable that resolve_class turns back into the class
+
+    That is the class itself, or for a projected class the project() arguments.
+    """
+    return vars(model_class).get('_projection', model_class)
+
+
+def resolve_class(reference):
+    if isinstance(reference, tuple):
+        return project(*reference)
+    return reference
+
+
+def model_classes(compact=False, fields=None, units=None):
+    """ Returns the model class to build for each WeatherKitResponse section
+
+    fields maps section names to the attribute names to build, as in
+    serializers.to_dict; sections it leaves out are built in full. units
+    ('metric' or 'imperial') drops the other system's fields from every
+    section that has them.
+    """
+    if compact:
+        classes = {
+            'current_weather': CurrentConditions,
+            'forecast_next_hour': CompactNextHourForecast,
+            'forecast_hourly': CompactHourlyForecast,
+            'forecast_daily': CompactDailyForecast,
+        }
+    else:
+        classes = {
+            'current_weather': CurrentConditions,
+            'forecast_next_hour': NextHourForecast,
+            'forecast_hourly': HourlyForecast,
+            'forecast_daily': DailyForecast,
+        }
+
+    fields = fields or {}
+    unknown = [section for section in fields if section not in classes]
+    if unknown:
+        raise ValueError(f'Unknown sections: {", ".join(unknown)}')
+
+    for section, model_class in classes.items():
+        if section in fields:
+            classes[section] = project(model_class, fields[section], units)
+        elif units is not None and hasattr(model_class, 'sources'):
+            classes[section] = project(model_class, None, units)
+
+    return classes
+
+
+# Maps each WeatherKit dataset name to its WeatherKitResponse attribute
+DATASET_ATTRIBUTES = {
+    'currentWeather': 'current_weather',
+    'forecastNextHour': 'forecast_next_hour',
+    'forecastHourly': 'forecast_hourly',
+    'forecastDaily': 'forecast_daily',
+}
 
 
 class WeatherKitResponse():
 
+    fields = ('current_weather', 'forecast_next_hour', 'forecast_hourly', 'forecast_daily', 'expire_times')
+
     def __init__(self):
         self.current_weather = None
         self.forecast_next_hour = None
         self.forecast_hourly = None
         self.forecast_daily = None
+        self.expire_times = {}
+        # Where the forecast is for, set by the client; not part of the serialized fields
+        self.latitude = None
+        self.longitude = None
+        self.distance_km = None
+
+    def as_json(self, fields=None):
+        """ Returns the response as plain JSON; see serializers.to_dict for the fields argument """
+        return dumps(self, fields)
+
+
+def dataset_expire_times(data):
+    """ Returns the metadata.expireTime of each dataset in a decoded payload """
+    expire_times = {}
+
+    for name, section in data.items():
+        if isinstance(section, dict) and section.get('metadata', {}).get('expireTime'):
+            expire_times[name] = section['metadata']['expireTime']
+
+    return expire_times
+
+
+class LazySequence(collections.abc.Sequence):
+    """ A read-only list that builds each item the first time it is accessed """
+
+    def __init__(self, items, build):
+        self._items = items
+        self._build = build
+        self._built = [None] * len(items)
 
-    def as_json(self):
-        return jsonpickle.encode(self)
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        item = self._built[index]
+        if item is None:
+            item = self._build(self._items[index])
+            self._built[index] = item
+        return item
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+LAZY_CLASS_ATTRIBUTES = ('_next_hour_class', '_hourly_class', '_daily_class', '_current_class')
+
+
+class LazyWeatherKitResponse(WeatherKitResponse):
+    """ A WeatherKitResponse that keeps the decoded payload and builds each dataset on first access """
+
+    def __init__(self, data, timezone, next_hour_class=NextHourForecast, hourly_class=HourlyForecast, daily_class=DailyForecast,
+                 current_class=CurrentConditions):
+        self._data = data
+        self._timezone = timezone
+        self._next_hour_class = next_hour_class
+        self._hourly_class = hourly_class
+        self._daily_class = daily_class
+        self._current_class = current_class
+        self._sections = {}
+        self.expire_times = dataset_expire_times(data)
+        self.latitude = None
+        self.longitude = None
+        self.distance_km = None
+
+    def _section(self, name):
+        if name not in self._sections:
+            self._sections[name] = self._build_section(name)
+        return self._sections[name]
+
+    def _build_section(self, name):
+        if name not in self._data:
+            return None
+
+        raw = self._data.get(name, {})
+
+        if name == 'currentWeather':
+            return self._current_class(raw, self._timezone)
+        if name == 'forecastNextHour':
+            return self._next_hour_class(raw, self._timezone)
+        if name == 'forecastHourly':
+            return LazySequence(raw.get('hours', []), self._build_hour)
+        if name == 'forecastDaily':
+            return LazySequence(raw.get('days', []), self._build_day)
+
+    # Bound methods rather than lambdas keep the sequences, and so the response, picklable
+    def _build_hour(self, data):
+        return self._hourly_class(data, self._timezone)
+
+    def _build_day(self, data):
+        return self._daily_class(data, self._timezone)
+
+    def __getstate__(self):
+        # Projected classes can't be pickled by name, so they are pickled as the projection that rebuilds them
+        state = dict(self.__dict__)
+        for name in LAZY_CLASS_ATTRIBUTES:
+            state[name] = class_reference(state[name])
+        return state
+
+    def __setstate__(self, state):
+        for name in LAZY_CLASS_ATTRIBUTES:
+            state[name] = resolve_class(state[name])
+        self.__dict__.update(state)
+
+    @property
+    def current_weather(self):
+        return self._section('currentWeather')
+
+    @current_weather.setter
+    def current_weather(self, value):
+        self._sections['currentWeather'] = value
+
+    @property
+    def forecast_next_hour(self):
+        return self._section('forecastNextHour')
+
+    @forecast_next_hour.setter
+    def forecast_next_hour(self, value):
+        self._sections['forecastNextHour'] = value
+
+    @property
+    def forecast_hourly(self):
+        return self._section('forecastHourly')
+
+    @forecast_hourly.setter
+    def forecast_hourly(self, value):
+        self._sections['forecastHourly'] = value
+
+    @property
+    def forecast_daily(self):
+        return self._section('forecastDaily')
+
+    @forecast_daily.setter
+    def forecast_daily(self, value):
+        self._sections['forecastDaily'] = value
+
+    def materialize(self):
+        """ Builds every dataset and returns them as a regular WeatherKitResponse """
+        response = WeatherKitResponse()
+        response.current_weather = self.current_weather
+        response.forecast_next_hour = self.forecast_next_hour
+        response.forecast_hourly = None if self.forecast_hourly is None else list(self.forecast_hourly)
+        response.forecast_daily = None if self.forecast_daily is None else list(self.forecast_daily)
+        response.expire_times = self.expire_times
+        response.latitude = self.latitude
+        response.longitude = self.longitude
+        response.distance_km = self.distance_km
+        return response
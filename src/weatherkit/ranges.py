@@ -0,0 +1,122 @@
+import datetime
+
+from .models import WeatherKitResponse
+from .timestamps import localizer
+
+
+UTC = datetime.timezone.utc
+
+# fetch() arguments and the WeatherKit query parameters they set
+RANGE_PARAMS = (
+    ('hourly_start', 'hourlyStart'),
+    ('hourly_end', 'hourlyEnd'),
+    ('daily_start', 'dailyStart'),
+    ('daily_end', 'dailyEnd'),
+)
+
+# The datasets that can be fetched for a time range, and their model lists
+RANGE_DATASETS = {
+    'forecastHourly': 'forecast_hourly',
+    'forecastDaily': 'forecast_daily',
+}
+
+DEFAULT_CHUNK = datetime.timedelta(days=7)
+
+
+def to_utc(value):
+    """ Returns a datetime or timestamp string as an aware UTC datetime; naive datetimes are taken as UTC """
+    if isinstance(value, str):
+        return localizer('UTC').parse(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def api_timestamp(value):
+    """ Formats a datetime or timestamp string the way the API expects, e.g. 2022-11-18T16:00:00Z """
+    return to_utc(value).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def time_window(hourly_start=None, hourly_end=None, daily_start=None, daily_end=None):
+    """ Returns the query parameters for a time range as a tuple of (name, value) pairs """
+    values = (hourly_start, hourly_end, daily_start, daily_end)
+    return tuple(
+        (param, api_timestamp(value))
+        for (_, param), value in zip(RANGE_PARAMS, values)
+        if value is not None
+    )
+
+
+def split_range(start, end, chunk=DEFAULT_CHUNK):
+    """ Returns consecutive (start, end) UTC datetimes covering start to end, each at most chunk long """
+    start, end = to_utc(start), to_utc(end)
+    if end <= start:
+        raise ValueError('end must be after start')
+    if chunk <= datetime.timedelta(0):
+        raise ValueError('chunk must be positive')
+
+    windows = []
+    while start < end:
+        windows.append((start, min(start + chunk, end)))
+        start += chunk
+    return windows
+
+
+def range_windows(forecast_datasets, start, end, chunk=DEFAULT_CHUNK):
+    """ Returns the fetch() range arguments for each chunk of a time range """
+    unsupported = [name for name in forecast_datasets if name not in RANGE_DATASETS]
+    if unsupported:
+        raise ValueError(f'Only forecastHourly and forecastDaily can be fetched for a range, not {", ".join(unsupported)}')
+
+    windows = []
+    for chunk_start, chunk_end in split_range(start, end, chunk):
+        window = {}
+        if 'forecastHourly' in forecast_datasets:
+            window.update(hourly_start=chunk_start, hourly_end=chunk_end)
+        if 'forecastDaily' in forecast_datasets:
+            window.update(daily_start=chunk_start, daily_end=chunk_end)
+        windows.append(window)
+    return windows
+
+
+def check_range_models(models, forecast_datasets):
+    """ Stitching matches items on start_datetime, so projected models have to keep it """
+    for name in forecast_datasets:
+        if 'start_datetime' not in models[RANGE_DATASETS[name]].fields:
+            raise ValueError(f'{RANGE_DATASETS[name]} needs the start_datetime field to be fetched for a range')
+
+
+def _instant(item):
+    return datetime.datetime.fromisoformat(item.start_datetime)
+
+
+def stitch(responses, forecast_datasets):
+    """ Combines the responses for consecutive chunks into one
+
+    The hourly and daily forecasts are ordered by start time, keeping the
+    first of any items that start at the same instant. Each dataset's expire
+    time is the earliest across the chunks, and the location is the first
+    response's.
+    """
+    combined = WeatherKitResponse()
+
+    for name, attribute in RANGE_DATASETS.items():
+        if name not in forecast_datasets:
+            continue
+
+        items = {}
+        for response in responses:
+            for item in getattr(response, attribute) or []:
+                items.setdefault(_instant(item), item)
+        setattr(combined, attribute, [items[instant] for instant in sorted(items)])
+
+        expire_times = [response.expire_times[name] for response in responses if name in response.expire_times]
+        if expire_times:
+            combined.expire_times[name] = min(expire_times, key=lambda value: to_utc(value))
+
+    if responses:
+        combined.latitude = responses[0].latitude
+        combined.longitude = responses[0].longitude
+        combined.distance_km = responses[0].distance_km
+
+    return combined
@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import email.utils
+import random
+import threading
+import time
+
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket():
+    """ Limits calls to rate per second on average, letting up to burst through at once
+
+    Tokens are reserved under a lock and waited for outside it, so one bucket
+    can be shared by threads (acquire) and asyncio tasks (acquire_async).
+    Callers that find the bucket empty are given the next free slots in
+    order. hold() pauses every caller, e.g. until a Retry-After time. The
+    bucket counts its acquisitions and how long callers waited in total.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        # Tokens as of _updated, which hold() can move into the future
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._held_until = 0.0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self):
+        """ Takes a token and returns the seconds to wait before using it """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            self.acquired += 1
+            return self._updated - now + max(0.0, -self._tokens) / self.rate
+
+    def hold(self, seconds):
+        """ Makes every caller wait at least this long, including those already waiting """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            until = now + seconds
+            self._held_until = max(self._held_until, until)
+            if until > self._updated:
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = until
+
+    def _finish(self, waited):
+        if waited:
+            with self._lock:
+                self.throttled += 1
+                self.waited += waited
+
+    def acquire(self):
+        """ Blocks until a token is free and returns the seconds waited """
+        waited = 0.0
+        delay = self.reserve()
+        while delay > 0:
+            time.sleep(delay)
+            waited += delay
+            # Wait out a hold() that started while this caller was sleeping
+            delay = self._held_until - time.monotonic()
+        self._finish(waited)
+        return waited
+
+    async def acquire_async(self):
+        """ Waits on the event loop until a token is free and returns the seconds waited """
+        waited = 0.0
+        delay = self.reserve()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = self._held_until - time.monotonic()
+        self._finish(waited)
+        return waited
+
+
+def retry_after_seconds(value):
+    """ Returns the seconds a Retry-After header asks for, or None if it is missing or invalid """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy():
+    """ Retries rate-limited and failed requests with jittered exponential backoff
+
+    Attempt n waits a random time between 0 and backoff * 2 ** n seconds,
+    capped at max_backoff, unless the response has a Retry-After header,
+    which is honoured up to max_retry_after seconds.
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30.0, statuses=RETRY_STATUSES, max_retry_after=120.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, status, attempt):
+        return attempt < self.retries and status in self.statuses
+
+    def delay(self, attempt, retry_after=None):
+        """ Returns the seconds to wait before retry number attempt (counting from 0) """
+        seconds = retry_after_seconds(retry_after)
+        if seconds is not None:
+            return min(seconds, self.max_retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
@@ -0,0 +1,125 @@
+import collections.abc
+import json
+
+
+SCALAR_TYPES = (str, int, float, bool)
+
+
+def _plain(value, names=None):
+    """ Converts a model (anything with a `fields` schema), list or dict to plain Python values """
+    if value is None or isinstance(value, SCALAR_TYPES):
+        return value
+
+    schema = getattr(type(value), 'fields', None)
+    if schema is not None:
+        item = {}
+        for name in names or schema:
+            field_value = getattr(value, name)
+            if field_value is not None and not isinstance(field_value, SCALAR_TYPES):
+                field_value = _plain(field_value)
+            item[name] = field_value
+        return item
+
+    if isinstance(value, collections.abc.Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+
+    if isinstance(value, collections.abc.Sequence):
+        return [_plain(item, names) for item in value]
+
+    return value
+
+
+def _sections(response, fields):
+    """ Yields (attribute, field names or None) for each response section to serialize """
+    for section in type(response).fields:
+        if fields is None:
+            yield section, None
+        elif section in fields:
+            yield section, fields[section]
+
+
+def to_dict(response, fields=None):
+    """ Converts a WeatherKitResponse to plain dicts and lists
+
+    By default every section and attribute is included. fields limits the
+    output to the sections it names, mapping each to the attribute names to
+    keep for its objects (or None for all of them), for example:
+
+        {'current_weather': None, 'forecast_hourly': ['start_datetime', 'temperature_c']}
+    """
+    return {section: _plain(getattr(response, section), names) for section, names in _sections(response, fields)}
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as error:
+        raise ImportError('The msgpack format requires msgpack (pip install msgpack)') from error
+    return msgpack
+
+
+def dumps(response, fields=None, format='json'):
+    """ Serializes a WeatherKitResponse to a JSON string or, with format='msgpack', to bytes """
+    data = to_dict(response, fields)
+
+    if format == 'json':
+        return json.dumps(data)
+    if format == 'msgpack':
+        return _msgpack().packb(data)
+
+    raise ValueError(f'Unknown format: {format}')
+
+
+def dump(response, fp, fields=None, format='json'):
+    """ Writes a WeatherKitResponse to a file object one forecast at a time
+
+    JSON is written to text files and msgpack to binary files; for a socket,
+    use socket.makefile() with the matching mode.
+    """
+    if format == 'json':
+        _dump_json(response, fp, fields)
+    elif format == 'msgpack':
+        _dump_msgpack(response, fp, fields)
+    else:
+        raise ValueError(f'Unknown format: {format}')
+
+
+def _is_list(value):
+    return isinstance(value, collections.abc.Sequence) and not isinstance(value, str)
+
+
+def _dump_json(response, fp, fields):
+    fp.write('{')
+
+    for index, (section, names) in enumerate(_sections(response, fields)):
+        value = getattr(response, section)
+        fp.write(', ' if index else '')
+        fp.write(json.dumps(section) + ': ')
+
+        if _is_list(value):
+            fp.write('[')
+            for item_index, item in enumerate(value):
+                fp.write(', ' if item_index else '')
+                fp.write(json.dumps(_plain(item, names)))
+            fp.write(']')
+        else:
+            fp.write(json.dumps(_plain(value, names)))
+
+    fp.write('}')
+
+
+def _dump_msgpack(response, fp, fields):
+    packer = _msgpack().Packer()
+    sections = list(_sections(response, fields))
+    fp.write(packer.pack_map_header(len(sections)))
+
+    for section, names in sections:
+        value = getattr(response, section)
+        fp.write(packer.pack(section))
+
+        if _is_list(value):
+            fp.write(packer.pack_array_header(len(value)))
+            for item in value:
+                fp.write(packer.pack(_plain(item, names)))
+        else:
+            fp.write(packer.pack(_plain(value, names)))
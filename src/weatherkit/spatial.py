@@ -0,0 +1,221 @@
+import collections
+import math
+import threading
+import time
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """ Returns the great-circle distance between two points in kilometres """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(longitude2 - longitude1) / 2
+
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _km_per_longitude_degree(latitude):
+    # Never quite zero, so searches near the poles stay bounded
+    return max(KM_PER_DEGREE * math.cos(math.radians(latitude)), 1e-6)
+
+
+class GridSnapping():
+    """ Snaps coordinates to the nearest point of a grid spaced `degrees` apart
+
+    0.01 degrees is roughly a 1.1 km cell at the equator.
+    """
+
+    def __init__(self, degrees=0.01):
+        if degrees <= 0:
+            raise ValueError('degrees must be positive')
+        self.degrees = degrees
+
+    def snap(self, latitude, longitude):
+        # Rounding again drops float noise such as 39.590000000000003 from the URL
+        return (
+            round(round(latitude / self.degrees) * self.degrees, 6),
+            round(round(longitude / self.degrees) * self.degrees, 6),
+        )
+
+    def max_error_km(self, latitude):
+        """ Returns the furthest a point near this latitude can be moved by snapping """
+        half = self.degrees / 2
+        return max(haversine_km(latitude, 0, latitude + half, half), haversine_km(latitude, 0, latitude - half, half))
+
+
+def geohash_encode(latitude, longitude, precision):
+    """ Returns the geohash of a point with precision characters """
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    characters = []
+    bit_count = 0
+    value = 0
+    use_longitude = True
+
+    while len(characters) < precision:
+        interval = bounds[1] if use_longitude else bounds[0]
+        coordinate = longitude if use_longitude else latitude
+        middle = (interval[0] + interval[1]) / 2
+
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+
+        use_longitude = not use_longitude
+        bit_count += 1
+        if bit_count == 5:
+            characters.append(GEOHASH_ALPHABET[value])
+            bit_count = 0
+            value = 0
+
+    return ''.join(characters)
+
+
+def geohash_bounds(geohash):
+    """ Returns ((south, north), (west, east)) for a geohash cell """
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    use_longitude = True
+
+    for character in geohash:
+        value = GEOHASH_ALPHABET.index(character)
+        for shift in range(4, -1, -1):
+            interval = bounds[1] if use_longitude else bounds[0]
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            use_longitude = not use_longitude
+
+    return tuple(bounds[0]), tuple(bounds[1])
+
+
+class GeohashSnapping():
+    """ Snaps coordinates to the centre of their geohash cell
+
+    Precision 6 cells are about 1.2 km x 0.6 km and precision 5 cells about
+    4.9 km x 4.9 km.
+    """
+
+    def __init__(self, precision=6):
+        if not 1 <= precision <= 12:
+            raise ValueError('precision must be between 1 and 12')
+        self.precision = precision
+
+    def snap(self, latitude, longitude):
+        (south, north), (west, east) = geohash_bounds(geohash_encode(latitude, longitude, self.precision))
+        return round((south + north) / 2, 6), round((west + east) / 2, 6)
+
+    def max_error_km(self, latitude):
+        """ Returns the furthest a point near this latitude can be moved by snapping """
+        (south, north), (west, east) = geohash_bounds(geohash_encode(latitude, 0, self.precision))
+        centre = (south + north) / 2, (west + east) / 2
+        return max(haversine_km(south, west, *centre), haversine_km(north, west, *centre))
+
+
+class SpatialIndex():
+    """ An in-memory index of decoded payloads by location, answering "nearest unexpired within radius_km"
+
+    Entries are grouped by an opaque key (the client uses the datasets,
+    country code and timezone) so only interchangeable payloads are matched.
+    They are bucketed into cells about radius_km across, so a lookup only
+    scans the cells around the point; matches do not cross the antimeridian.
+    At most maxsize entries are kept and the oldest are dropped first.
+    """
+
+    def __init__(self, radius_km=1.0, maxsize=10000):
+        if radius_km <= 0:
+            raise ValueError('radius_km must be positive')
+        self.radius_km = radius_km
+        self.maxsize = maxsize
+        self.cell_degrees = radius_km / KM_PER_DEGREE
+        self.hits = 0
+        self.misses = 0
+        self._cells = collections.defaultdict(dict)
+        self._order = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._order)
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def add(self, group, latitude, longitude, data, expire_at):
+        """ Indexes a payload fetched for (latitude, longitude) until expire_at, a UNIX timestamp """
+        if expire_at is None or expire_at <= time.time():
+            return
+
+        cell = (group,) + self._cell(latitude, longitude)
+        point = (latitude, longitude)
+
+        with self._lock:
+            self._cells[cell][point] = (data, expire_at)
+            self._order[cell, point] = None
+            self._order.move_to_end((cell, point))
+
+            while len(self._order) > self.maxsize:
+                self._remove(*self._order.popitem(last=False)[0])
+
+    def _remove(self, cell, point):
+        entries = self._cells.get(cell)
+        if entries is None:
+            return
+        entries.pop(point, None)
+        if not entries:
+            del self._cells[cell]
+
+    def nearest(self, group, latitude, longitude, radius_km=None):
+        """ Returns (data, (latitude, longitude), distance_km) for the nearest unexpired entry, or None """
+        radius_km = self.radius_km if radius_km is None else radius_km
+        now = time.time()
+
+        row, column = self._cell(latitude, longitude)
+        rows = math.ceil(radius_km / KM_PER_DEGREE / self.cell_degrees)
+        # Longitude degrees shrink towards the poles, so check the widest row of the search box
+        widest = min(abs(latitude) + radius_km / KM_PER_DEGREE, 90.0)
+        columns = min(math.ceil(radius_km / _km_per_longitude_degree(widest) / self.cell_degrees), int(360 / self.cell_degrees))
+
+        best = None
+        expired = []
+
+        with self._lock:
+            for cell_row in range(row - rows, row + rows + 1):
+                for cell_column in range(column - columns, column + columns + 1):
+                    cell = (group, cell_row, cell_column)
+                    for point, (data, expire_at) in self._cells.get(cell, {}).items():
+                        if expire_at <= now:
+                            expired.append((cell, point))
+                            continue
+                        distance = haversine_km(latitude, longitude, *point)
+                        if distance <= radius_km and (best is None or distance < best[2]):
+                            best = (data, point, distance)
+
+            for cell, point in expired:
+                self._remove(cell, point)
+                self._order.pop((cell, point), None)
+
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return best
+
+    def purge(self):
+        """ Drops every expired entry """
+        now = time.time()
+        with self._lock:
+            for cell, point in list(self._order):
+                if self._cells[cell][point][1] <= now:
+                    self._remove(cell, point)
+                    del self._order[cell, point]
@@ -0,0 +1,133 @@
+import codecs
+import json
+
+# Arrays whose elements are yielded one at a time instead of decoded whole
+STREAMED_ARRAYS = {
+    'forecastHourly': 'hours',
+    'forecastDaily': 'days',
+    'forecastNextHour': 'minutes',
+}
+
+
+class _Reader():
+    """ A JSON text buffer that is filled from an iterator of byte chunks on demand """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._exhausted = False
+        self.buffer = ''
+        self.pos = 0
+
+    def _fill(self):
+        """ Appends the next chunk to the buffer, returning False once the input is exhausted """
+        while not self._exhausted:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._exhausted = True
+                text = self._decoder.decode(b'', final=True)
+            else:
+                text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+            if text:
+                # Drop what has already been consumed so the buffer stays small
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+
+        return False
+
+    def peek(self):
+        """ Returns the next non-whitespace character without consuming it, or '' at the end """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f'Expected one of {characters!r} at offset {self.pos}, found {character!r}')
+        self.pos += 1
+        return character
+
+    def value(self):
+        """ Decodes the next complete JSON value """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A number cut off by the end of a chunk ("1" of "1.25") decodes fine, so
+            # only accept a value once the character after it has arrived
+            if (end == len(self.buffer) or self.buffer[end] not in ',:]} \t\n\r') and self._fill():
+                continue
+
+            self.pos = end
+            return value
+
+
+def _members(reader):
+    """ Yields the keys of the object at the reader's position, leaving each value unread """
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        yield key
+        if reader.expect(',}') == '}':
+            return
+
+
+def _elements(reader):
+    """ Yields each element of the array at the reader's position """
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_events(chunks):
+    """ Incrementally decodes a WeatherKit payload from an iterator of byte chunks
+
+    Yields ('field', dataset, key, value) for the top-level fields of each
+    dataset, ('item', dataset, key, value) for each element of the hourly,
+    daily and minute arrays as soon as it is complete, and ('end', dataset,
+    None, None) once a dataset closes.
+    """
+    reader = _Reader(chunks)
+
+    for dataset in _members(reader):
+        if reader.peek() != '{':
+            yield 'field', dataset, None, reader.value()
+            continue
+
+        streamed_key = STREAMED_ARRAYS.get(dataset)
+        for key in _members(reader):
+            if key == streamed_key and reader.peek() == '[':
+                for item in _elements(reader):
+                    yield 'item', dataset, key, item
+            else:
+                yield 'field', dataset, key, reader.value()
+
+        yield 'end', dataset, None, None
+
+    if reader.peek():
+        raise ValueError(f'Unexpected data after the payload at offset {reader.pos}')
@@ -1,14 +1,141 @@
+import asyncio
+import datetime
+import io
 import os
 import json
 import pathlib
+import pickle
+import subprocess
 import unittest
 import sys
+import tempfile
+import threading
+import time
+from unittest import mock
 
-from models import CurrentConditions
-from models import DailyForecast
-from models import HourlyForecast
-from models import NextHourForecast
-from models import Weather
+import arrow
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# The modules use package-relative imports, so load them through the package
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from weatherkit.aio import AsyncWeatherKit
+from weatherkit.archive import ForecastArchive
+from weatherkit.auth import TokenManager
+from weatherkit.batch import parse_columnar
+from weatherkit.batch import parse_rows
+from weatherkit.batch import row_fields
+from weatherkit.bulk import Checkpoint
+from weatherkit.bulk import read_locations
+from weatherkit.bulk import run
+from weatherkit.cache import MemoryCache
+from weatherkit.cache import SQLiteCache
+from weatherkit.coalesce import SingleFlight
+from weatherkit.diff import ChangeTracker
+from weatherkit.diff import apply
+from weatherkit.diff import diff
+from weatherkit.instrumentation import Histogram
+from weatherkit.instrumentation import HistogramInstrumentation
+from weatherkit.mockserver import MockWeatherKitServer
+from weatherkit.models import CurrentConditions
+from weatherkit.models import DailyForecast
+from weatherkit.models import HourlyForecast
+from weatherkit.models import NextHourForecast
+from weatherkit.models import Weather
+from weatherkit.models import project
+from weatherkit.ratelimit import RetryPolicy
+from weatherkit.ratelimit import TokenBucket
+from weatherkit.ratelimit import retry_after_seconds
+from weatherkit.serializers import to_dict
+from weatherkit.spatial import GeohashSnapping
+from weatherkit.spatial import GridSnapping
+from weatherkit.spatial import SpatialIndex
+from weatherkit.spatial import geohash_encode
+from weatherkit.spatial import haversine_km
+from weatherkit.timestamps import Localizer
+from weatherkit.weatherkit import WeatherKit
+from weatherkit.weatherkit import WeatherKitError
+
+
+def make_private_key():
+    key = ec.generate_private_key(ec.SECP256R1())
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def sample_payload(expires_in=None):
+    """ Loads the sample data, optionally moving each dataset's expireTime to a number of seconds from now """
+    payload = json.loads(pathlib.Path('data/sample_data.json').read_text())
+    if expires_in is not None:
+        if not isinstance(expires_in, dict):
+            expires_in = {name: expires_in for name in payload}
+        for name, seconds in expires_in.items():
+            expire_time = arrow.utcnow().shift(seconds=seconds).format('YYYY-MM-DDTHH:mm:ss') + 'Z'
+            payload[name]['metadata']['expireTime'] = expire_time
+    return payload
+
+
+class StubResponse():
+
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {}
+
+    @property
+    def content(self):
+        return json.dumps(self.payload).encode()
+
+    def json(self):
+        return self.payload
+
+    def iter_content(self, chunk_size=1):
+        body = json.dumps(self.payload, indent=1).encode()
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class StubSession():
+    """ Stands in for requests.Session and serves the sample payload """
+
+    def __init__(self, payload=None):
+        if payload is None:
+            payload = sample_payload()
+        self.payload = payload
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return StubResponse(self.payload)
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_client(**kwargs):
+    kwargs.setdefault('session', StubSession())
+    return WeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', **kwargs)
 
 
 class TestUnitConversions(unittest.TestCase):
@@ -27,7 +154,7 @@ class TestUnitConversions(unittest.TestCase):
 class TextNextHourForecast(unittest.TestCase):
 
     def setUp(self):
-        api_data = json.loads(pathlib.Path('tests/sample_data.json').read_text())
+        api_data = json.loads(pathlib.Path('data/sample_data.json').read_text())
         raw_next_hour_forecast = api_data.get('forecastNextHour', {})
         next_hour_forecast = NextHourForecast(raw_next_hour_forecast, 'US/Mountain')
         self.next_hour_forecast = next_hour_forecast
@@ -45,7 +172,7 @@ class TextNextHourForecast(unittest.TestCase):
 class TestDailyForecasts(unittest.TestCase):
 
     def setUp(self):
-        api_data = json.loads(pathlib.Path('tests/sample_data.json').read_text())
+        api_data = json.loads(pathlib.Path('data/sample_data.json').read_text())
         raw_forecasts = api_data.get('forecastDaily', {}).get('days', [])
         daily_forecasts = [DailyForecast(d, 'US/Mountain') for d in raw_forecasts]
         self.forecast = daily_forecasts[0]
@@ -123,7 +250,7 @@ class TestDailyForecasts(unittest.TestCase):
 class TestHourlyForecasts(unittest.TestCase):
 
     def setUp(self):
-        api_data = json.loads(pathlib.Path('tests/sample_data.json').read_text())
+        api_data = json.loads(pathlib.Path('data/sample_data.json').read_text())
         raw_forecasts = api_data.get('forecastHourly', {}).get('hours', [])
         hourly_forecasts = [HourlyForecast(h, 'US/Mountain') for h in raw_forecasts]
         self.forecast = hourly_forecasts[0]
@@ -167,7 +294,7 @@ class TestHourlyForecasts(unittest.TestCase):
 class TestCurrentConditions(unittest.TestCase):
 
     def setUp(self):
-        api_data = json.loads(pathlib.Path('tests/sample_data.json').read_text())
+        api_data = json.loads(pathlib.Path('data/sample_data.json').read_text())
         raw_conditions_data = api_data.get('currentWeather')
         self.current_conditions = CurrentConditions(raw_conditions_data, 'US/Mountain')
 
@@ -199,5 +326,1065 @@ class TestCurrentConditions(unittest.TestCase):
         self.assertEqual(self.current_conditions.wind_speed_mph, 3.7718979999999998)
 
 
+class TestTokenManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = TokenManager('TEAM', 'com.example.weather', make_private_key(), 'KEY', lifetime=600, refresh_margin=60)
+
+    def test_token_is_reused(self):
+        self.assertEqual(self.manager.token, self.manager.token)
+
+    def test_background_refresh_before_expiry(self):
+        token = self.manager.token
+        expire_at = self.manager.expire_at
+
+        with mock.patch('weatherkit.auth.time.time', return_value=expire_at - 30):
+            # Still valid, so the old token is served while a new one is signed
+            self.assertEqual(self.manager.token, token)
+            for _ in range(100):
+                if self.manager.expire_at != expire_at: break
+                time.sleep(0.01)
+
+        self.assertEqual(self.manager.expire_at, expire_at - 30 + 600)
+        self.assertNotEqual(self.manager.token, token)
+
+    def test_expired_token_is_resigned(self):
+        token = self.manager.token
+        expire_at = self.manager.expire_at
+
+        with mock.patch('weatherkit.auth.time.time', return_value=expire_at + 1):
+            self.assertNotEqual(self.manager.token, token)
+            self.assertEqual(self.manager.expire_at, expire_at + 601)
+
+    def test_invalid_margin(self):
+        with self.assertRaises(ValueError):
+            TokenManager('TEAM', 'com.example.weather', make_private_key(), 'KEY', lifetime=60, refresh_margin=60)
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_import_loads_no_heavy_dependencies(self):
+        code = (
+            'import sys, weatherkit; '
+            'print(sorted(name for name in ("arrow", "asyncio", "cryptography", "jwt", "requests") if name in sys.modules))'
+        )
+        source = str(pathlib.Path(__file__).resolve().parents[2])
+        output = subprocess.run([sys.executable, '-c', code], cwd=source, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_default_session_is_pooled(self):
+        client = WeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', pool_maxsize=25)
+        adapter = client.session.get_adapter('https://weatherkit.apple.com')
+        self.assertEqual(adapter._pool_maxsize, 25)
+        self.assertIn('gzip', client.session.headers['Accept-Encoding'])
+        client.close()
+
+    def test_injected_session_and_timeouts(self):
+        client = make_client(connect_timeout=2, read_timeout=7)
+        response = client.fetch(['currentWeather'], 39.59, -104.726763, 'US', 'US/Mountain')
+        url, kwargs = client.session.calls[0]
+        self.assertEqual(url, 'https://weatherkit.apple.com/api/v1/weather/en/39.59/-104.726763')
+        self.assertEqual(kwargs['timeout'], (2, 7))
+        self.assertEqual(kwargs['params']['dataSets'], 'currentWeather')
+        self.assertEqual(response.current_weather.temperature_c, -9.57)
+
+
+class SlowStubSession(StubSession):
+    """ Records how many requests overlap """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return super().get(url, **kwargs)
+
+
+class TestAsyncWeatherKit(unittest.TestCase):
+
+    def setUp(self):
+        self.session = SlowStubSession()
+        self.client = AsyncWeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', session=self.session)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_fetch(self):
+        response = asyncio.run(self.client.fetch(['forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain'))
+        self.assertEqual(response.forecast_daily[0].start_datetime, '2022-11-18T00:00:00-07:00')
+
+    def test_fetch_many(self):
+        locations = [(39.0 + i / 100, -104.72, 'US', 'US/Mountain') for i in range(12)]
+
+        async def collect():
+            return [r async for r in self.client.fetch_many(locations, ['currentWeather'], concurrency=3)]
+
+        results = asyncio.run(collect())
+        self.assertEqual(sorted(location for location, _ in results), locations)
+        self.assertEqual(results[0][1].current_weather.temperature_c, -9.57)
+        self.assertLessEqual(self.session.max_active, 3)
+        self.assertGreater(self.session.max_active, 1)
+
+    def test_rate_limiter_waits_on_the_event_loop(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        client = AsyncWeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', session=StubSession(), rate_limiter=bucket)
+
+        async def fetch_all():
+            return await asyncio.gather(*[
+                client.fetch(['currentWeather'], 39.0 + i / 100, -104.72, 'US', 'US/Mountain') for i in range(3)
+            ])
+
+        with mock.patch.object(bucket, 'acquire', side_effect=AssertionError('blocked a worker thread')):
+            responses = asyncio.run(fetch_all())
+        client.close()
+        self.assertEqual(len(responses), 3)
+        self.assertEqual((bucket.acquired, bucket.throttled), (3, 2))
+
+    def test_cache_hits_take_no_token(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        session = StubSession(sample_payload(expires_in=300))
+        client = AsyncWeatherKit(
+            'TEAM', 'com.example.weather', make_private_key(), 'KEY', session=session, rate_limiter=bucket, cache=MemoryCache(),
+        )
+
+        async def fetch_all():
+            return [await client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain') for _ in range(4)]
+
+        started = time.monotonic()
+        responses = asyncio.run(fetch_all())
+        client.close()
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(responses[-1].current_weather.temperature_c, -9.57)
+        self.assertEqual((len(session.calls), bucket.acquired), (1, 1))
+        self.assertEqual(client.cache.stats()['hits'], 3)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_memory_cache_hits(self):
+        client = make_client(session=StubSession(sample_payload(expires_in=300)), cache=MemoryCache())
+        client.fetch(['currentWeather', 'forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')
+        response = client.fetch(['forecastDaily', 'currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+
+        self.assertEqual(len(client.session.calls), 1)
+        self.assertEqual(response.current_weather.temperature_c, -9.57)
+        self.assertEqual(client.cache.stats()['hits'], 1)
+        self.assertEqual(client.cache.stats()['misses'], 1)
+
+    def test_expired_payloads_are_not_cached(self):
+        client = make_client(cache=MemoryCache())
+        client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+        client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+        self.assertEqual(len(client.session.calls), 2)
+        self.assertEqual(client.cache.stats()['size'], 0)
+
+    def test_earliest_expire_time_wins(self):
+        cache = MemoryCache()
+        expires_in = {'currentWeather': 5, 'forecastDaily': 300, 'forecastHourly': 300, 'forecastNextHour': 300}
+        client = make_client(session=StubSession(sample_payload(expires_in)), cache=cache)
+        client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+
+        with mock.patch('weatherkit.cache.time.time', return_value=time.time() + 10):
+            client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+
+        self.assertEqual(len(client.session.calls), 2)
+        self.assertEqual(cache.expirations, 1)
+
+    def test_lru_eviction(self):
+        cache = MemoryCache(maxsize=2)
+        for key in ['a', 'b', 'a', 'c']:
+            if cache.get(key) is None:
+                cache.set(key, {'key': key}, time.time() + 60)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {'key': 'a'})
+        self.assertEqual(cache.evictions, 1)
+
+    def test_sqlite_cache_survives_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            cache = SQLiteCache(path)
+            cache.set('key', {'value': 1}, time.time() + 60)
+            cache.close()
+
+            cache = SQLiteCache(path)
+            self.assertEqual(cache.get('key'), {'value': 1})
+            self.assertEqual(cache.stats()['size'], 1)
+            cache.close()
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.datasets = ['currentWeather', 'forecastDaily', 'forecastHourly']
+        expires_in = {'currentWeather': -60, 'forecastDaily': 3600, 'forecastHourly': 3600, 'forecastNextHour': 3600}
+        self.client = make_client(session=StubSession(sample_payload(expires_in)))
+        self.previous = self.client.fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+    def test_only_expired_datasets_are_requested(self):
+        response = self.client.refresh(self.previous, self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+        url, kwargs = self.client.session.calls[-1]
+        self.assertEqual(kwargs['params']['dataSets'], 'currentWeather')
+        self.assertIsNot(response, self.previous)
+        self.assertIsNot(response.current_weather, self.previous.current_weather)
+        self.assertIs(response.forecast_daily, self.previous.forecast_daily)
+        self.assertIs(response.forecast_hourly, self.previous.forecast_hourly)
+        self.assertIsNone(response.forecast_next_hour)
+
+    def test_nothing_expired(self):
+        response = self.client.refresh(self.previous, ['forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')
+        self.assertIs(response, self.previous)
+        self.assertEqual(len(self.client.session.calls), 1)
+
+    def test_async_refresh(self):
+        session = StubSession(self.client.session.payload)
+        client = AsyncWeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', session=session)
+        response = asyncio.run(client.refresh(self.previous, self.datasets, 39.59, -104.72, 'US', 'US/Mountain'))
+        client.close()
+
+        self.assertEqual(session.calls[-1][1]['params']['dataSets'], 'currentWeather')
+        self.assertEqual(response.current_weather.temperature_c, -9.57)
+        self.assertIs(response.forecast_daily, self.previous.forecast_daily)
+
+
+class TestCompactModels(unittest.TestCase):
+
+    def test_compact_models_match(self):
+        datasets = ['forecastHourly', 'forecastDaily', 'forecastNextHour']
+        regular = make_client().fetch(datasets, 39.59, -104.72, 'US', 'US/Mountain')
+        compact = make_client(compact_models=True).fetch(datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+        pairs = [
+            (regular.forecast_hourly[0], compact.forecast_hourly[0]),
+            (regular.forecast_daily[0], compact.forecast_daily[0]),
+            (regular.forecast_next_hour, compact.forecast_next_hour),
+            (regular.forecast_next_hour.minutes[0], compact.forecast_next_hour.minutes[0]),
+        ]
+
+        for regular_item, compact_item in pairs:
+            self.assertFalse(hasattr(compact_item, '__dict__'))
+            # fields includes the derived attributes, which are computed on access rather than stored
+            for name in type(regular_item).fields:
+                if name != 'minutes':
+                    self.assertEqual(getattr(compact_item, name), getattr(regular_item, name))
+
+
+class TestTimestamps(unittest.TestCase):
+
+    def test_matches_arrow(self):
+        # Spans the 2022 US daylight saving change, plus a non-WeatherKit format
+        values = [f'2022-11-06T0{hour}:30:00Z' for hour in range(5, 10)] + ['2022-11-06T08:30:00.250+00:00']
+
+        for timezone in ['US/Mountain', 'UTC', 'Asia/Kolkata', 'America/St_Johns']:
+            localizer = Localizer(timezone)
+            for value in values:
+                self.assertEqual(localizer.localize(value), arrow.get(value).to(timezone).for_json())
+                self.assertEqual(localizer.localize(value, hours=1), arrow.get(value).shift(hours=1).to(timezone).for_json())
+
+    def test_invalid_timestamp(self):
+        with self.assertRaises(Exception):
+            Localizer('UTC').localize(None)
+
+    def test_non_iana_timezones_fall_back_to_arrow(self):
+        value = '2022-11-06T08:30:00Z'
+        for timezone in ['+05:30', 'local']:
+            self.assertEqual(Localizer(timezone).localize(value), arrow.get(value).to(timezone).for_json())
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestColumnarForecasts(unittest.TestCase):
+
+    def setUp(self):
+        payload = sample_payload()
+        payload['forecastHourly']['hours'][1]['temperature'] = None
+        payload['forecastHourly']['hours'][1]['daylight'] = None
+        self.payload = payload
+        self.response = make_client(session=StubSession(payload)).fetch_columnar(
+            ['forecastHourly', 'forecastDaily', 'forecastNextHour'], 39.59, -104.72, 'US', 'US/Mountain'
+        )
+
+    def test_columns_match_models(self):
+        hourly = self.response.forecast_hourly
+        forecast = HourlyForecast(self.payload['forecastHourly']['hours'][0], 'US/Mountain')
+
+        self.assertEqual(len(hourly), 243)
+        self.assertEqual(hourly['start_datetime'][0], forecast.start_datetime)
+        self.assertEqual(hourly['temperature_f'][0], forecast.temperature_f)
+        self.assertEqual(hourly['wind_speed_mph'][0], forecast.wind_speed_mph)
+        self.assertEqual(hourly['wind_direction'][0], forecast.wind_direction)
+        self.assertEqual(hourly['conditions'][0], forecast.conditions)
+        self.assertEqual(self.response.forecast_daily['nighttime_wind_speed_avg_mph'][0], 4.144737999999999)
+        self.assertEqual(len(self.response.forecast_next_hour_minutes), 83)
+
+    def test_missing_values(self):
+        hourly = self.response.forecast_hourly
+        self.assertTrue(numpy.isnan(hourly['temperature_c'][1]))
+        self.assertTrue(numpy.isnan(hourly['temperature_f'][1]))
+        self.assertTrue(hourly['is_daylight'].mask[1])
+
+    def test_stack(self):
+        from weatherkit.columnar import stack
+
+        table = stack([self.response.forecast_hourly] * 3, locations=[(1, 2), (3, 4), (5, 6)])
+        self.assertEqual(len(table), 243 * 3)
+        self.assertEqual(table['location'][243], 1)
+        self.assertEqual(table['longitude'][-1], 6)
+        self.assertTrue(table['is_daylight'].mask[243 + 1])
+
+    def test_async_fetch_columnar(self):
+        client = AsyncWeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', session=StubSession(self.payload))
+        response = asyncio.run(client.fetch_columnar(['forecastHourly'], 39.59, -104.72, 'US', 'US/Mountain'))
+        client.close()
+        self.assertEqual(len(response.forecast_hourly), 243)
+
+
+class TestFieldProjection(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = sample_payload()
+        self.datasets = ['currentWeather', 'forecastHourly', 'forecastDaily']
+
+    def test_derived_fields_are_computed_on_access(self):
+        hour = HourlyForecast(self.payload['forecastHourly']['hours'][0], 'US/Mountain')
+        self.assertNotIn('temperature_f', vars(hour))
+        self.assertEqual(hour.temperature_f, hour.celsius_to_fahrenheit(hour.temperature_c))
+        self.assertEqual(hour.conditions, 'Mostly Cloudy')
+
+    def test_projection_matches_full_models(self):
+        raw = {
+            CurrentConditions: self.payload['currentWeather'],
+            HourlyForecast: self.payload['forecastHourly']['hours'][5],
+            DailyForecast: self.payload['forecastDaily']['days'][1],
+        }
+        for model_class, data in raw.items():
+            full = model_class(data, 'US/Mountain')
+            projected = project(model_class, model_class.fields)(data, 'US/Mountain')
+            for name in model_class.fields:
+                self.assertEqual(getattr(projected, name), getattr(full, name), name)
+
+    def test_client_fields(self):
+        fields = {'forecast_hourly': ['start_datetime', 'temperature_c', 'temperature_f']}
+        for compact_models in (False, True):
+            client = make_client(fields=fields, compact_models=compact_models)
+            response = client.fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+            hour = response.forecast_hourly[0]
+
+            if compact_models:
+                self.assertFalse(hasattr(hour, '__dict__'))
+            else:
+                self.assertIsInstance(hour, HourlyForecast)
+            self.assertEqual(hour.temperature_f, hour.celsius_to_fahrenheit(hour.temperature_c))
+            with self.assertRaises(AttributeError):
+                hour.humidity
+            self.assertEqual(list(json.loads(response.as_json())['forecast_hourly'][0]), fields['forecast_hourly'])
+            self.assertEqual(response.current_weather.humidity, 0.75)
+
+        with self.assertRaises(ValueError):
+            make_client(fields={'forecast_hourly': ['temperature_k']})
+
+    def test_client_units(self):
+        response = make_client(units='metric').fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+        data = json.loads(response.as_json())
+
+        self.assertIn('temperature_c', data['current_weather'])
+        self.assertNotIn('temperature_f', data['current_weather'])
+        self.assertNotIn('daytime_wind_speed_avg_mph', data['forecast_daily'][0])
+        self.assertIn('daytime_wind_direction', data['forecast_daily'][0])
+        self.assertAlmostEqual(response.current_weather.temperature_f, 14.774)
+
+        response = make_client(units='imperial').fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+        data = json.loads(response.as_json())
+        self.assertIn('temperature_f', data['forecast_hourly'][0])
+        self.assertNotIn('temperature_c', data['forecast_hourly'][0])
+
+    def test_projected_responses_pickle(self):
+        fields = {'forecast_hourly': ['start_datetime', 'temperature_f']}
+        for compact_models, lazy in [(False, False), (True, False), (False, True), (True, True)]:
+            client = make_client(fields=fields, units='metric', compact_models=compact_models, lazy=lazy)
+            response = client.fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+            # Lazy responses are pickled both with built items and with items still to build
+            response.forecast_hourly[0]
+            restored = pickle.loads(pickle.dumps(response))
+
+            self.assertIs(type(restored.forecast_hourly[0]), type(response.forecast_hourly[0]))
+            self.assertIs(type(restored.forecast_daily[5]), type(response.forecast_daily[5]))
+            self.assertIs(type(restored.current_weather), type(response.current_weather))
+            self.assertEqual(restored.as_json(), response.as_json())
+
+
+class TestLazyResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.datasets = ['currentWeather', 'forecastHourly', 'forecastDaily', 'forecastNextHour']
+        self.response = make_client(lazy=True).fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+    def test_items_are_built_on_access(self):
+        hourly = self.response.forecast_hourly
+        self.assertEqual(len(hourly), 243)
+        self.assertEqual(sum(item is not None for item in hourly._built), 0)
+
+        self.assertEqual(hourly[0].temperature_c, -10.36)
+        self.assertIs(hourly[0], hourly[0])
+        self.assertEqual(sum(item is not None for item in hourly._built), 1)
+        self.assertEqual(self.response.forecast_daily[-1].start_datetime, self.response.forecast_daily[9].start_datetime)
+
+    def test_as_json_matches_eager(self):
+        eager = make_client().fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+        self.assertEqual(self.response.as_json(), eager.as_json())
+
+    def test_missing_dataset(self):
+        response = make_client(lazy=True).fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+        response._data.pop('forecastDaily')
+        self.assertIsNone(response.forecast_daily)
+
+    def test_materialize_and_pickle(self):
+        self.assertEqual(self.response.forecast_hourly[0].temperature_c, -10.36)
+        restored = pickle.loads(pickle.dumps(self.response))
+        self.assertEqual(restored.forecast_hourly[1].start_datetime, self.response.forecast_hourly[1].start_datetime)
+
+        response = self.response.materialize()
+        self.assertEqual((response.latitude, response.longitude, response.distance_km), (39.59, -104.72, 0.0))
+        self.assertEqual(response.as_json(), self.response.as_json())
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.datasets = ['currentWeather', 'forecastHourly', 'forecastDaily', 'forecastNextHour']
+        self.client = make_client()
+        self.expected = self.client.fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+    def test_stream_matches_fetch(self):
+        for chunk_size in [1, 7, 16384]:
+            items = list(self.client.fetch_stream(self.datasets, 39.59, -104.72, 'US', 'US/Mountain', chunk_size=chunk_size))
+            hourly = [item for item in items if isinstance(item, HourlyForecast)]
+            daily = [item for item in items if isinstance(item, DailyForecast)]
+            current = [item for item in items if isinstance(item, CurrentConditions)]
+            next_hour = [item for item in items if isinstance(item, NextHourForecast)]
+
+            self.assertEqual([vars(h) for h in hourly], [vars(h) for h in self.expected.forecast_hourly])
+            self.assertEqual([vars(d) for d in daily], [vars(d) for d in self.expected.forecast_daily])
+            self.assertEqual(vars(current[0]), vars(self.expected.current_weather))
+            self.assertEqual(len(next_hour[0].minutes), 83)
+            self.assertEqual(vars(next_hour[0].minutes[-1]), vars(self.expected.forecast_next_hour.minutes[-1]))
+
+    def test_numbers_split_across_chunks(self):
+        from weatherkit.stream import iter_events
+
+        chunks = [b'{"a": 12', b'34, "forecastDaily": {"days": [{"x": 1', b'.5}, {"x": 2}]}}']
+        events = list(iter_events(chunks))
+        self.assertEqual(events[0], ('field', 'a', None, 1234))
+        self.assertEqual(events[1], ('item', 'forecastDaily', 'days', {'x': 1.5}))
+        self.assertEqual(events[2], ('item', 'forecastDaily', 'days', {'x': 2}))
+
+    def test_truncated_payload(self):
+        from weatherkit.stream import iter_events
+
+        with self.assertRaises(ValueError):
+            list(iter_events([b'{"forecastDaily": {"days": [{"x": 1}, {"x"']))
+
+
+class TestSerializers(unittest.TestCase):
+
+    def setUp(self):
+        datasets = ['currentWeather', 'forecastHourly', 'forecastDaily', 'forecastNextHour']
+        self.response = make_client().fetch(datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+    def test_as_json_is_plain(self):
+        data = json.loads(self.response.as_json())
+        self.assertNotIn('py/object', self.response.as_json())
+        self.assertEqual(list(data), ['current_weather', 'forecast_next_hour', 'forecast_hourly', 'forecast_daily', 'expire_times'])
+        hour = self.response.forecast_hourly[0]
+        self.assertEqual(data['forecast_hourly'][0], {name: getattr(hour, name) for name in HourlyForecast.fields})
+        self.assertEqual(data['forecast_next_hour']['minutes'][0], vars(self.response.forecast_next_hour.minutes[0]))
+        self.assertEqual(data['current_weather']['wind_direction'], 'SSE')
+
+    def test_field_subsets(self):
+        data = json.loads(self.response.as_json({'forecast_hourly': ['start_datetime', 'temperature_c'], 'current_weather': None}))
+        self.assertEqual(list(data), ['current_weather', 'forecast_hourly'])
+        self.assertEqual(data['forecast_hourly'][0], {'start_datetime': '2022-11-17T22:00:00-07:00', 'temperature_c': -10.36})
+        self.assertEqual(len(data['current_weather']), 25)
+
+    def test_dump_matches_dumps(self):
+        from weatherkit.serializers import dump
+
+        fp = io.StringIO()
+        dump(self.response, fp)
+        self.assertEqual(fp.getvalue(), self.response.as_json())
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        from weatherkit.serializers import dump
+        from weatherkit.serializers import dumps
+
+        fp = io.BytesIO()
+        dump(self.response, fp, format='msgpack')
+        self.assertEqual(fp.getvalue(), dumps(self.response, format='msgpack'))
+        self.assertEqual(msgpack.unpackb(fp.getvalue()), json.loads(self.response.as_json()))
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.instrumentation = HistogramInstrumentation()
+        self.client = make_client(instrumentation=self.instrumentation)
+        self.datasets = ['currentWeather', 'forecastHourly', 'forecastDaily', 'forecastNextHour']
+
+    def test_fetch_phases(self):
+        self.client.fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+        summary = self.instrumentation.summary()
+
+        self.assertEqual(summary['calls'], 1)
+        self.assertEqual(summary['statuses'], {200: 1})
+        self.assertGreater(summary['payload_bytes'], 100000)
+        self.assertEqual(summary['item_counts'], {'currentWeather': 1, 'forecastHourly': 243, 'forecastDaily': 10, 'forecastNextHour': 83})
+        self.assertEqual(set(summary['phases']), {'sign', 'http', 'decode', 'parse'})
+        self.assertEqual(summary['phases']['parse']['count'], 1)
+
+    def test_stream_and_timer(self):
+        list(self.client.fetch_stream(self.datasets, 39.59, -104.72, 'US', 'US/Mountain'))
+        with self.instrumentation.timer('serialize'):
+            pass
+
+        summary = self.instrumentation.summary()
+        self.assertEqual(summary['calls'], 2)
+        self.assertEqual(summary['item_counts']['forecastHourly'], 243)
+        self.assertIn('stream', summary['phases'])
+        self.assertIn('serialize', summary['phases'])
+
+    def test_noop_default(self):
+        client = make_client()
+        self.assertIsNone(client._start_stats())
+        with client.instrumentation.timer('serialize'):
+            pass
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram(bounds=(1, 2, 5))
+        for value in [0.5, 0.5, 1.5, 4, 9]:
+            histogram.add(value)
+
+        self.assertEqual(histogram.quantile(0.4), 1)
+        self.assertEqual(histogram.quantile(0.6), 2)
+        self.assertEqual(histogram.quantile(0.99), 9)
+        self.assertEqual(histogram.summary()['mean'], 3.1)
+
+
+class TestCoalescing(unittest.TestCase):
+
+    def test_threads_share_one_request(self):
+        session = SlowStubSession()
+        client = make_client(session=session, coalesce=True)
+        results = []
+
+        def fetch():
+            results.append(client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain'))
+
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(session.calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(client.flight.shared, 7)
+
+        # Once the call completes, the next fetch goes upstream again
+        client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+        self.assertEqual(len(session.calls), 2)
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.02)
+            raise AssertionError('Could not fetch data')
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except AssertionError as error:
+                errors.append(error)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(flight.calls, 1)
+
+    def test_asyncio(self):
+        session = SlowStubSession()
+        client = AsyncWeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', session=session, coalesce=True)
+
+        async def fetch_all():
+            return await asyncio.gather(*[
+                client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain') for _ in range(5)
+            ] + [client.fetch(['forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')])
+
+        with client:
+            results = asyncio.run(fetch_all())
+
+        self.assertEqual(len(session.calls), 2)
+        self.assertTrue(all(result is results[0] for result in results[:5]))
+        self.assertEqual(client.async_flight.shared, 4)
+
+
+class TestSpatial(unittest.TestCase):
+
+    def test_snapping(self):
+        grid = GridSnapping(0.01)
+        self.assertEqual(grid.snap(39.5951, -104.72666), (39.6, -104.73))
+        self.assertAlmostEqual(grid.max_error_km(39.59), 0.702, places=3)
+
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        geohash = GeohashSnapping(6)
+        latitude, longitude = geohash.snap(39.5901, -104.7267)
+        self.assertLessEqual(haversine_km(39.5901, -104.7267, latitude, longitude), geohash.max_error_km(39.59))
+
+    def test_index_nearest(self):
+        index = SpatialIndex(radius_km=1.0)
+        index.add('group', 39.59, -104.72, 'a', time.time() + 60)
+        index.add('group', 39.60, -104.72, 'b', time.time() + 60)
+        index.add('group', 39.595, -104.72, 'stale', time.time() + 0.05)
+        index.add('other', 39.598, -104.72, 'other', time.time() + 60)
+        time.sleep(0.1)
+
+        data, point, distance = index.nearest('group', 39.598, -104.721)
+        self.assertEqual((data, point), ('b', (39.60, -104.72)))
+        self.assertAlmostEqual(distance, 0.238, places=3)
+        self.assertIsNone(index.nearest('group', 39.7, -104.72))
+        self.assertEqual(len(index), 3)
+
+    def test_client_reuses_nearby_forecasts(self):
+        session = StubSession(sample_payload(expires_in=600))
+        client = make_client(session=session, snapping=GridSnapping(0.01), spatial_index=SpatialIndex(radius_km=2.0))
+
+        first = client.fetch(['currentWeather'], 39.5912, -104.7231, 'US', 'US/Mountain')
+        self.assertEqual(session.calls[0][0], f'{client.base_url}/api/v1/weather/en/39.59/-104.72')
+        self.assertEqual((first.latitude, first.longitude), (39.59, -104.72))
+        self.assertAlmostEqual(first.distance_km, 0.297, places=3)
+
+        second = client.fetch(['currentWeather'], 39.6012, -104.7131, 'US', 'US/Mountain')
+        self.assertEqual(len(session.calls), 1)
+        self.assertEqual((second.latitude, second.longitude), (39.59, -104.72))
+        self.assertGreater(second.distance_km, 1.0)
+
+        client.fetch(['currentWeather'], 39.7, -104.72, 'US', 'US/Mountain')
+        client.fetch(['forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')
+        self.assertEqual(len(session.calls), 3)
+
+
+class TestForecastArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name) / 'archive'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_client_appends_fetched_payloads(self):
+        archive = ForecastArchive(self.path)
+        client = make_client(archive=archive)
+        client.fetch(['forecastHourly', 'forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')
+        client.fetch(['forecastHourly'], 40.0, -105.0, 'US', 'US/Mountain')
+
+        temperatures = archive.column('hourly', 'temperature_c')
+        self.assertEqual(len(temperatures), 486)
+        self.assertEqual(temperatures[:2].tolist(), [-10.36, -10.88])
+        self.assertEqual(len(archive.column('daily', 'temperature_max_c')), 20)
+
+        issued = archive.find(latitude=40.0, longitude=-105.0, kind='hourly')
+        self.assertEqual(issued, [('hourly', 1668789254.0, 243, 243)])
+
+        record = archive.records('hourly', first=243, count=1)[0]
+        self.assertEqual((record['latitude'], record['longitude']), (40.0, -105.0))
+        self.assertEqual(record['condition_code'], 'MostlyCloudy')
+        self.assertEqual(record['start_datetime'], 1668747600.0)  # 2022-11-18T05:00:00Z
+        self.assertEqual(record['is_daylight'], 0.0)
+        archive.close()
+
+    def test_reopen_and_partial_records(self):
+        with ForecastArchive(self.path) as archive:
+            archive.append(sample_payload(), 39.59, -104.72)
+
+        # A record cut short by a crash is ignored
+        with open(self.path / 'daily.f64', 'ab') as fp:
+            fp.write(b'\0' * 12)
+
+        with ForecastArchive(self.path) as archive:
+            self.assertEqual(len(archive.column('daily', 'precip_type')), 10)
+            self.assertEqual(archive.text(archive.column('daily', 'precip_type')[0]), 'clear')
+            self.assertEqual(len(archive.find(kind='minute')), 1)
+
+    def test_append_after_partial_records(self):
+        with ForecastArchive(self.path) as archive:
+            archive.append(sample_payload(), 39.59, -104.72)
+
+        for name in ('daily', 'index'):
+            with open(self.path / f'{name}.f64', 'ab') as fp:
+                fp.write(b'\0' * 12)
+
+        # The torn bytes are cut off, so the new records and index entries line up
+        with ForecastArchive(self.path) as archive:
+            archive.append(sample_payload(), 40.0, -105.0)
+            (_, _, first, count), = archive.find(latitude=40.0, longitude=-105.0, kind='daily')
+            self.assertEqual((first, count), (10, 10))
+
+            record = archive.records('daily', first=first, count=1)[0]
+            self.assertEqual((record['latitude'], record['longitude']), (40.0, -105.0))
+            self.assertEqual(archive.records('daily', first=0, count=1)[0]['moon_phase'], record['moon_phase'])
+            self.assertEqual(len(archive.column('daily', 'temperature_max_c')), 20)
+
+
+class FailingStubSession(StubSession):
+    """ Answers 503 for URLs containing any of the given strings """
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+
+    def get(self, url, **kwargs):
+        if any(text in url for text in self.failing):
+            self.calls.append((url, kwargs))
+            return StubResponse({}, status_code=503)
+        return super().get(url, **kwargs)
+
+
+class TestBulkFetch(unittest.TestCase):
+
+    def test_read_locations(self):
+        with_header = io.StringIO('id,latitude,longitude,timezone\nden,39.59,-104.72,US/Mountain\n\n')
+        locations = list(read_locations(with_header, country_code='US'))
+        self.assertEqual(locations, [{
+            'id': 'den', 'latitude': 39.59, 'longitude': -104.72, 'timezone': 'US/Mountain', 'country_code': 'US',
+        }])
+
+        positional = list(read_locations(['39.59,-104.72,US,US/Mountain', '40.0,-105.0,US,US/Mountain']))
+        self.assertEqual([location['id'] for location in positional], ['39.59,-104.72', '40.0,-105.0'])
+
+        with self.assertRaises(ValueError):
+            list(read_locations(['39.59,-104.72']))
+
+        bad = list(read_locations(['north,-104.72,US,US/Mountain', '39.59,-104.72'], errors='yield'))
+        self.assertEqual([location['latitude'] for location in bad], ['north', '39.59'])
+        self.assertTrue(all(location['error'].startswith('ValueError') for location in bad))
+
+    def test_run_writes_bad_rows_and_finished_fetches(self):
+        rows = ['39.0,-104.72,US,US/Mountain', 'north,-104.72,US,US/Mountain', '40.0,-104.72,US,US/Mountain']
+        output = io.StringIO()
+        counts = run(make_client(), read_locations(rows, errors='yield'), output, ['currentWeather'])
+        self.assertEqual(counts, (2, 0, 1))
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(sum('error' in line for line in lines), 1)
+
+        # Without errors='yield' the bad row still stops the run, but not before the fetches it started are written
+        output = io.StringIO()
+        with self.assertRaises(ValueError):
+            run(make_client(), read_locations(rows), output, ['currentWeather'])
+        self.assertEqual(len(output.getvalue().splitlines()), 1)
+
+    def test_run_writes_lines_and_resumes(self):
+        locations = [
+            {'id': str(i), 'latitude': 39.0 + i, 'longitude': -104.72, 'country_code': 'US', 'timezone': 'US/Mountain'}
+            for i in range(5)
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_path = os.path.join(directory, 'done.txt')
+
+            output = io.StringIO()
+            client = make_client(session=FailingStubSession(['/42.0/']))
+            checkpoint = Checkpoint(checkpoint_path)
+            counts = run(client, iter(locations), output, ['currentWeather'], checkpoint, concurrency=2)
+            checkpoint.close()
+
+            self.assertEqual(counts, (4, 0, 1))
+            lines = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEqual(sorted(line['location']['id'] for line in lines), ['0', '1', '2', '3', '4'])
+            failed = [line for line in lines if 'error' in line]
+            self.assertEqual(failed[0]['location']['id'], '3')
+            self.assertEqual(lines[0]['response']['current_weather']['temperature_c'], -9.57)
+
+            session = StubSession()
+            checkpoint = Checkpoint(checkpoint_path)
+            counts = run(make_client(session=session), iter(locations), io.StringIO(), ['currentWeather'], checkpoint)
+            checkpoint.close()
+
+            self.assertEqual(counts, (1, 4, 0))
+            self.assertEqual(len(session.calls), 1)
+            self.assertIn('/42.0/', session.calls[0][0])
+
+
+class TestBatchParsing(unittest.TestCase):
+
+    def setUp(self):
+        payload = sample_payload()
+        self.body = json.dumps(payload).encode()
+        self.current_only = json.dumps({'currentWeather': payload['currentWeather']})
+        self.payload = payload
+
+    def test_rows_match_models(self):
+        fields = {'forecast_hourly': ['start_datetime', 'temperature_c', 'temperature_f']}
+        rows = list(parse_rows([self.body, self.current_only], 'US/Mountain', fields=fields, processes=1))
+
+        hour = HourlyForecast(self.payload['forecastHourly']['hours'][0], 'US/Mountain')
+        self.assertEqual(row_fields(fields)['forecast_hourly'], ('start_datetime', 'temperature_c', 'temperature_f'))
+        self.assertEqual(rows[0]['forecast_hourly'][0], (hour.start_datetime, hour.temperature_c, hour.temperature_f))
+        self.assertEqual(len(rows[0]['forecast_next_hour']), len(self.payload['forecastNextHour']['minutes']))
+
+        # Without fields or units, rows leave out the derived imperial and text values
+        current = CurrentConditions(self.payload['currentWeather'], 'US/Mountain')
+        names = row_fields()['current_weather']
+        self.assertNotIn('temperature_f', names)
+        self.assertEqual(rows[1], {'current_weather': tuple(getattr(current, name) for name in names)})
+
+        imperial = next(parse_rows([self.current_only], 'US/Mountain', units='imperial', processes=1))
+        self.assertIn('temperature_f', row_fields(units='imperial')['current_weather'])
+        self.assertEqual(len(imperial['current_weather']), len(row_fields(units='imperial')['current_weather']))
+
+    def test_process_pool_keeps_order(self):
+        payloads = [self.body, self.current_only] * 3
+        serial = list(parse_rows(payloads, ['US/Mountain', 'UTC'] * 3, processes=1, chunksize=1))
+        pooled = list(parse_rows(payloads, ['US/Mountain', 'UTC'] * 3, processes=2, chunksize=1))
+        self.assertEqual(pooled, serial)
+
+    def test_columnar(self):
+        tables = parse_columnar([self.body, self.current_only, self.body], 'US/Mountain', processes=2, chunksize=1)
+
+        hours = len(self.payload['forecastHourly']['hours'])
+        self.assertEqual(list(tables['current_weather']['location']), [0, 1, 2])
+        self.assertEqual(list(tables['forecast_hourly']['location']), [0] * hours + [2] * hours)
+        self.assertEqual(tables['forecast_hourly']['temperature_c'][0], self.payload['forecastHourly']['hours'][0]['temperature'])
+        self.assertEqual(tables['forecast_hourly']['conditions'][0], HourlyForecast(self.payload['forecastHourly']['hours'][0], 'UTC').conditions)
+
+
+class TestRateLimiting(unittest.TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        self.assertEqual([bucket.acquire(), bucket.acquire()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.acquire(), 0.02, delta=0.01)
+
+        bucket.hold(0.05)
+        self.assertGreaterEqual(bucket.acquire(), 0.05)
+        self.assertEqual((bucket.acquired, bucket.throttled), (4, 2))
+
+    def test_token_bucket_is_shared_with_tasks(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        bucket.acquire()
+
+        async def acquire_all():
+            return await asyncio.gather(*[bucket.acquire_async() for _ in range(3)])
+
+        started = time.monotonic()
+        waits = asyncio.run(acquire_all())
+        self.assertGreaterEqual(time.monotonic() - started, 0.025)
+        self.assertEqual(sorted(waits), waits)
+
+    def test_retry_policy(self):
+        policy = RetryPolicy(retries=2, backoff=0.5, max_backoff=1.5, max_retry_after=10)
+        self.assertTrue(policy.should_retry(429, 1))
+        self.assertFalse(policy.should_retry(429, 2))
+        self.assertFalse(policy.should_retry(404, 0))
+
+        self.assertTrue(all(0 <= policy.delay(attempt) <= 1.5 for attempt in range(5) for _ in range(20)))
+        self.assertEqual(policy.delay(0, '3'), 3.0)
+        self.assertEqual(policy.delay(0, '600'), 10)
+
+        self.assertEqual(retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(retry_after_seconds('soon'))
+
+    def test_retries_against_mock_server(self):
+        instrumentation = HistogramInstrumentation()
+        with MockWeatherKitServer(team_id='TEAM', key_id='KEY', retry_after=0) as server:
+            client = WeatherKit(
+                'TEAM', 'com.example.weather', make_private_key(), 'KEY', base_url=server.url,
+                rate_limiter=TokenBucket(rate=100), retry=RetryPolicy(retries=2, backoff=0.001),
+                instrumentation=instrumentation,
+            )
+
+            server.queue_status(429)
+            server.queue_status(503)
+            response = client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+            self.assertEqual(response.current_weather.temperature_c, -9.57)
+            self.assertEqual(server.statuses, {429: 1, 503: 1, 200: 1})
+            self.assertEqual(instrumentation.summary()['retries'], 2)
+            self.assertIn('backoff', instrumentation.summary()['phases'])
+
+            # The final failure raises once the retries run out, with the status and Retry-After
+            server.queue_status(429, count=3)
+            with self.assertRaises(WeatherKitError) as raised:
+                client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+            self.assertEqual((raised.exception.status, raised.exception.retry_after), (429, '0'))
+            client.close()
+
+
+class TestTimeRanges(unittest.TestCase):
+
+    def test_fetch_sends_range_parameters(self):
+        session = StubSession()
+        client = make_client(session=session, cache=MemoryCache())
+        client.fetch(['forecastHourly'], 39.59, -104.72, 'US', 'US/Mountain')
+        client.fetch(
+            ['forecastHourly'], 39.59, -104.72, 'US', 'US/Mountain',
+            hourly_start=datetime.datetime(2022, 11, 18), hourly_end='2022-11-19T00:00:00Z',
+        )
+
+        # The ranged request is not served the cached full forecast
+        self.assertEqual(len(session.calls), 2)
+        params = session.calls[1][1]['params']
+        self.assertEqual((params['hourlyStart'], params['hourlyEnd']), ('2022-11-18T00:00:00Z', '2022-11-19T00:00:00Z'))
+        self.assertNotIn('dailyStart', params)
+
+    def test_fetch_range_stitches_chunks(self):
+        # The stub answers every chunk with the whole sample, so each item arrives several times
+        session = StubSession()
+        client = make_client(session=session)
+        response = client.fetch_range(
+            ['forecastHourly', 'forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain',
+            '2022-11-18T00:00:00Z', '2022-11-21T12:00:00Z', chunk=datetime.timedelta(days=1),
+        )
+
+        self.assertEqual(len(session.calls), 4)
+        self.assertEqual(session.calls[3][1]['params']['dailyEnd'], '2022-11-21T12:00:00Z')
+        hours = [hour.start_datetime for hour in response.forecast_hourly]
+        self.assertEqual(len(hours), len(sample_payload()['forecastHourly']['hours']))
+        self.assertEqual(hours, sorted(hours))
+        self.assertEqual(len(response.forecast_daily), 10)
+        self.assertIsNone(response.current_weather)
+
+        with self.assertRaises(ValueError):
+            client.fetch_range(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain', '2022-11-18T00:00:00Z', '2022-11-19T00:00:00Z')
+
+    def test_fetch_range_against_mock_server(self):
+        with MockWeatherKitServer(team_id='TEAM', key_id='KEY') as server:
+            client = AsyncWeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', base_url=server.url)
+            response = asyncio.run(client.fetch_range(
+                ['forecastHourly'], 39.59, -104.72, 'US', 'US/Mountain',
+                '2022-11-19T00:00:00Z', '2022-11-20T06:00:00Z', chunk=datetime.timedelta(hours=12),
+            ))
+            client.close()
+
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(len(response.forecast_hourly), 30)
+        self.assertEqual(response.forecast_hourly[0].start_datetime, '2022-11-18T17:00:00-07:00')
+        self.assertEqual(response.forecast_hourly[-1].start_datetime, '2022-11-19T22:00:00-07:00')
+
+
+class TestForecastDiffs(unittest.TestCase):
+
+    datasets = ['currentWeather', 'forecastHourly', 'forecastDaily', 'forecastNextHour']
+
+    def fetch(self, payload):
+        return make_client(session=StubSession(payload)).fetch(self.datasets, 39.59, -104.72, 'US', 'US/Mountain')
+
+    def setUp(self):
+        self.payload = sample_payload()
+        self.previous = self.fetch(self.payload)
+
+        changed = sample_payload()
+        hours = changed['forecastHourly']['hours']
+        hours[3]['temperature'] += 1.5
+        hours[4]['precipitationChance'] += 0.01
+        changed['forecastHourly']['hours'] = hours[1:] + [dict(hours[-1], forecastStart='2022-11-29T00:00:00Z')]
+        changed['currentWeather']['temperature'] = -9.0
+        self.current = self.fetch(changed)
+
+    def test_patch_holds_only_changes(self):
+        self.assertEqual(diff(self.previous, self.fetch(self.payload)), {})
+
+        patch = diff(self.previous, self.current, tolerances={'precip_chance': 0.05})
+        hourly = patch['forecast_hourly']
+        self.assertEqual(set(patch), {'current_weather', 'forecast_hourly'})
+        self.assertEqual(set(patch['current_weather']), {'temperature_c', 'temperature_f'})
+        self.assertEqual(list(hourly['changed']), [self.previous.forecast_hourly[3].start_datetime])
+        self.assertEqual(hourly['removed'], [self.previous.forecast_hourly[0].start_datetime])
+        self.assertEqual([hour['start_datetime'] for hour in hourly['added']], ['2022-11-28T17:00:00-07:00'])
+        self.assertLess(len(json.dumps(patch)), len(self.current.as_json()) / 20)
+
+    def test_apply_rebuilds_the_state(self):
+        state = to_dict(self.previous)
+        self.assertEqual(apply(state, diff(state, self.current)), to_dict(self.current))
+        self.assertEqual(apply(None, diff(None, self.current)), to_dict(self.current))
+        self.assertEqual(state, to_dict(self.previous))
+
+    def test_tracker_sends_accumulated_changes(self):
+        tracker = ChangeTracker(tolerances={'temperature_c': 0.25, 'temperature_f': 0.45})
+        self.assertEqual(tracker.update('den', self.previous), to_dict(self.previous))
+
+        patches = []
+        for step in range(1, 4):
+            payload = sample_payload()
+            payload['currentWeather']['temperature'] += 0.1 * step
+            patches.append(tracker.update('den', self.fetch(payload)))
+
+        self.assertEqual(patches[:2], [{}, {}])
+        self.assertAlmostEqual(patches[2]['current_weather']['temperature_c'], -9.27)
+        self.assertAlmostEqual(tracker.states['den']['current_weather']['temperature_c'], -9.27)
+
+
+class TestMockServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockWeatherKitServer(team_id='TEAM', key_id='KEY').start()
+        self.client = WeatherKit('TEAM', 'com.example.weather', make_private_key(), 'KEY', base_url=self.server.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_fetch(self):
+        response = self.client.fetch(['currentWeather', 'forecastDaily'], 39.59, -104.72, 'US', 'US/Mountain')
+
+        self.assertEqual(response.current_weather.temperature_c, -9.57)
+        self.assertEqual(len(response.forecast_daily), 10)
+        self.assertIsNone(response.forecast_hourly)
+        self.assertEqual(self.server.statuses, {200: 1})
+
+    def test_injected_errors(self):
+        self.server.queue_status(429)
+        self.server.queue_status(503)
+
+        for _ in range(2):
+            with self.assertRaises(WeatherKitError):
+                self.client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+        self.client.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+
+        self.assertEqual(self.server.statuses, {429: 1, 503: 1, 200: 1})
+
+    def test_validates_token(self):
+        token = self.client.token
+        self.assertIsNone(self.server.validate_token(f'Bearer {token}'))
+        self.assertIsNotNone(self.server.validate_token(token))
+        self.assertIsNotNone(self.server.validate_token('Bearer not-a-token'))
+
+        other = WeatherKit('OTHER', 'com.example.weather', make_private_key(), 'KEY', base_url=self.server.url)
+        with self.assertRaises(WeatherKitError):
+            other.fetch(['currentWeather'], 39.59, -104.72, 'US', 'US/Mountain')
+        self.assertEqual(self.server.statuses, {401: 1})
+
+
 if __name__ == '__main__':
     unittest.main()
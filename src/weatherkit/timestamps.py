@@ -0,0 +1,95 @@
+import datetime
+
+try:
+    import zoneinfo
+except ImportError:
+    zoneinfo = None
+
+
+UTC = datetime.timezone.utc
+
+# Bounds each Localizer's memo of converted strings
+MAX_CACHED_VALUES = 8192
+
+
+def resolve_timezone(timezone):
+    """ Returns the tzinfo for a timezone name
+
+    IANA names are looked up with the standard library's zoneinfo (Python 3.9+,
+    using the system database or the tzdata package); anything else, such as
+    'local' or '+07:00', and older Pythons fall back to arrow's parser.
+    """
+    if isinstance(timezone, datetime.tzinfo):
+        return timezone
+
+    if zoneinfo is not None:
+        try:
+            return zoneinfo.ZoneInfo(timezone)
+        except (KeyError, ValueError, TypeError):
+            pass
+
+    from arrow.parser import TzinfoParser
+
+    return TzinfoParser.parse(timezone)
+
+
+class Localizer():
+    """ Converts WeatherKit timestamps to ISO 8601 strings in one timezone
+
+    WeatherKit returns UTC timestamps in the fixed "2022-11-18T16:34:00Z" form.
+    Those are sliced straight into a datetime and shifted with the timezone
+    resolved once up front; anything else falls back to arrow. The output is
+    identical to arrow.get(value).to(timezone).for_json().
+    """
+
+    def __init__(self, timezone):
+        self.timezone = timezone
+        self.tzinfo = resolve_timezone(timezone)
+        self._cache = {}
+
+    def parse(self, value):
+        """ Returns the timestamp as an aware UTC datetime """
+        if isinstance(value, str) and len(value) == 20 and value[19] == 'Z' and value[10] == 'T':
+            try:
+                return datetime.datetime(
+                    int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                    tzinfo=UTC,
+                )
+            except ValueError:
+                pass
+
+        import arrow
+
+        return arrow.get(value).datetime
+
+    def localize(self, value, hours=0):
+        """ Converts a timestamp to the local timezone, optionally shifted by a number of hours """
+        key = (value, hours)
+        result = self._cache.get(key)
+
+        if result is None:
+            utc_datetime = self.parse(value)
+            if hours:
+                utc_datetime += datetime.timedelta(hours=hours)
+            result = utc_datetime.astimezone(self.tzinfo).isoformat()
+
+            if len(self._cache) >= MAX_CACHED_VALUES:
+                self._cache.clear()
+            self._cache[key] = result
+
+        return result
+
+
+_localizers = {}
+
+
+def localizer(timezone):
+    """ Returns the shared Localizer for a timezone name, or the Localizer passed in """
+    if isinstance(timezone, Localizer):
+        return timezone
+
+    instance = _localizers.get(timezone)
+    if instance is None:
+        instance = _localizers.setdefault(timezone, Localizer(timezone))
+    return instance
@@ -0,0 +1,25 @@
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+
+
+def accept_encoding():
+    """ Returns the Accept-Encoding value for the codecs urllib3 can decode here (br needs brotli) """
+    return make_headers(accept_encoding=True)['accept-encoding']
+
+
+def create_session(pool_connections=10, pool_maxsize=10, adapter=None):
+    """ Creates a keep-alive session with a pooled adapter for the WeatherKit API """
+    if adapter is None:
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept-Encoding': accept_encoding(),
+        'Connection': 'keep-alive',
+    })
+
+    return session
@@ -1,82 +1,469 @@
-import arrow
-import cryptography
-import json
-import jwt
-import requests
-
-from .models import CurrentConditions
-from .models import DailyForecast
-from .models import NextHourForecast
-from .models import HourlyForecast
+import time
+
+from .auth import TokenManager
+from .cache import cache_key
+from .cache import expire_time
+from .cache import expire_timestamp
+from .instrumentation import FetchStats
+from .instrumentation import Instrumentation
+from .instrumentation import count_items
+from .models import DATASET_ATTRIBUTES
+from .models import LazyWeatherKitResponse
 from .models import WeatherKitResponse
+from .models import dataset_expire_times
+from .models import model_classes
+from .ranges import DEFAULT_CHUNK
+from .ranges import check_range_models
+from .ranges import range_windows
+from .ranges import stitch
+from .ranges import time_window
+from .spatial import haversine_km
+from .stream import iter_events
+from .timestamps import localizer
+
+
+DEFAULT_BASE_URL = 'https://weatherkit.apple.com'
+
+
+class WeatherKitError(Exception):
+    """ Raised when the API answers with an error status, once any retries have run out """
+
+    def __init__(self, status, retry_after=None):
+        self.status = status
+        # The raw Retry-After header, if the response had one
+        self.retry_after = retry_after
+        message = f'Could not fetch data: HTTP {status}'
+        if retry_after is not None:
+            message += f' (Retry-After: {retry_after})'
+        super().__init__(message)
 
 
 class WeatherKit():
 
-    def __init__(self, team_id, service_id, private_key, key_id):
-        self.token = self._create_jwt(team_id, service_id, private_key, key_id)
-
-    def _create_jwt(self, team_id, service_id, private_key, key_id):
-        """ Creates the JWT for the WeatherKit API Request """
-        init_at = int(arrow.now().timestamp())
-        expire_at = int(arrow.now().shift(hours=1).timestamp())
-
-        token = jwt.encode(
-            payload = {
-                'iss': team_id,
-                'sub': service_id,
-                'iat': init_at,
-                'exp': expire_at,
-            },
-            key = private_key,
-            headers = {
-                'alg': 'ES256',
-                'kid': key_id,
-                'typ': 'JWT',
-                'id': f'{team_id}.{service_id}'
-            }
+    def __init__(self, team_id, service_id, private_key, key_id, token_lifetime=3600, token_refresh_margin=300,
+                 session=None, adapter=None, pool_maxsize=10, connect_timeout=5, read_timeout=30, cache=None,
+                 compact_models=False, lazy=False, instrumentation=None, base_url=DEFAULT_BASE_URL,
+                 coalesce=False, snapping=None, spatial_index=None, fields=None, units=None,
+                 archive=None, rate_limiter=None, retry=None):
+        self.token_manager = TokenManager(
+            team_id, service_id, private_key, key_id,
+            lifetime=token_lifetime,
+            refresh_margin=token_refresh_margin,
         )
 
-        return token
+        # Reuse one pooled keep-alive session so requests skip the TCP/TLS handshake
+        self._owns_session = session is None
+        if session is None:
+            # requests is only imported when the client has to build its own session
+            from .transport import create_session
+            session = create_session(pool_maxsize=pool_maxsize, adapter=adapter)
+        elif adapter is not None:
+            session.mount('https://', adapter)
 
-    def _fetch_api(self, forecast_datasets, latitude, longitude, country_code, timezone):
-        """ Fetches the weather from the WeatherKit API """
-        url = f'https://weatherkit.apple.com/api/v1/weather/en/{latitude}/{longitude}'
-        headers = {'Authorization': f'Bearer {self.token}'}
+        self.session = session
+        self.timeout = (connect_timeout, read_timeout)
+        self.base_url = base_url.rstrip('/')
+        # Concurrent fetches of the same request share one upstream call and response
+        self.flight = None
+        if coalesce:
+            from .coalesce import SingleFlight
+            self.flight = SingleFlight()
+        self.snapping = snapping
+        self.spatial_index = spatial_index
+        self.archive = archive
+        # A ratelimit.TokenBucket, which may be shared with other clients, and a ratelimit.RetryPolicy
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.cache = cache
+        self.compact_models = compact_models
+        # The class built for each response section, with any field projection applied
+        self.models = model_classes(compact_models, fields, units)
+        self.lazy = lazy
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+    @property
+    def token(self):
+        return self.token_manager.token
+
+    def close(self):
+        """ Closes the pooled connections if the client created the session """
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start_stats(self):
+        """ Returns a FetchStats to fill in, or None when nothing is listening """
+        return FetchStats() if self.instrumentation.enabled else None
+
+    def _throttle(self, stats, waited=None):
+        """ Takes a token from the rate limiter, waiting for one unless waited says the caller already has """
+        if waited is None:
+            waited = self.rate_limiter.acquire()
+        if stats is not None and waited:
+            stats.timings['throttle'] = stats.timings.get('throttle', 0.0) + waited
+
+    def _request(self, forecast_datasets, latitude, longitude, country_code, timezone, stream=False, stats=None, window=()):
+        """ Sends the WeatherKit API request and returns the HTTP response; window holds any time range parameters """
+        url = f'{self.base_url}/api/v1/weather/en/{latitude}/{longitude}'
+
+        if stats is None:
+            token = self.token
+        else:
+            with stats.phase('sign'):
+                token = self.token
+
+        headers = {'Authorization': f'Bearer {token}'}
 
         params = {
             'countryCode': country_code,
             'timezone': timezone,
             'dataSets': ','.join(forecast_datasets),
         }
+        params.update(window)
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self._throttle(stats)
+
+            if stats is None:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout, stream=stream)
+            else:
+                with stats.phase('http'):
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout, stream=stream)
+                stats.status = response.status_code
+
+            if response.ok or self.retry is None or not self.retry.should_retry(response.status_code, attempt):
+                break
 
-        response = requests.get(url, params=params, headers=headers)
-        assert response.ok, 'Could not fetch data'
-        return response.json()
+            delay = self.retry.delay(attempt, response.headers.get('Retry-After'))
+            response.close()
+            if response.status_code == 429 and self.rate_limiter is not None:
+                # Back every caller sharing the limiter off, not just this one
+                self.rate_limiter.hold(delay)
+            if stats is not None:
+                stats.retries += 1
+                with stats.phase('backoff'):
+                    time.sleep(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
 
-    def fetch(self, forecast_datasets, latitude, longitude, country_code, timezone):
-        """ Fetches and parses the weather from the WeatherKit API """
-        data = self._fetch_api(forecast_datasets, latitude, longitude, country_code, timezone)
+        if not response.ok:
+            retry_after = response.headers.get('Retry-After')
+            response.close()
+            raise WeatherKitError(response.status_code, retry_after)
+        return response
+
+    def _fetch_api(self, forecast_datasets, latitude, longitude, country_code, timezone, stats=None, window=()):
+        """ Fetches the weather from the WeatherKit API """
+        response = self._request(forecast_datasets, latitude, longitude, country_code, timezone, stats=stats, window=window)
+
+        if stats is None:
+            data = response.json()
+        else:
+            stats.payload_bytes = len(response.content)
+            with stats.phase('decode'):
+                data = response.json()
+
+        if self.archive is not None:
+            self.archive.append(data, latitude, longitude)
+
+        return data
+
+    def _parse_response(self, data, timezone):
+        """ Builds the response objects from the decoded API payload """
+        timezone = localizer(timezone)
+        models = self.models
+        current_class, next_hour_class = models['current_weather'], models['forecast_next_hour']
+        hourly_class, daily_class = models['forecast_hourly'], models['forecast_daily']
+
+        if self.lazy:
+            return LazyWeatherKitResponse(data, timezone, next_hour_class, hourly_class, daily_class, current_class)
 
         response = WeatherKitResponse()
+        response.expire_times = dataset_expire_times(data)
 
         if 'currentWeather' in data.keys():
             raw_current_conditions = data.get('currentWeather', {})
-            response.current_weather = CurrentConditions(raw_current_conditions, timezone)
+            response.current_weather = current_class(raw_current_conditions, timezone)
 
         if 'forecastNextHour' in data.keys():
             raw_next_hour_forecast = data.get('forecastNextHour', {})
-            next_hour_forecast = NextHourForecast(raw_next_hour_forecast, timezone)
+            next_hour_forecast = next_hour_class(raw_next_hour_forecast, timezone)
             response.forecast_next_hour = next_hour_forecast
 
         if 'forecastHourly' in data.keys():
             raw_hourly_forecasts = data.get('forecastHourly', {}).get('hours', [])
-            hourly_forecasts = [HourlyForecast(h, timezone) for h in raw_hourly_forecasts]
+            hourly_forecasts = [hourly_class(h, timezone) for h in raw_hourly_forecasts]
             response.forecast_hourly = hourly_forecasts
 
         if 'forecastDaily' in data.keys():
             raw_daily_forecasts = data.get('forecastDaily', {}).get('days', [])
-            daily_forecasts = [DailyForecast(d, timezone) for d in raw_daily_forecasts]
+            daily_forecasts = [daily_class(d, timezone) for d in raw_daily_forecasts]
             response.forecast_daily = daily_forecasts
 
         return response
+
+    def _lookup(self, forecast_datasets, latitude, longitude, country_code, timezone, stats=None, window=()):
+        """ Returns the payload and the (latitude, longitude) it is for without calling the API, or None
+
+        That is the nearest unexpired point in the spatial index, if one is close
+        enough, or else the cached payload for the requested coordinates after
+        snapping.
+        """
+        group = None
+        if self.spatial_index is not None:
+            group = (tuple(sorted(forecast_datasets)), country_code, timezone, window)
+            nearby = self.spatial_index.nearest(group, latitude, longitude)
+            if nearby is not None:
+                if stats is not None:
+                    stats.cache_hit = True
+                return nearby[:2]
+
+        if self.cache is None:
+            return None
+
+        if self.snapping is not None:
+            latitude, longitude = self.snapping.snap(latitude, longitude)
+
+        data = self.cache.get(cache_key(forecast_datasets, latitude, longitude, country_code, timezone, window))
+        if stats is not None:
+            stats.cache_hit = data is not None
+        if data is None:
+            return None
+
+        if group is not None:
+            self.spatial_index.add(group, latitude, longitude, data, expire_time(data))
+        return data, (latitude, longitude)
+
+    def _fetch_remote(self, forecast_datasets, latitude, longitude, country_code, timezone, stats=None, window=()):
+        """ Fetches the payload from the API, stores it in the cache and spatial index, and returns it with its (latitude, longitude) """
+        if self.snapping is not None:
+            latitude, longitude = self.snapping.snap(latitude, longitude)
+
+        data = self._fetch_api(forecast_datasets, latitude, longitude, country_code, timezone, stats, window)
+
+        if self.cache is not None:
+            key = cache_key(forecast_datasets, latitude, longitude, country_code, timezone, window)
+            self.cache.set(key, data, expire_time(data))
+        if self.spatial_index is not None:
+            group = (tuple(sorted(forecast_datasets)), country_code, timezone, window)
+            self.spatial_index.add(group, latitude, longitude, data, expire_time(data))
+
+        return data, (latitude, longitude)
+
+    def _fetch_located(self, forecast_datasets, latitude, longitude, country_code, timezone, stats=None, window=()):
+        """ Returns the payload and the (latitude, longitude) it is for, calling the API only when _lookup finds nothing """
+        located = self._lookup(forecast_datasets, latitude, longitude, country_code, timezone, stats, window)
+        if located is None:
+            located = self._fetch_remote(forecast_datasets, latitude, longitude, country_code, timezone, stats, window)
+        return located
+
+    def _fetch_and_build(self, build, forecast_datasets, latitude, longitude, country_code, timezone, window=(),
+                         stats=None, locate=None):
+        """ Fetches the payload and turns it into a response with build(data, timezone), recording stats
+
+        locate(forecast_datasets, latitude, longitude, country_code, timezone, stats, window)
+        returns the payload and its location, _fetch_located by default. stats may
+        be passed in when the fetch was started elsewhere.
+        """
+        if stats is None:
+            stats = self._start_stats()
+        if locate is None:
+            locate = self._fetch_located
+
+        if stats is None:
+            data, location = locate(forecast_datasets, latitude, longitude, country_code, timezone, None, window)
+            return self._locate(build(data, timezone), latitude, longitude, location)
+
+        try:
+            data, location = locate(forecast_datasets, latitude, longitude, country_code, timezone, stats, window)
+            stats.item_counts = count_items(data)
+            with stats.phase('parse'):
+                response = build(data, timezone)
+            return self._locate(response, latitude, longitude, location)
+        finally:
+            self.instrumentation.record(stats)
+
+    def _locate(self, response, latitude, longitude, location):
+        """ Records the coordinates the forecast is for and how far they are from the requested ones """
+        response.latitude, response.longitude = location
+        if location == (latitude, longitude):
+            response.distance_km = 0.0
+        else:
+            response.distance_km = haversine_km(latitude, longitude, *location)
+        return response
+
+    def fetch(self, forecast_datasets, latitude, longitude, country_code, timezone,
+              hourly_start=None, hourly_end=None, daily_start=None, daily_end=None):
+        """ Fetches and parses the weather from the WeatherKit API
+
+        hourly_start, hourly_end, daily_start and daily_end ask for the hourly
+        and daily forecasts of a time range. They are datetimes (naive ones are
+        taken as UTC) or timestamp strings.
+
+        With coalesce=True, callers that ask for the same request while it is in
+        flight wait for it and receive the same response object, so treat
+        responses as read-only. Its distance_km is measured from the coordinates
+        of the caller that made the request.
+        """
+        window = time_window(hourly_start, hourly_end, daily_start, daily_end)
+        if self.flight is None:
+            return self._fetch_and_build(
+                self._parse_response, forecast_datasets, latitude, longitude, country_code, timezone, window,
+            )
+
+        if self.snapping is not None:
+            key = cache_key(forecast_datasets, *self.snapping.snap(latitude, longitude), country_code, timezone, window)
+        else:
+            key = cache_key(forecast_datasets, latitude, longitude, country_code, timezone, window)
+        return self.flight.do(
+            key, self._fetch_and_build, self._parse_response,
+            forecast_datasets, latitude, longitude, country_code, timezone, window,
+        )
+
+    def fetch_range(self, forecast_datasets, latitude, longitude, country_code, timezone, start, end,
+                    chunk=DEFAULT_CHUNK, concurrency=4):
+        """ Fetches the hourly and/or daily forecasts from start to end in chunks, concurrently
+
+        The range is split into windows at most chunk (a timedelta) long, and
+        up to concurrency of them are fetched at once. The forecasts are then
+        stitched into one response, ordered by start time and without
+        duplicates; see ranges.stitch.
+        """
+        windows = range_windows(forecast_datasets, start, end, chunk)
+        check_range_models(self.models, forecast_datasets)
+
+        def fetch_window(window):
+            return self.fetch(forecast_datasets, latitude, longitude, country_code, timezone, **window)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(fetch_window, windows))
+
+        return stitch(responses, forecast_datasets)
+
+    def _expired_datasets(self, previous, forecast_datasets):
+        """ Returns the datasets of a previous response that have expired or are missing """
+        now = time.time()
+        return [
+            name for name in forecast_datasets
+            if name not in previous.expire_times or expire_timestamp(previous.expire_times[name]) <= now
+        ]
+
+    def _merge_refresh(self, previous, fresh, forecast_datasets, expired_datasets, timezone):
+        """ Returns a new response with the expired datasets from fresh and the rest from previous """
+        response = self._parse_response({}, timezone)
+        response.latitude, response.longitude, response.distance_km = fresh.latitude, fresh.longitude, fresh.distance_km
+
+        for name in forecast_datasets:
+            attribute = DATASET_ATTRIBUTES.get(name)
+            source = fresh if name in expired_datasets else previous
+            if attribute is not None:
+                setattr(response, attribute, getattr(source, attribute))
+            if name in source.expire_times:
+                response.expire_times[name] = source.expire_times[name]
+
+        return response
+
+    def refresh(self, previous, forecast_datasets, latitude, longitude, country_code, timezone):
+        """ Re-fetches only the datasets of a previous response that have expired
+
+        The fresh datasets are merged with the still-valid ones from the previous
+        response into a new response. If nothing has expired the previous
+        response is returned as is.
+        """
+        expired_datasets = self._expired_datasets(previous, forecast_datasets)
+        if not expired_datasets:
+            return previous
+
+        fresh = self.fetch(expired_datasets, latitude, longitude, country_code, timezone)
+        return self._merge_refresh(previous, fresh, forecast_datasets, expired_datasets, timezone)
+
+    def fetch_columnar(self, forecast_datasets, latitude, longitude, country_code, timezone,
+                       hourly_start=None, hourly_end=None, daily_start=None, daily_end=None):
+        """ Fetches the weather and returns the forecasts as column arrays (requires numpy) """
+        from .columnar import ColumnarResponse
+
+        window = time_window(hourly_start, hourly_end, daily_start, daily_end)
+        return self._fetch_and_build(ColumnarResponse, forecast_datasets, latitude, longitude, country_code, timezone, window)
+
+    def fetch_stream(self, forecast_datasets, latitude, longitude, country_code, timezone, chunk_size=16384):
+        """ Fetches the weather and yields forecast objects while the response body is still downloading
+
+        Each HourlyForecast, DailyForecast and MinuteForecast is yielded as soon as its
+        array element has arrived. CurrentConditions and NextHourForecast are yielded when
+        their dataset is complete; the NextHourForecast carries the minutes yielded before it.
+        The 'stream' phase recorded for instrumentation includes the time spent by the caller
+        between items.
+        """
+        timezone = localizer(timezone)
+        models = self.models
+        current_class, next_hour_class = models['current_weather'], models['forecast_next_hour']
+        hourly_class, daily_class = models['forecast_hourly'], models['forecast_daily']
+        minute_class = next_hour_class.minute_class
+
+        stats = self._start_stats()
+        fields = {}
+        minutes = []
+
+        def counted(chunks):
+            for chunk in chunks:
+                stats.payload_bytes += len(chunk)
+                yield chunk
+
+        def count(dataset):
+            if stats is not None:
+                stats.item_counts[dataset] = stats.item_counts.get(dataset, 0) + 1
+
+        response = None
+        started = time.perf_counter()
+
+        try:
+            response = self._request(forecast_datasets, latitude, longitude, country_code, timezone.timezone, stream=True, stats=stats)
+            chunks = response.iter_content(chunk_size=chunk_size)
+
+            if stats is not None:
+                stats.payload_bytes = 0
+                chunks = counted(chunks)
+                started = time.perf_counter()
+
+            for event, dataset, key, value in iter_events(chunks):
+                if event == 'item':
+                    count(dataset)
+                    if dataset == 'forecastHourly':
+                        yield hourly_class(value, timezone)
+                    elif dataset == 'forecastDaily':
+                        yield daily_class(value, timezone)
+                    elif dataset == 'forecastNextHour':
+                        minute = minute_class(value, timezone)
+                        minutes.append(minute)
+                        yield minute
+
+                elif event == 'field':
+                    fields[key] = value
+
+                elif event == 'end':
+                    if dataset == 'currentWeather':
+                        count(dataset)
+                        yield current_class(fields, timezone)
+                    elif dataset == 'forecastNextHour':
+                        next_hour_forecast = next_hour_class(dict(fields, minutes=[]), timezone)
+                        if next_hour_forecast.start_datetime is not None:
+                            next_hour_forecast.minutes = minutes
+                        yield next_hour_forecast
+                    fields = {}
+                    minutes = []
+        finally:
+            if response is not None:
+                response.close()
+            if stats is not None:
+                stats.timings['stream'] = time.perf_counter() - started
+                self.instrumentation.record(stats)